@@ -1,13 +1,19 @@
 from langchain_experimental.agents import create_pandas_dataframe_agent
 from langchain.chat_models import ChatOpenAI
-from langchain.prompts import PromptTemplate
+from langchain.prompts import ChatPromptTemplate, PromptTemplate
 from langchain.output_parsers import PydanticOutputParser
-from langchain.schema import OutputParserException
+from langchain.schema import OutputParserException, SystemMessage
 from pydantic import BaseModel, Field
 from typing import List, Optional
 from enum import Enum
 import pandas as pd
 import json
+from code_validator import CodeValidationError, compile_generated_code, rewrite_generated_code
+from code_sandbox import StreamlitRecorder
+from figure_context import FigureContext
+from lazy_frame import LazyFrame, PandasFacade
+from prompt_context import PromptContext, PromptContextBuilder, dataset_fingerprint
+from tool_cache import MemoizedPythonTool
 
 # Define ENUM for task types
 # class TaskType(str, Enum):
@@ -27,68 +33,49 @@ import json
 #     x_label: Optional[str] = Field(default=None, description="X-axis label (for graph tasks)")
 #     y_label: Optional[str] = Field(default=None, description="Y-axis label (for graph tasks)")
 
-def get_agent_with_context(df: pd.DataFrame, column_descriptions: dict, dataset_context: str):
-    """
-    Create an agent that uses column descriptions instead of the full dataset
-    
-    Args:
-        df: The pandas DataFrame (for code execution only)
-        column_descriptions: Dictionary of column descriptions
-        dataset_context: Formatted context string about the dataset
-    """
-    
-    llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
-    sample_size = min(10, len(df))  # Only 10 rows max
-    limited_df = df.head(sample_size)
-    
-    # Add basic statistics to the context
-    stats_context = f"""
-    {dataset_context}
-    
-    Sample Data (first {sample_size} rows):
-    {limited_df.to_string()}
-    
-    Basic Statistics:
-    {df.describe().to_string()}
-    """
-    
-    # Create a custom prompt that includes our column descriptions
-    from langchain.prompts import PromptTemplate
-    
-    # Create the prompt template with proper variables
-    template = f"""
+def _agent_prefix(prompt_context: PromptContext) -> str:
+    """The system prompt: budgeted dataset context followed by instructions"""
+    return f"""
     You are a highly intelligent data scientist working with a dataset.
 
-    {stats_context}
+    {prompt_context.text}
 
-    You have access to a DataFrame named 'df' with the above structure and sample data.
+    You have access to a DataFrame named 'df' with the above structure, holding the full dataset.
     You can use the python_repl_ast tool to execute Python code on this data.
 
     Instructions:
     - Use the python_repl_ast tool to execute Python code for analysis
     - For visualizations, use matplotlib or seaborn with proper Streamlit integration
+    - Draw on the provided `fig` and `ax` (pass ax=ax to pandas and seaborn plotting calls)
     - Always include plt.figure(figsize=(10,6)) and plt.tight_layout() for graphs
     - Use st.pyplot(plt) instead of plt.show() for Streamlit compatibility
     - Provide clear explanations of your findings
     - If a column is missing or an error occurs, explain the issue
-    - IMPORTANT: You only have access to sample data, not the full dataset
+    - Only some columns may be described above; check df.columns before assuming others are absent
+    - 'df' is evaluated lazily: column selections, filters like df[df['a'] > 5] and groupby
+      aggregations run on the full data only when a result is printed, so compute answers
+      with pandas instead of inspecting rows; printing 'df' shows only a preview
+    """
 
-    Question: {{input}}
-    {{agent_scratchpad}}
+def get_agent_with_context(df: pd.DataFrame, prompt_context: PromptContext):
     """
+    Create an agent that sees the dataset through a token-budgeted context
     
-    prompt = PromptTemplate(
-        input_variables=["input", "agent_scratchpad"],
-        template=template
-    )
+    Args:
+        df: The pandas DataFrame; the agent queries it through a LazyFrame
+        prompt_context: Context from PromptContextBuilder; swap it per question
+            with set_prompt_context
+    """
     
-    # Create the agent using the LIMITED dataset
-    from langchain_experimental.agents import create_pandas_dataframe_agent
+    llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
     
+    # The prefix is passed as the agent's system message (not a template), so braces need no escaping
     agent = create_pandas_dataframe_agent(
         llm=llm,
-        df=limited_df,
-        prompt=prompt,
+        df=df,
+        prefix=_agent_prefix(prompt_context),
+        suffix="",
+        include_df_in_prompt=False,  # Sample rows are already in the budgeted context
         verbose=True,
         allow_dangerous_code=True,
         max_iterations=15,
@@ -96,8 +83,38 @@ def get_agent_with_context(df: pd.DataFrame, column_descriptions: dict, dataset_
         agent_type="openai-tools"
     )
     
+    # Run queries on the full data through the lazy proxy, and answer repeated
+    # side-effect-free snippets from the tool result cache
+    dataset_version = prompt_context.fingerprint or dataset_fingerprint(df)
+    for i, tool in enumerate(agent.tools):
+        if getattr(tool, "locals", None) is not None:
+            tool.locals["df"] = LazyFrame(df)
+            tool.locals["pd"] = PandasFacade()  # pd.concat(...), pd.merge(...) accept the LazyFrame
+            agent.tools[i] = MemoizedPythonTool(tool, dataset_version)
+    
     return agent
 
+def set_prompt_context(agent, prompt_context: PromptContext):
+    """Replace the agent's system message with one built around prompt_context"""
+    for step in getattr(agent.agent.runnable, "steps", []):
+        if isinstance(step, ChatPromptTemplate):
+            step.messages[0] = SystemMessage(content=_agent_prefix(prompt_context))
+            return
+    raise ValueError("Agent prompt has no system message to replace")
+
+def bind_figure_context(agent, figure_context: FigureContext):
+    """
+    Point the agent's python tool at a per-run figure, so charts the agent draws
+    (through plt/sns, including its own pyplot imports, and pandas .plot()/.hist()
+    calls) land on figure_context instead of the global pyplot state
+    """
+    for tool in agent.tools:
+        if getattr(tool, "locals", None) is not None:
+            tool.locals.update(figure_context.namespace())
+            tool.locals["st"] = StreamlitRecorder()
+            if isinstance(tool, MemoizedPythonTool):
+                tool.code_rewriter = rewrite_generated_code
+
 def get_agent(df: pd.DataFrame):
     """
     Legacy function - kept for backward compatibility
@@ -108,9 +125,9 @@ def get_agent(df: pd.DataFrame):
     # Analyze columns to get descriptions
     analyzer = ColumnAnalyzer()
     column_descriptions = analyzer.analyze_columns(df)
-    dataset_context = analyzer.create_dataset_context(column_descriptions, df)
+    prompt_context = PromptContextBuilder(df, column_descriptions).build()
     
-    return get_agent_with_context(df, column_descriptions, dataset_context)
+    return get_agent_with_context(df, prompt_context)
 
 # def parse_agent_response(response: str) -> TaskResponse:
 #     """
@@ -142,26 +159,18 @@ def validate_graph_code(code: str) -> bool:
     """
     Validate that graph code contains required Streamlit elements
     """
-    required_elements = [
-        'plt.figure(figsize=(10,6))',
-        'plt.tight_layout()',
-        'st.pyplot('  # More flexible - just check for st.pyplot call
-    ]
-    
-    code_lower = code.lower()
-    for element in required_elements:
-        if element not in code_lower:
-            return False
+    try:
+        compile_generated_code(code, "GRAPH_TASK")
+    except CodeValidationError:
+        return False
     return True
 
 def validate_insights_code(code: str) -> bool:
     """
     Validate that insights code is safe and appropriate
     """
-    dangerous_keywords = ['exec', 'eval', 'open', 'file', 'system', 'subprocess']
-    code_lower = code.lower()
-    
-    for keyword in dangerous_keywords:
-        if keyword in code_lower:
-            return False
+    try:
+        compile_generated_code(code, "INSIGHTS_TASK")
+    except CodeValidationError:
+        return False
     return True
@@ -1,27 +1,26 @@
 import streamlit as st
 import pandas as pd
-from agent import get_agent_with_context
+from agent import get_agent_with_context, bind_figure_context, set_prompt_context
 from column_analyzer import ColumnAnalyzer
 from dotenv import load_dotenv
 from code_processor import CodeProcessor
 from callbacks import ThinkingCallbackHandler
+from figure_store import FigureStore
+from figure_context import FigureContext
+from chat_history import ChatHistory
+from prompt_context import PromptContextBuilder
+from csv_loader import load_csv
+from langchain_community.callbacks import get_openai_callback
 import io
 import sys
 import re
 import ast
 import matplotlib
 matplotlib.use('Agg')  # Set the backend to non-interactive
-import matplotlib.pyplot as plt
-plt.ioff()  # Turn off interactive mode
-import seaborn as sns
 from io import StringIO
 
 load_dotenv()
 
-# Initialize session state for chat history
-if "messages" not in st.session_state:
-    st.session_state.messages = []
-
 if "df" not in st.session_state:
     st.session_state.df = None
 
@@ -34,8 +33,23 @@ if "code_processor" not in st.session_state:
 if "column_descriptions" not in st.session_state:
     st.session_state.column_descriptions = None
 
-if "dataset_context" not in st.session_state:
-    st.session_state.dataset_context = None
+if "context_builder" not in st.session_state:
+    st.session_state.context_builder = None
+
+if "figure_store" not in st.session_state:
+    st.session_state.figure_store = FigureStore()
+
+# Initialize session state for chat history
+if "chat_history" not in st.session_state:
+    st.session_state.chat_history = ChatHistory(st.session_state.figure_store)
+
+def format_token_usage(token_usage):
+    """One-line summary of the prompt context size and LLM token usage for a request"""
+    return (
+        f"🧮 Context: {token_usage['context_tokens']} tokens "
+        f"({token_usage['context_columns']} of {token_usage['total_columns']} columns) · "
+        f"LLM: {token_usage['prompt_tokens']} prompt / {token_usage['completion_tokens']} completion tokens"
+    )
 
 st.set_page_config(page_title="CSV Chat Assistant", layout="wide")
 st.title("💬 CSV Chat Assistant")
@@ -49,25 +63,26 @@ with st.sidebar:
         if st.session_state.df is None or st.button("🔄 Reload Data"):
             with st.spinner("📊 Loading and analyzing data..."):
                 # Load the CSV
-                st.session_state.df = pd.read_csv(uploaded_file)
+                st.session_state.df = load_csv(uploaded_file)
                 
                 # Analyze columns to get descriptions
                 analyzer = ColumnAnalyzer()
                 st.session_state.column_descriptions = analyzer.analyze_columns(st.session_state.df)
-                st.session_state.dataset_context = analyzer.create_dataset_context(
-                    st.session_state.column_descriptions, 
-                    st.session_state.df
+                
+                # Builds the token-budgeted prompt context; rendered pieces are cached per dataset
+                st.session_state.context_builder = PromptContextBuilder(
+                    st.session_state.df,
+                    st.session_state.column_descriptions
                 )
                 
-                # Create agent with column descriptions instead of full dataset
+                # Create the agent once; each question swaps in its own prompt context
                 st.session_state.agent = get_agent_with_context(
                     st.session_state.df,
-                    st.session_state.column_descriptions,
-                    st.session_state.dataset_context
+                    st.session_state.context_builder.build()
                 )
                 
                 st.session_state.code_processor = CodeProcessor(st.session_state.df)
-                st.session_state.messages = []  # Clear chat history when new file is loaded
+                st.session_state.chat_history.clear()  # Clear chat history when new file is loaded
                 st.success("✅ Data loaded and analyzed successfully!")
         
         if st.session_state.df is not None:
@@ -82,13 +97,19 @@ with st.sidebar:
                         st.write(description)
             
             if st.button("🗑️ Clear Chat"):
-                st.session_state.messages = []
+                st.session_state.chat_history.clear()
                 st.rerun()
 
 # Main chat area
 if st.session_state.df is not None:
+    # Older messages live on disk until requested
+    if st.session_state.chat_history.has_earlier:
+        if st.button("⬆️ Load earlier messages"):
+            st.session_state.chat_history.load_earlier()
+            st.rerun()
+    
     # Display chat messages
-    for message in st.session_state.messages:
+    for message in st.session_state.chat_history.visible():
         with st.chat_message(message["role"]):
             if message["role"] == "user":
                 st.write(message["content"])
@@ -103,6 +124,9 @@ if st.session_state.df is not None:
                 st.markdown("**🤖 Agent Response:**")
                 st.write(message["content"])
                 
+                if message.get("token_usage"):
+                    st.caption(format_token_usage(message["token_usage"]))
+                
                 # Show code execution results if available
                 if "code_result" in message and message["code_result"]:
                     with st.expander("🔧 Code Execution Result"):
@@ -111,16 +135,16 @@ if st.session_state.df is not None:
                 # Show graphs if generated
                 if "graph_generated" in message and message["graph_generated"]:
                     st.success("📊 Graph generated successfully!")
-                    # Display any saved graph figures
-                    if "graph_figures" in message and message["graph_figures"]:
-                        for i, fig in enumerate(message["graph_figures"]):
-                            st.pyplot(fig)
-                            plt.close(fig)  # Close after displaying in history
+                    # Display the images rendered when the graph was generated
+                    for image_key in message.get("graph_images", []):
+                        image = st.session_state.chat_history.get_image(image_key)
+                        if image is not None:
+                            st.image(image)
 
     # Chat input
     if prompt := st.chat_input("Ask a question about your data..."):
         # Add user message to chat history
-        st.session_state.messages.append({"role": "user", "content": prompt})
+        st.session_state.chat_history.append({"role": "user", "content": prompt})
         
         # Display user message
         with st.chat_message("user"):
@@ -138,8 +162,25 @@ if st.session_state.df is not None:
                 # Show thinking process first
                 thinking_placeholder.markdown("**🤔 Thinking:**")
                 
+                # Point the agent at the context most relevant to this question
+                prompt_context = st.session_state.context_builder.build(prompt)
+                set_prompt_context(st.session_state.agent, prompt_context)
+                
+                # Charts drawn by the agent's tool go to a figure owned by this run
+                figure_context = FigureContext()
+                bind_figure_context(st.session_state.agent, figure_context)
+                
                 # Get response from agent
-                response = st.session_state.agent.run(prompt, callbacks=[callback_handler])
+                with get_openai_callback() as usage:
+                    response = st.session_state.agent.run(prompt, callbacks=[callback_handler])
+                
+                token_usage = {
+                    "context_tokens": prompt_context.token_count,
+                    "context_columns": len(prompt_context.columns),
+                    "total_columns": prompt_context.total_columns,
+                    "prompt_tokens": usage.prompt_tokens,
+                    "completion_tokens": usage.completion_tokens
+                }
 
                 print("Agent response: ", response)
                 
@@ -149,16 +190,20 @@ if st.session_state.df is not None:
                 # Display the complete agent response
                 message_placeholder.markdown("**🤖 Agent Response:**")
                 message_placeholder.markdown(response)
+                st.caption(format_token_usage(token_usage))
+                
+                # Charts are kept with the message so they survive reruns and history replay
+                graph_images = []
                 
-                # Only display plot if there's actually a figure
-                if plt.get_fignums():
-                    message_placeholder.pyplot(plt.gcf())  # Display the plot
-                    plt.clf()  # Clean up for next round
+                # Only display plot if there's actually a figure (below the response text)
+                if figure_context.has_plot():
+                    image_key = st.session_state.figure_store.add_figure(figure_context.figure)
+                    graph_images.append(image_key)
+                    st.image(st.session_state.figure_store.get(image_key))
                 
                 # Execute code if present (extract code from response)
                 code_result = None
-                graph_generated = False
-                graph_figures = []
+                graph_generated = bool(graph_images)
                 
                 # Extract code blocks from the response
                 code_pattern = r'```python\s*(.*?)\s*```'
@@ -219,11 +264,11 @@ if st.session_state.df is not None:
                     if success:
                         if is_graph and fig is not None:
                             graph_generated = True
-                            graph_figures.append(fig)
+                            # Render once to image bytes; the figure is closed here
+                            image_key = st.session_state.figure_store.add_figure(fig)
+                            graph_images.append(image_key)
                             st.success("📊 Graph generated successfully!")
-                            # Display the graph immediately
-                            st.pyplot(fig)
-                            plt.close(fig)  # Close the figure after displaying
+                            st.image(st.session_state.figure_store.get(image_key))
                         else:
                             st.success("✅ Code executed successfully!")
                             if is_graph:
@@ -231,23 +276,28 @@ if st.session_state.df is not None:
                     else:
                         st.error(f"❌ Code execution failed: {result}")
                     
+                    # Includes st.write-style output, and print() output when the code ran in the sandbox
+                    with st.expander("🔧 Code Execution Result"):
+                        st.write(result)
+                    
                     code_result = result
                 
                 # Add assistant message to chat history
                 thinking_text = "\n\n".join(callback_handler.thinking_steps) if callback_handler.thinking_steps else ""
-                st.session_state.messages.append({
+                st.session_state.chat_history.append({
                     "role": "assistant", 
                     "content": response,
                     "thinking": thinking_text,
                     "code_result": code_result,
                     "graph_generated": graph_generated,
-                    "graph_figures": graph_figures
+                    "graph_images": graph_images,
+                    "token_usage": token_usage
                 })
                 
             except Exception as e:
                 error_message = f"Error: {str(e)}"
                 message_placeholder.error(error_message)
-                st.session_state.messages.append({
+                st.session_state.chat_history.append({
                     "role": "assistant", 
                     "content": error_message
                 })
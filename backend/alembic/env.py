@@ -27,6 +27,12 @@ if config.config_file_name is not None:
 # target_metadata = None
 
 from db.base import Base
+import models  # noqa: F401  registers every model on Base.metadata
+from core.config import settings
+
+# Migrate the database the app is configured to use
+config.set_main_option("sqlalchemy.url", settings.database_url.replace("%", "%%"))
+
 target_metadata = Base.metadata
 
 
@@ -0,0 +1,47 @@
+"""create query executions table
+
+Revision ID: 3f9c1a7d2b64
+Revises: 750cc5838d08
+Create Date: 2026-10-19 10:12:31.418207
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9c1a7d2b64'
+down_revision: Union[str, Sequence[str], None] = '750cc5838d08'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'query_executions',
+        sa.Column('id', sa.String(), nullable=False),
+        sa.Column('file_id', sa.String(), nullable=False),
+        sa.Column('file_fingerprint', sa.String(), nullable=False),
+        sa.Column('sql_hash', sa.String(), nullable=False),
+        sa.Column('sql_query', sa.Text(), nullable=False),
+        sa.Column('result_fingerprint', sa.String(), nullable=True),
+        sa.Column('row_count', sa.Integer(), nullable=False),
+        sa.Column('execution_ms', sa.Float(), nullable=False),
+        sa.Column('served_from_cache', sa.Boolean(), nullable=False),
+        sa.Column('result_blob', sa.LargeBinary(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+        sa.ForeignKeyConstraint(['file_id'], ['csv_files.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_query_executions_file_id'), 'query_executions', ['file_id'], unique=False)
+    op.create_index('ix_query_executions_lookup', 'query_executions', ['file_id', 'file_fingerprint', 'sql_hash'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_query_executions_lookup', table_name='query_executions')
+    op.drop_index(op.f('ix_query_executions_file_id'), table_name='query_executions')
+    op.drop_table('query_executions')
@@ -0,0 +1,28 @@
+"""index csv sessions by created_at and id
+
+Revision ID: 8d2e5b41c7f3
+Revises: 3f9c1a7d2b64
+Create Date: 2026-10-19 13:05:47.902114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d2e5b41c7f3'
+down_revision: Union[str, Sequence[str], None] = '3f9c1a7d2b64'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_csv_sessions_created_at_id', 'csv_sessions', ['created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_csv_sessions_created_at_id', table_name='csv_sessions')
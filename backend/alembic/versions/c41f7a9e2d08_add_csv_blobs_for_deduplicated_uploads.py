@@ -0,0 +1,51 @@
+"""add csv blobs for deduplicated uploads
+
+Revision ID: c41f7a9e2d08
+Revises: 8d2e5b41c7f3
+Create Date: 2026-10-19 14:22:09.553871
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41f7a9e2d08'
+down_revision: Union[str, Sequence[str], None] = '8d2e5b41c7f3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'csv_blobs',
+        sa.Column('content_hash', sa.String(), nullable=False),
+        sa.Column('file_path', sa.String(), nullable=False),
+        sa.Column('file_size', sa.Integer(), nullable=False),
+        sa.Column('ref_count', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+        sa.PrimaryKeyConstraint('content_hash')
+    )
+    with op.batch_alter_table('csv_files') as batch_op:
+        batch_op.add_column(sa.Column('content_hash', sa.String(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_csv_files_content_hash'), ['content_hash'], unique=False)
+        batch_op.create_foreign_key('fk_csv_files_content_hash', 'csv_blobs', ['content_hash'], ['content_hash'])
+
+    # Cached results are looked up by contents rather than by file
+    op.drop_index('ix_query_executions_lookup', table_name='query_executions')
+    op.create_index('ix_query_executions_lookup', 'query_executions', ['file_fingerprint', 'sql_hash'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_query_executions_lookup', table_name='query_executions')
+    op.create_index('ix_query_executions_lookup', 'query_executions', ['file_id', 'file_fingerprint', 'sql_hash'], unique=False)
+
+    with op.batch_alter_table('csv_files') as batch_op:
+        batch_op.drop_constraint('fk_csv_files_content_hash', type_='foreignkey')
+        batch_op.drop_index(batch_op.f('ix_csv_files_content_hash'))
+        batch_op.drop_column('content_hash')
+    op.drop_table('csv_blobs')
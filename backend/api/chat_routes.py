@@ -1,19 +1,61 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
 from typing import Dict, Any
 
+from core.config import settings
+from core.metrics import registry
+from core.profiling import profile_requested, profiled
 from db.session import get_db
 from services.chat_service import ChatService
-from schemas.chat_schema import ChatRequest, ChatResponse, RequestType
+from services.single_flight import SingleFlight
+from schemas.chat_schema import BatchChatRequest, BatchChatResponse, ChatRequest, ChatResponse, RequestType
 
 router = APIRouter()
 
 # Initialize chat service
 chat_service = ChatService()
 
+# Concurrent identical chat requests are answered by one computation
+chat_flight = SingleFlight()
+
+def _coalescing_metrics():
+    stats = chat_flight.stats()
+    return [
+        "# HELP insightquery_chat_executions_total Chat requests that ran the pipeline",
+        "# TYPE insightquery_chat_executions_total counter",
+        f"insightquery_chat_executions_total {stats['executions']}",
+        "# HELP insightquery_chat_coalesced_total Chat requests answered by an identical request in flight",
+        "# TYPE insightquery_chat_coalesced_total counter",
+        f"insightquery_chat_coalesced_total {stats['coalesced']}",
+        "# HELP insightquery_chat_in_flight Chat pipelines currently running",
+        "# TYPE insightquery_chat_in_flight gauge",
+        f"insightquery_chat_in_flight {stats['in_flight']}"
+    ]
+
+registry.register_collector(_coalescing_metrics)
+
+def _to_chat_response(result: Dict[str, Any]) -> ChatResponse:
+    """Convert a ChatService result to the response format"""
+    if result.get("request_type") == "error":
+        return ChatResponse(
+            request_type=RequestType.INSIGHT,  # Default type for errors
+            message=result.get("message", "An error occurred"),
+            error=result.get("error", "Unknown error")
+        )
+    
+    request_type = RequestType(result.get("request_type", "insight"))
+    
+    return ChatResponse(
+        request_type=request_type,
+        message=result.get("message", "Request processed successfully"),
+        data=result.get("data", {})
+    )
+
 @router.post("/chat", response_model=ChatResponse)
 def chat_with_data(
     request: ChatRequest,
+    http_request: Request,
+    response: Response,
     db: Session = Depends(get_db)
 ):
     """
@@ -22,35 +64,34 @@ def chat_with_data(
     The system automatically determines if the user is asking for:
     - Insights: Analysis, trends, patterns, understanding of data
     - Graphs: Charts, visualizations, plots, visual representations
+    
+    With profiling enabled, send `X-Profile: 1` (or `?profile=1`) to run the
+    request under the sampling profiler; the profile id is returned in the
+    `X-Profile-Id` header.
     """
     
     try:
-        # Process the chat request
-        result = chat_service.process_chat(
-            db=db,
-            session_id=request.session_id,
-            user_message=request.user_message
-        )
-
-        print("Request Type : ", result.get("request_type"))
-
-
-        
-        # Convert result to response format
-        if result.get("request_type") == "error":
-            return ChatResponse(
-                request_type=RequestType.INSIGHT,  # Default type for errors
-                message=result.get("message", "An error occurred"),
-                error=result.get("error", "Unknown error")
+        # Process the chat request; identical requests in flight share one run
+        def run():
+            return chat_service.process_chat(
+                db=db,
+                session_id=request.session_id,
+                user_message=request.user_message
             )
         
-        request_type = RequestType(result.get("request_type", "insight"))
+        profile_this = profile_requested(http_request)
+        with profiled("POST /api/chat", profile_this) as profile:
+            # A profiled request runs on its own rather than sharing another's run
+            if settings.chat_coalescing_enabled and not profile_this:
+                result, _ = chat_flight.do((request.session_id, request.user_message), run)
+            else:
+                result = run()
+        if profile is not None:
+            response.headers["X-Profile-Id"] = profile.id
+
+        print("Request Type : ", result.get("request_type"))
         
-        return ChatResponse(
-            request_type=request_type,
-            message=result.get("message", "Request processed successfully"),
-            data=result.get("data", {})
-        )
+        return _to_chat_response(result)
         
     except ValueError as e:
         # Handle specific errors like missing session or CSV files
@@ -59,6 +100,39 @@ def chat_with_data(
         # Handle other unexpected errors
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+@router.post("/chat/batch", response_model=BatchChatResponse)
+def chat_batch(
+    request: BatchChatRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Answer several messages about one session's data in one request.
+    
+    The CSV is loaded once, all messages are classified together and the
+    queries run concurrently. Results come back in message order; a message
+    that fails gets a result with `error` set instead of failing the batch.
+    """
+    if not request.user_messages:
+        raise HTTPException(status_code=400, detail="No messages given")
+    if len(request.user_messages) > settings.batch_max_messages:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.batch_max_messages} messages can be sent in one batch"
+        )
+    
+    try:
+        results = chat_service.process_batch(db, request.session_id, request.user_messages)
+    except ValueError as e:
+        # Handle specific errors like missing session or CSV files
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+    
+    return BatchChatResponse(
+        session_id=request.session_id,
+        results=[_to_chat_response(result) for result in results]
+    )
+
 @router.get("/chat/health")
 def chat_health_check():
     """
@@ -74,13 +148,15 @@ def chat_health_check():
             return {
                 "status": "warning",
                 "message": "OpenAI API key not configured. Chat functionality may not work properly.",
-                "openai_configured": False
+                "openai_configured": False,
+                "coalescing": chat_flight.stats()
             }
         
         return {
             "status": "healthy",
             "message": "Chat service is ready",
-            "openai_configured": True
+            "openai_configured": True,
+            "coalescing": chat_flight.stats()
         }
     except Exception as e:
         return {
@@ -1,26 +1,36 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request, Response, UploadFile, File, Form
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 import os
-import uuid
 from datetime import datetime
 
+from core.config import settings
+from core.profiling import profile_requested, profiled
 from db.session import get_db
-from crud.csv_crud import CSVSessionCRUD, CSVFileCRUD
+from crud.csv_crud import CSVSessionCRUD, CSVFileCRUD, CSVBlobCRUD
+from crud.query_crud import QueryExecutionCRUD
+from services.aggregate_cube import build_cube_for_file
+from services.blob_store import stage_upload, store_upload, upload_compression
+from services.cleanup_service import cleanup_worker
 from schemas.csv_schema import (
     CSVUploadResponse, 
     CSVFileResponse, 
     CSVSessionResponse,
+    CSVSessionSummary,
     CreateSessionRequest,
     CreateSessionResponse
 )
+from schemas.query_schema import QueryExecutionResponse
 
 router = APIRouter()
 
 # Create uploads directory if it doesn't exist
-UPLOADS_DIR = "uploads"
+UPLOADS_DIR = settings.uploads_dir
 os.makedirs(UPLOADS_DIR, exist_ok=True)
 
+# Fields that can be requested from the session listing
+SESSION_FIELDS = ["id", "session_id", "created_at", "updated_at", "csv_files"]
+
 @router.post("/sessions", response_model=CreateSessionResponse)
 def create_session(
     request: CreateSessionRequest,
@@ -42,12 +52,32 @@ def create_session(
 
 @router.post("/upload", response_model=CSVUploadResponse)
 async def upload_csv(
+    request: Request,
+    response: Response,
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     session_id: str = Form(...),
     db: Session = Depends(get_db)
 ):
-    """Upload a CSV file to a specific session"""
+    """
+    Upload a CSV file to a specific session.
     
+    With profiling enabled, send `X-Profile: 1` (or `?profile=1`) to profile
+    the upload; the profile id is returned in the `X-Profile-Id` header.
+    """
+    with profiled("POST /api/csv/upload", profile_requested(request)) as profile:
+        result = await _store_csv_upload(background_tasks, file, session_id, db)
+    if profile is not None:
+        response.headers["X-Profile-Id"] = profile.id
+    return result
+
+async def _store_csv_upload(
+    background_tasks: BackgroundTasks,
+    file: UploadFile,
+    session_id: str,
+    db: Session
+) -> CSVUploadResponse:
+    """Validate, store and record an upload"""
     # Validate file type
     if not file.filename.lower().endswith('.csv'):
         raise HTTPException(status_code=400, detail="Only CSV files are allowed")
@@ -56,50 +86,52 @@ async def upload_csv(
     session = CSVSessionCRUD.get_session_by_id(db, session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
+    CSVSessionCRUD.touch_session(db, session_id)
     
-    # Generate unique filename
-    file_extension = os.path.splitext(file.filename)[1]
-    unique_filename = f"{uuid.uuid4()}{file_extension}"
-    file_path = os.path.join(UPLOADS_DIR, unique_filename)
+    try:
+        # Save the upload while hashing it; identical contents are stored once
+        compression = upload_compression()
+        staged_path, content_hash, file_size = await stage_upload(file, UPLOADS_DIR, compression)
+        blob, created = store_upload(db, staged_path, content_hash, file_size, UPLOADS_DIR, compression)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
     
     try:
-        # Save file to disk
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
-        
-        # Get file size
-        file_size = len(content)
-        
         # Create database record
         csv_file = CSVFileCRUD.create_csv_file(
             db=db,
             session_id=session_id,
-            filename=unique_filename,
+            filename=os.path.basename(blob.file_path),
             original_filename=file.filename,
             file_size=file_size,
             content_type=file.content_type or "text/csv",
-            file_path=file_path
+            file_path=blob.file_path,
+            content_hash=content_hash
         )
-        
-        return CSVUploadResponse(
-            message="File uploaded successfully",
-            session_id=session_id,
-            file=CSVFileResponse(
-                id=csv_file.id,
-                filename=csv_file.filename,
-                original_filename=csv_file.original_filename,
-                file_size=csv_file.file_size,
-                content_type=csv_file.content_type,
-                created_at=csv_file.created_at
-            )
-        )
-        
     except Exception as e:
-        # Clean up file if database operation fails
-        if os.path.exists(file_path):
-            os.remove(file_path)
+        # Release the stored contents if the record was never created
+        db.rollback()
+        cleanup_worker.enqueue(CSVBlobCRUD.remove_reference(db, content_hash))
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+    
+    # Precompute group-by aggregates after the response is sent
+    # (a duplicate upload shares the cube of the stored contents)
+    if created and settings.aggregate_cube_enabled:
+        background_tasks.add_task(build_cube_for_file, blob.file_path)
+    
+    return CSVUploadResponse(
+        message="File uploaded successfully",
+        session_id=session_id,
+        file=CSVFileResponse(
+            id=csv_file.id,
+            filename=csv_file.filename,
+            original_filename=csv_file.original_filename,
+            file_size=csv_file.file_size,
+            content_type=csv_file.content_type,
+            content_hash=csv_file.content_hash,
+            created_at=csv_file.created_at
+        )
+    )
 
 @router.get("/sessions/{session_id}", response_model=CSVSessionResponse)
 def get_session_files(
@@ -125,49 +157,80 @@ def get_session_files(
                 original_filename=file.original_filename,
                 file_size=file.file_size,
                 content_type=file.content_type,
+                content_hash=file.content_hash,
                 created_at=file.created_at
             ) for file in csv_files
         ]
     )
 
-@router.get("/sessions", response_model=List[CSVSessionResponse])
-def get_all_sessions(db: Session = Depends(get_db)):
-    """Get all CSV sessions"""
-    sessions = CSVSessionCRUD.get_all_sessions(db)
+@router.get("/sessions", response_model=List[CSVSessionSummary], response_model_exclude_unset=True)
+def get_all_sessions(
+    response: Response,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Get one page of CSV sessions, oldest first.
+    
+    Pass the X-Next-Cursor response header back as `cursor` to get the next
+    page; the header is absent on the last page. `fields` is a comma-separated
+    subset of the session fields to return (files are only loaded if
+    `csv_files` is requested).
+    """
+    selected = SESSION_FIELDS
+    if fields:
+        selected = [field.strip() for field in fields.split(",") if field.strip()]
+        unknown = set(selected) - set(SESSION_FIELDS)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    
+    try:
+        sessions, next_cursor = CSVSessionCRUD.list_sessions(
+            db, limit, cursor, include_files="csv_files" in selected
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     
     return [
-        CSVSessionResponse(
-            id=session.id,
-            session_id=session.session_id,
-            created_at=session.created_at,
-            updated_at=session.updated_at,
-            csv_files=[
-                CSVFileResponse(
-                    id=file.id,
-                    filename=file.filename,
-                    original_filename=file.original_filename,
-                    file_size=file.file_size,
-                    content_type=file.content_type,
-                    created_at=file.created_at
-                ) for file in session.csv_files
-            ]
-        ) for session in sessions
+        CSVSessionSummary(**{
+            field: (
+                [CSVFileResponse.model_validate(file) for file in session.csv_files]
+                if field == "csv_files" else getattr(session, field)
+            )
+            for field in selected
+        }) for session in sessions
     ]
 
 @router.delete("/sessions/{session_id}")
 def delete_session(session_id: str, db: Session = Depends(get_db)):
-    """Delete a session and all its CSV files"""
-    success = CSVSessionCRUD.delete_session(db, session_id)
-    if not success:
+    """Delete a session and all its CSV files (removed from disk in the background)"""
+    paths = CSVSessionCRUD.delete_session(db, session_id)
+    if paths is None:
         raise HTTPException(status_code=404, detail="Session not found")
+    cleanup_worker.enqueue(paths)
     
     return {"message": "Session deleted successfully"}
 
 @router.delete("/files/{file_id}")
 def delete_file(file_id: str, db: Session = Depends(get_db)):
-    """Delete a specific CSV file"""
-    success = CSVFileCRUD.delete_file(db, file_id)
-    if not success:
+    """Delete a specific CSV file (removed from disk in the background)"""
+    paths = CSVFileCRUD.delete_file(db, file_id)
+    if paths is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    cleanup_worker.enqueue(paths)
+    
+    return {"message": "File deleted successfully"} 
+
+@router.get("/files/{file_id}/queries", response_model=List[QueryExecutionResponse])
+def get_file_queries(file_id: str, limit: int = 100, db: Session = Depends(get_db)):
+    """Get the most recent queries executed on a CSV file, with their latency"""
+    csv_file = CSVFileCRUD.get_file_by_id(db, file_id)
+    if not csv_file:
         raise HTTPException(status_code=404, detail="File not found")
     
-    return {"message": "File deleted successfully"} 
\ No newline at end of file
+    return QueryExecutionCRUD.get_executions_by_file(db, file_id, limit)
@@ -0,0 +1,29 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import PlainTextResponse
+from typing import Any, Dict
+
+from core.config import settings
+from core.profiling import load_profile
+
+router = APIRouter()
+
+def _get_profile(profile_id: str) -> Dict[str, Any]:
+    if not settings.profiling_enabled:
+        raise HTTPException(status_code=404, detail="Profiling is not enabled")
+    profile = load_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile
+
+@router.get("/profiles/{profile_id}")
+def get_profile(profile_id: str):
+    """
+    A profiled request: its route, duration, sample count, the timed pandas
+    sections and the sampled stacks in folded form
+    """
+    return _get_profile(profile_id)
+
+@router.get("/profiles/{profile_id}/folded", response_class=PlainTextResponse)
+def get_profile_folded(profile_id: str):
+    """The sampled stacks in folded form, for flamegraph.pl, speedscope and similar tools"""
+    return PlainTextResponse(_get_profile(profile_id)["folded"])
@@ -1,7 +1,79 @@
-from pydantic import BaseSettings
+from typing import Optional
+from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
     app_name: str = "InsightQuery FastAPI App"
     debug: bool = True
 
-settings = Settings() 
\ No newline at end of file
+    # Database; the async URL defaults to database_url with an async driver
+    database_url: str = "sqlite:///./test.db"
+    database_async_url: Optional[str] = None
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_timeout: int = 30
+    db_pool_recycle: int = 1800
+
+    # SQLite pragmas applied to every new connection
+    sqlite_journal_mode: str = "WAL"
+    sqlite_synchronous: str = "NORMAL"
+    sqlite_cache_size_kb: int = 65536
+    sqlite_busy_timeout_ms: int = 5000
+
+    # Uploaded files; removed from disk by the background cleanup worker
+    uploads_dir: str = "uploads"
+    # "zstd" stores new uploads compressed (.csv.zst); readers decompress while parsing
+    upload_compression: str = "none"
+    upload_zstd_level: int = 3
+    cleanup_sweep_interval_s: int = 600
+    cleanup_orphan_grace_s: int = 3600
+    # Sessions inactive for longer than this are deleted (0 keeps them forever)
+    session_ttl_hours: int = 0
+
+    # Precomputed group-by aggregates, built after upload
+    aggregate_cube_enabled: bool = True
+    aggregate_cube_max_groups: int = 50
+
+    # Files above the threshold are streamed in chunks instead of loaded whole
+    out_of_core_threshold_mb: int = 512
+    out_of_core_chunk_rows: int = 100_000
+    out_of_core_sample_rows: int = 10_000
+    out_of_core_result_rows: int = 1000
+    out_of_core_max_groups: int = 1_000_000
+
+    # Threads for pyarrow's CSV parser (0 uses every core)
+    csv_parse_threads: int = 0
+
+    # Budget for SQL results passed to the insight prompt
+    result_limit_rows: int = 10_000
+    result_max_rows: int = 100
+    result_max_chars: int = 8000
+    result_top_k: int = 5
+    result_sample_rows: int = 10
+
+    # Generated SQL is planned against the schema before it runs
+    sql_max_rows_scanned: int = 100_000_000
+    sql_repair_attempts: int = 2
+
+    # Executed queries are recorded; small results are stored and reused
+    query_cache_enabled: bool = True
+    query_cache_max_bytes: int = 1_000_000
+    query_cache_zstd_level: int = 3
+
+    # POST /api/chat/batch: messages per request and messages answered at once
+    batch_max_messages: int = 20
+    batch_max_workers: int = 8
+
+    # Concurrent identical (session_id, user_message) chat requests share one run
+    chat_coalescing_enabled: bool = True
+
+    # Each pipeline stage span is also logged as a JSON line
+    span_logs_enabled: bool = True
+
+    # Requests to /api/chat and /api/csv/upload with "X-Profile: 1" or ?profile=1
+    # are run under a sampling profiler; the profiles are kept in profiles_dir
+    profiling_enabled: bool = False
+    profiling_interval_ms: float = 5.0
+    profiles_dir: str = "profiles"
+    profiles_max_kept: int = 100
+
+settings = Settings()
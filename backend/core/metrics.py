@@ -0,0 +1,239 @@
+import contextvars
+import functools
+import json
+import logging
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from core.config import settings
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[Tuple[str, str], ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: LabelValues, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(labels)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, buckets=DURATION_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        # Per label set: cumulative-ready bucket counts, sum and count
+        self._values: Dict[LabelValues, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self._lock:
+            state = self._values.setdefault(key, [0.0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, state in sorted(self._values.items()):
+                cumulative = 0.0
+                for bound, count in zip(self.buckets, state):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_format_labels(labels, (('le', f'{bound:g}'),))} {cumulative:g}")
+                lines.append(f"{self.name}_bucket{_format_labels(labels, (('le', '+Inf'),))} {state[-1]:g}")
+                lines.append(f"{self.name}_sum{_format_labels(labels)} {state[-2]:g}")
+                lines.append(f"{self.name}_count{_format_labels(labels)} {state[-1]:g}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Metrics in the Prometheus text exposition format. Collectors are
+    callables returning extra lines (e.g. gauges read from other services)
+    at render time.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors: List[Callable[[], List[str]]] = []
+
+    def counter(self, name: str, documentation: str) -> Counter:
+        metric = Counter(name, documentation)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, buckets=DURATION_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Callable[[], List[str]]):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            try:
+                lines.extend(collector())
+            except Exception as e:
+                print(f"Error collecting metrics: {str(e)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+STAGE_DURATION = registry.histogram(
+    "insightquery_stage_duration_seconds", "Duration of each chat pipeline stage"
+)
+LLM_TOKENS = registry.counter(
+    "insightquery_llm_tokens_total", "LLM tokens used per stage, by type (prompt or completion)"
+)
+ROWS_SCANNED = registry.counter(
+    "insightquery_rows_scanned_total", "Rows read to answer queries, per stage"
+)
+ROWS_RETURNED = registry.counter(
+    "insightquery_rows_returned_total", "Rows returned by queries, per stage"
+)
+CACHE_LOOKUPS = registry.counter(
+    "insightquery_cache_lookups_total", "Cache lookups per stage, by result (hit or miss)"
+)
+
+span_logger = logging.getLogger("insightquery.spans")
+if not span_logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    span_logger.addHandler(_handler)
+    span_logger.setLevel(logging.INFO)
+    span_logger.propagate = False
+
+
+class Span:
+    """A timed stage; set attributes on it while it runs"""
+
+    def __init__(self, name: str, parent: Optional["Span"], attributes: Dict[str, Any]):
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = dict(attributes)
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def add(self, name: str, amount: float):
+        self.attributes[name] = self.attributes.get(name, 0) + amount
+
+
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Span]:
+    """
+    Time a pipeline stage. Spans nest through a context variable, so stages
+    called inside another share its trace id. On exit the duration and the
+    recognised attributes (rows_scanned, rows_returned, prompt_tokens,
+    completion_tokens, cache_hit) are recorded as metrics, and the span is
+    logged as one JSON line when span_logs_enabled.
+    """
+    current = Span(name, _current_span.get(), attributes)
+    token = _current_span.set(current)
+    status = "ok"
+    start = time.perf_counter()
+    try:
+        yield current
+    except Exception as e:
+        status = "error"
+        current.set(error=str(e))
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        _current_span.reset(token)
+        _record(current, status, duration)
+
+
+def traced(name: str):
+    """Run the decorated function inside span(name)"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _record(current: Span, status: str, duration: float):
+    attributes = current.attributes
+    STAGE_DURATION.observe(duration, stage=current.name, status=status)
+    if attributes.get("prompt_tokens"):
+        LLM_TOKENS.inc(attributes["prompt_tokens"], stage=current.name, type="prompt")
+    if attributes.get("completion_tokens"):
+        LLM_TOKENS.inc(attributes["completion_tokens"], stage=current.name, type="completion")
+    if attributes.get("rows_scanned"):
+        ROWS_SCANNED.inc(attributes["rows_scanned"], stage=current.name)
+    if attributes.get("rows_returned") is not None:
+        ROWS_RETURNED.inc(attributes["rows_returned"], stage=current.name)
+    if attributes.get("cache_hit") is not None:
+        CACHE_LOOKUPS.inc(stage=current.name, result="hit" if attributes["cache_hit"] else "miss")
+
+    if settings.span_logs_enabled:
+        span_logger.info(json.dumps({
+            "span": current.name,
+            "trace_id": current.trace_id,
+            "span_id": current.span_id,
+            "parent_id": current.parent_id,
+            "status": status,
+            "duration_ms": round(duration * 1000, 3),
+            **attributes
+        }, default=str))
+
+
+def record_llm_usage(message) -> None:
+    """Add an LLM reply's token usage to the current span"""
+    current = _current_span.get()
+    usage = getattr(message, "usage_metadata", None)
+    if current is None or not usage:
+        return
+    current.add("prompt_tokens", usage.get("input_tokens", 0))
+    current.add("completion_tokens", usage.get("output_tokens", 0))
@@ -0,0 +1,214 @@
+import contextvars
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional
+
+from fastapi import Request
+
+from core.config import settings
+
+PROFILE_ID = re.compile(r"^[0-9a-f]{32}$")
+TRUE_VALUES = {"1", "true", "yes", "on"}
+
+
+class SamplingProfiler:
+    """
+    Samples one thread's Python stack every `interval` seconds from a
+    background thread and counts the stacks in folded form ("outer;inner"),
+    the input format of flamegraph.pl, speedscope and similar tools.
+
+    With an `anchor` frame only stacks running inside it are counted. On an
+    event loop thread this keeps the samples to the profiled coroutine: while
+    it awaits, the thread runs other tasks, which are counted as `skipped`.
+    """
+
+    def __init__(self, thread_id: int, interval: float, anchor=None):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.anchor = anchor
+        self.stacks: Dict[str, int] = {}
+        self.skipped = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            if self.anchor is not None and not self._inside(frame, self.anchor):
+                self.skipped += 1
+                continue
+            stack = self._fold(frame)
+            self.stacks[stack] = self.stacks.get(stack, 0) + 1
+
+    @staticmethod
+    def _inside(frame, anchor) -> bool:
+        while frame is not None:
+            if frame is anchor:
+                return True
+            frame = frame.f_back
+        return False
+
+    @staticmethod
+    def _fold(frame) -> str:
+        frames = []
+        while frame is not None:
+            code = frame.f_code
+            frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ";".join(reversed(frames))
+
+
+class RequestProfile:
+    """A profiled request: sampled stacks plus timed sections of the pipeline"""
+
+    def __init__(self, route: str, interval: float, anchor=None):
+        self.id = uuid.uuid4().hex
+        self.route = route
+        self.interval = interval
+        self.created_at = datetime.now(timezone.utc)
+        self.duration = 0.0
+        self.sections: List[Dict[str, Any]] = []
+        self._profiler = SamplingProfiler(threading.get_ident(), interval, anchor)
+        self._lock = threading.Lock()
+        self.started = 0.0
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._profiler.start()
+
+    def stop(self):
+        self._profiler.stop()
+        self.duration = time.perf_counter() - self.started
+
+    def add_section(self, name: str, offset: float, duration: float, attributes: Dict[str, Any]):
+        with self._lock:
+            self.sections.append({
+                "name": name,
+                "offset_ms": round(offset * 1000, 3),
+                "duration_ms": round(duration * 1000, 3),
+                **attributes
+            })
+
+    def folded(self) -> str:
+        """One "stack count" line per distinct stack"""
+        stacks = self._profiler.stacks
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(stacks.items()))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "route": self.route,
+            "created_at": self.created_at.isoformat(),
+            "duration_ms": round(self.duration * 1000, 3),
+            "interval_ms": self.interval * 1000,
+            "samples": sum(self._profiler.stacks.values()),
+            # Samples of the thread running other work, e.g. other requests' tasks on the event loop
+            "skipped_samples": self._profiler.skipped,
+            "sections": self.sections,
+            "folded": self.folded()
+        }
+
+
+_active_profile: contextvars.ContextVar[Optional[RequestProfile]] = contextvars.ContextVar("active_profile", default=None)
+
+
+def profile_requested(request: Request) -> bool:
+    """Whether the request asks to be profiled (X-Profile header or ?profile=), when profiling is enabled"""
+    if not settings.profiling_enabled:
+        return False
+    flag = request.headers.get("x-profile") or request.query_params.get("profile")
+    return flag is not None and flag.lower() in TRUE_VALUES
+
+
+@contextmanager
+def profiled(route: str, enabled: bool) -> Iterator[Optional[RequestProfile]]:
+    """
+    Run the block under a sampling profiler of the current thread and save
+    the profile when it ends. Yields None (and does nothing) unless enabled.
+
+    Only stacks inside the calling function are sampled, so in an async
+    route the profile holds that request's own work, not whatever other
+    tasks the event loop runs while it awaits.
+    """
+    if not enabled:
+        yield None
+        return
+
+    # The frame of the function using `with profiled(...)` (past contextlib's __enter__)
+    caller = sys._getframe(2)
+    profile = RequestProfile(route, settings.profiling_interval_ms / 1000, caller)
+    token = _active_profile.set(profile)
+    profile.start()
+    try:
+        yield profile
+    finally:
+        profile.stop()
+        _active_profile.reset(token)
+        try:
+            save_profile(profile)
+            print(f"Saved profile {profile.id} for {route} ({profile.duration * 1000:.0f} ms)")
+        except OSError as e:
+            print(f"Error saving profile: {str(e)}")
+
+
+@contextmanager
+def profile_section(name: str, **attributes) -> Iterator[Dict[str, Any]]:
+    """
+    Time a block (e.g. a pandas operation) into the active profile. Yields a
+    dict for attributes known only afterwards, such as result rows. Outside
+    a profiled request this only costs a context variable lookup.
+    """
+    profile = _active_profile.get()
+    if profile is None:
+        yield attributes
+        return
+
+    start = time.perf_counter()
+    try:
+        yield attributes
+    finally:
+        profile.add_section(name, start - profile.started, time.perf_counter() - start, attributes)
+
+
+def save_profile(profile: RequestProfile):
+    """Write a profile to profiles_dir, keeping only the newest profiles_max_kept"""
+    os.makedirs(settings.profiles_dir, exist_ok=True)
+    path = os.path.join(settings.profiles_dir, f"{profile.id}.json")
+    with open(path, "w") as f:
+        json.dump(profile.to_dict(), f, default=str)
+
+    saved = [os.path.join(settings.profiles_dir, name) for name in os.listdir(settings.profiles_dir) if name.endswith(".json")]
+    if len(saved) > settings.profiles_max_kept:
+        saved.sort(key=os.path.getmtime)
+        for old_path in saved[:len(saved) - settings.profiles_max_kept]:
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass
+
+
+def load_profile(profile_id: str) -> Optional[Dict[str, Any]]:
+    """A saved profile, or None if there is no such profile"""
+    if not PROFILE_ID.match(profile_id):
+        return None
+    path = os.path.join(settings.profiles_dir, f"{profile_id}.json")
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
@@ -1,7 +1,36 @@
-from sqlalchemy.orm import Session
-from models.csv_model import CSVSession, CSVFile
-from typing import List, Optional
-import os
+from sqlalchemy import and_, bindparam, func, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, selectinload
+from models.csv_model import CSVSession, CSVFile, CSVBlob
+from models.query_model import QueryExecution
+from typing import Dict, List, Optional, Tuple
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from services.aggregate_cube import cube_path
+from services.out_of_core import profile_path
+import base64
+import json
+
+# A session used again within this many seconds is not written to again
+TOUCH_INTERVAL_S = 60
+
+
+def artifact_paths(file_path: str) -> List[str]:
+    """An uploaded file and every sidecar derived from it"""
+    return [file_path, cube_path(file_path), profile_path(file_path)]
+
+
+def encode_cursor(created_at: datetime, session_pk: str) -> str:
+    """Opaque cursor for the session after which the next page starts"""
+    return base64.urlsafe_b64encode(json.dumps([created_at.isoformat(), session_pk]).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        created_at, session_pk = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(created_at), str(session_pk)
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
 
 class CSVSessionCRUD:
     @staticmethod
@@ -17,17 +46,79 @@ class CSVSessionCRUD:
         return db.query(CSVSession).filter(CSVSession.session_id == session_id).first()
     
     @staticmethod
-    def get_all_sessions(db: Session) -> List[CSVSession]:
-        return db.query(CSVSession).all()
+    def list_sessions(
+        db: Session,
+        limit: int,
+        cursor: Optional[str] = None,
+        include_files: bool = True
+    ) -> Tuple[List[CSVSession], Optional[str]]:
+        """
+        One page of sessions ordered by (created_at, id), and the cursor of the next page.
+
+        Files are loaded for the whole page with one extra IN query. The cursor
+        carries the last row's created_at as a datetime and is compared with
+        parameters of the columns' own types, so the order is the database's
+        datetime order on every backend.
+        """
+        query = db.query(CSVSession)
+        if include_files:
+            query = query.options(selectinload(CSVSession.csv_files))
+        if cursor:
+            after_created_at, after_pk = decode_cursor(cursor)
+            after = bindparam("after_created_at", after_created_at, type_=CSVSession.created_at.type)
+            after_id = bindparam("after_id", after_pk, type_=CSVSession.id.type)
+            query = query.filter(or_(
+                CSVSession.created_at > after,
+                and_(CSVSession.created_at == after, CSVSession.id > after_id)
+            ))
+        sessions = query.order_by(CSVSession.created_at, CSVSession.id).limit(limit + 1).all()
+
+        next_cursor = None
+        if len(sessions) > limit:
+            sessions = sessions[:limit]
+            next_cursor = encode_cursor(sessions[-1].created_at, sessions[-1].id)
+        return sessions, next_cursor
+    
+    @staticmethod
+    def delete_session(db: Session, session_id: str) -> Optional[List[str]]:
+        """
+        Delete a session, its files and their query history with a fixed
+        number of bulk statements. Returns the paths to remove from disk
+        (the caller hands them to the cleanup worker), or None if the session
+        does not exist.
+        """
+        session = db.query(CSVSession.id).filter(CSVSession.session_id == session_id).first()
+        if not session:
+            return None
+        
+        files = db.query(CSVFile.file_path, CSVFile.content_hash).filter(CSVFile.session_id == session_id).all()
+        file_ids = db.query(CSVFile.id).filter(CSVFile.session_id == session_id).scalar_subquery()
+        db.query(QueryExecution).filter(QueryExecution.file_id.in_(file_ids)).delete(synchronize_session=False)
+        db.query(CSVFile).filter(CSVFile.session_id == session_id).delete(synchronize_session=False)
+        db.query(CSVSession).filter(CSVSession.session_id == session_id).delete(synchronize_session=False)
+        paths = CSVBlobCRUD.release(db, Counter(f.content_hash for f in files if f.content_hash))
+        db.commit()
+        return paths + [path for f in files if not f.content_hash for path in artifact_paths(f.file_path)]
     
     @staticmethod
-    def delete_session(db: Session, session_id: str) -> bool:
-        session = db.query(CSVSession).filter(CSVSession.session_id == session_id).first()
-        if session:
-            db.delete(session)
-            db.commit()
-            return True
-        return False
+    def touch_session(db: Session, session_id: str):
+        """
+        Record activity on a session (chat, upload), which keeps it from
+        expiring. At most one write per session every TOUCH_INTERVAL_S.
+        """
+        recent = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=TOUCH_INTERVAL_S)
+        last_active = func.coalesce(CSVSession.updated_at, CSVSession.created_at)
+        db.query(CSVSession).filter(CSVSession.session_id == session_id, last_active < recent).update(
+            {CSVSession.updated_at: func.now()}, synchronize_session=False
+        )
+        db.commit()
+    
+    @staticmethod
+    def get_expired_session_ids(db: Session, cutoff: datetime, limit: int) -> List[str]:
+        """Sessions without activity (creation, upload, chat) since the cutoff"""
+        last_active = func.coalesce(CSVSession.updated_at, CSVSession.created_at)
+        rows = db.query(CSVSession.session_id).filter(last_active < cutoff).limit(limit).all()
+        return [session_id for (session_id,) in rows]
 
 class CSVFileCRUD:
     @staticmethod
@@ -38,7 +129,8 @@ class CSVFileCRUD:
         original_filename: str, 
         file_size: int, 
         content_type: str, 
-        file_path: str
+        file_path: str,
+        content_hash: Optional[str] = None
     ) -> CSVFile:
         csv_file = CSVFile(
             session_id=session_id,
@@ -46,7 +138,8 @@ class CSVFileCRUD:
             original_filename=original_filename,
             file_size=file_size,
             content_type=content_type,
-            file_path=file_path
+            file_path=file_path,
+            content_hash=content_hash
         )
         db.add(csv_file)
         db.commit()
@@ -62,14 +155,81 @@ class CSVFileCRUD:
         return db.query(CSVFile).filter(CSVFile.id == file_id).first()
     
     @staticmethod
-    def delete_file(db: Session, file_id: str) -> bool:
-        csv_file = db.query(CSVFile).filter(CSVFile.id == file_id).first()
-        if csv_file:
-            # Delete the physical file
-            if os.path.exists(csv_file.file_path):
-                os.remove(csv_file.file_path)
-            
-            db.delete(csv_file)
+    def delete_file(db: Session, file_id: str) -> Optional[List[str]]:
+        """
+        Delete a file's record and query history. Returns the paths to remove
+        from disk (the caller hands them to the cleanup worker), or None if
+        the file does not exist. Deduplicated contents are only removed with
+        their last reference.
+        """
+        csv_file = db.query(CSVFile.file_path, CSVFile.content_hash).filter(CSVFile.id == file_id).first()
+        if not csv_file:
+            return None
+        
+        db.query(QueryExecution).filter(QueryExecution.file_id == file_id).delete(synchronize_session=False)
+        db.query(CSVFile).filter(CSVFile.id == file_id).delete(synchronize_session=False)
+        if csv_file.content_hash:
+            paths = CSVBlobCRUD.release(db, {csv_file.content_hash: 1})
+        else:
+            paths = artifact_paths(csv_file.file_path)
+        db.commit()
+        return paths
+    
+    @staticmethod
+    def get_all_file_paths(db: Session) -> List[str]:
+        paths = [path for (path,) in db.query(CSVFile.file_path)]
+        return paths + [path for (path,) in db.query(CSVBlob.file_path)]
+
+class CSVBlobCRUD:
+    @staticmethod
+    def add_reference(db: Session, content_hash: str) -> Optional[CSVBlob]:
+        """Count one more upload of existing contents, or None if they are not stored"""
+        updated = (
+            db.query(CSVBlob)
+            .filter(CSVBlob.content_hash == content_hash)
+            .update({CSVBlob.ref_count: CSVBlob.ref_count + 1}, synchronize_session=False)
+        )
+        db.commit()
+        if not updated:
+            return None
+        return db.query(CSVBlob).filter(CSVBlob.content_hash == content_hash).first()
+    
+    @staticmethod
+    def create_blob(db: Session, content_hash: str, file_path: str, file_size: int) -> Optional[CSVBlob]:
+        """Record new contents with one reference, or None if a concurrent upload recorded them first"""
+        blob = CSVBlob(content_hash=content_hash, file_path=file_path, file_size=file_size, ref_count=1)
+        db.add(blob)
+        try:
             db.commit()
-            return True
-        return False 
\ No newline at end of file
+        except IntegrityError:
+            db.rollback()
+            return None
+        db.refresh(blob)
+        return blob
+    
+    @staticmethod
+    def release(db: Session, references: Dict[str, int]) -> List[str]:
+        """
+        Drop references to blobs in the caller's transaction. Blobs left
+        without references are deleted; returns the paths of their contents
+        and sidecars for the caller to remove once the transaction commits.
+        """
+        if not references:
+            return []
+        for content_hash, count in references.items():
+            db.query(CSVBlob).filter(CSVBlob.content_hash == content_hash).update(
+                {CSVBlob.ref_count: CSVBlob.ref_count - count}, synchronize_session=False
+            )
+        unreferenced = db.query(CSVBlob.file_path).filter(
+            CSVBlob.content_hash.in_(list(references)), CSVBlob.ref_count <= 0
+        ).all()
+        db.query(CSVBlob).filter(
+            CSVBlob.content_hash.in_(list(references)), CSVBlob.ref_count <= 0
+        ).delete(synchronize_session=False)
+        return [path for (file_path,) in unreferenced for path in artifact_paths(file_path)]
+    
+    @staticmethod
+    def remove_reference(db: Session, content_hash: str) -> List[str]:
+        paths = CSVBlobCRUD.release(db, {content_hash: 1})
+        db.commit()
+        return paths
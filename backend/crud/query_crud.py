@@ -0,0 +1,64 @@
+from sqlalchemy.orm import Session
+from models.query_model import QueryExecution
+from typing import List, Optional
+
+class QueryExecutionCRUD:
+    @staticmethod
+    def create_execution(
+        db: Session,
+        file_id: str,
+        file_fingerprint: str,
+        sql_hash: str,
+        sql_query: str,
+        result_fingerprint: Optional[str],
+        row_count: int,
+        execution_ms: float,
+        served_from_cache: bool = False,
+        result_blob: Optional[bytes] = None
+    ) -> QueryExecution:
+        execution = QueryExecution(
+            file_id=file_id,
+            file_fingerprint=file_fingerprint,
+            sql_hash=sql_hash,
+            sql_query=sql_query,
+            result_fingerprint=result_fingerprint,
+            row_count=row_count,
+            execution_ms=execution_ms,
+            served_from_cache=served_from_cache,
+            result_blob=result_blob
+        )
+        db.add(execution)
+        db.commit()
+        db.refresh(execution)
+        return execution
+    
+    @staticmethod
+    def get_cached_execution(
+        db: Session,
+        file_fingerprint: str,
+        sql_hash: str,
+        file_id: Optional[str] = None
+    ) -> Optional[QueryExecution]:
+        """
+        Latest execution of a query on the same contents that stored its
+        result. Content-hash fingerprints match across files; pass file_id to
+        restrict the lookup to one file.
+        """
+        query = db.query(QueryExecution).filter(
+            QueryExecution.file_fingerprint == file_fingerprint,
+            QueryExecution.sql_hash == sql_hash,
+            QueryExecution.result_blob.isnot(None)
+        )
+        if file_id is not None:
+            query = query.filter(QueryExecution.file_id == file_id)
+        return query.order_by(QueryExecution.created_at.desc()).first()
+    
+    @staticmethod
+    def get_executions_by_file(db: Session, file_id: str, limit: int = 100) -> List[QueryExecution]:
+        return (
+            db.query(QueryExecution)
+            .filter(QueryExecution.file_id == file_id)
+            .order_by(QueryExecution.created_at.desc())
+            .limit(limit)
+            .all()
+        )
@@ -1,9 +1,64 @@
-from sqlalchemy import create_engine
+import threading
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 
-DATABASE_URL = "sqlite:///./test.db"
+from core.config import settings
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+try:
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+except ImportError:
+    create_async_engine = None
+
+DATABASE_URL = settings.database_url
+
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+
+def _engine_options(url: str) -> dict:
+    """Pool and driver options for a database URL"""
+    url = make_url(url)
+    if url.get_backend_name() != "sqlite":
+        return dict(
+            pool_size=settings.db_pool_size,
+            max_overflow=settings.db_max_overflow,
+            pool_timeout=settings.db_pool_timeout,
+            pool_recycle=settings.db_pool_recycle,
+            pool_pre_ping=True
+        )
+    if url.database in (None, "", ":memory:"):
+        # Every connection to :memory: is a new database; share one instead
+        return dict(connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    return dict(
+        connect_args={"check_same_thread": False},
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout
+    )
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    WAL lets readers run alongside the single writer, synchronous=NORMAL only
+    syncs at checkpoints under WAL, and busy_timeout makes a second writer
+    wait for the lock instead of failing with "database is locked".
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={settings.sqlite_journal_mode}")
+    cursor.execute(f"PRAGMA synchronous={settings.sqlite_synchronous}")
+    cursor.execute(f"PRAGMA cache_size=-{settings.sqlite_cache_size_kb}")
+    cursor.execute(f"PRAGMA busy_timeout={settings.sqlite_busy_timeout_ms}")
+    cursor.close()
+
+
+def _configure(engine):
+    if engine.dialect.name == "sqlite":
+        event.listen(engine, "connect", _set_sqlite_pragmas)
+    return engine
+
+
+engine = _configure(create_engine(DATABASE_URL, **_engine_options(DATABASE_URL)))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 def get_db():
@@ -12,3 +67,62 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+
+def async_database_url() -> str:
+    if settings.database_async_url:
+        return settings.database_async_url
+    url = make_url(DATABASE_URL)
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None:
+        raise ValueError(f"no async driver known for {url.get_backend_name()}; set database_async_url")
+    return url.set(drivername=driver).render_as_string(hide_password=False)
+
+
+def build_async_engine(url: str):
+    """Async engine with the same pool and SQLite pragmas as the sync engine"""
+    if create_async_engine is None:
+        raise ImportError("sqlalchemy.ext.asyncio is not available")
+    options = _engine_options(url)
+    # aiosqlite gives each connection its own thread already
+    options.pop("connect_args", None)
+    async_engine = create_async_engine(url, **options)
+    _configure(async_engine.sync_engine)
+    return async_engine
+
+
+_async_engine = None
+_async_session_factory = None
+_async_lock = threading.Lock()
+
+
+def get_async_engine():
+    """
+    The async engine, created on first use so processes that never await the
+    database open no second pool. None when the async driver (e.g. aiosqlite)
+    is not installed.
+    """
+    global _async_engine, _async_session_factory
+    with _async_lock:
+        if _async_session_factory is None:
+            try:
+                _async_engine = build_async_engine(async_database_url())
+            except (ImportError, ValueError) as e:
+                print(f"Async database support disabled: {str(e)}")
+                return None
+            _async_session_factory = async_sessionmaker(_async_engine, class_=AsyncSession, expire_on_commit=False)
+        return _async_engine
+
+
+def AsyncSessionLocal():
+    """A new AsyncSession on the async engine"""
+    if get_async_engine() is None:
+        raise RuntimeError("Async database support needs the async driver (aiosqlite) installed")
+    return _async_session_factory()
+
+
+async def get_async_db():
+    """Async counterpart of get_db, for routes that await the database"""
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,17 +1,39 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from api.csv_routes import router as csv_router
 from api.chat_routes import router as chat_router
+from api.profile_routes import router as profile_router
+from core.metrics import registry
 from db.base import Base
+from core.config import settings
 from db.session import engine
+from services.cleanup_service import cleanup_worker
+from services.csv_parser import set_parser_threads
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
 
-app = FastAPI(title="Insight Query", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # pyarrow's CSV thread pool is process-wide, so it is sized once here
+    set_parser_threads(settings.csv_parse_threads)
+    # Deleted files are removed from disk by a background worker
+    cleanup_worker.start()
+    yield
+    cleanup_worker.stop()
+
+app = FastAPI(title="Insight Query", version="1.0.0", lifespan=lifespan)
 
 app.include_router(csv_router, prefix="/api/csv", tags=["csv"])
 app.include_router(chat_router, prefix="/api", tags=["chat"])
+app.include_router(profile_router, prefix="/api", tags=["profiling"])
 
 @app.get("/")
 def read_root():
     return {"message": "Welcome to Insight Query!"}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Per-stage latency, token, row and cache metrics in the Prometheus text format"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
@@ -1 +1,2 @@
-from .csv_model import CSVSession, CSVFile 
\ No newline at end of file
+from models.csv_model import CSVSession, CSVFile, CSVBlob
+from models.query_model import QueryExecution
@@ -1,19 +1,31 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from db.base import Base
 import uuid
+from datetime import datetime, timezone
 
 class CSVSession(Base):
     __tablename__ = "csv_sessions"
     
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     session_id = Column(String, unique=True, nullable=False, index=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Set in Python too so SQLite stores every value in SQLAlchemy's format
+    # (CURRENT_TIMESTAMP has no fractional seconds), which the listing cursor compares against
+    created_at = Column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        server_default=func.now()
+    )
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
     # Relationship to CSV files
     csv_files = relationship("CSVFile", back_populates="session", cascade="all, delete-orphan")
+    
+    # Keyset pagination of the session listing walks (created_at, id)
+    __table_args__ = (
+        Index("ix_csv_sessions_created_at_id", "created_at", "id"),
+    )
 
 class CSVFile(Base):
     __tablename__ = "csv_files"
@@ -25,7 +37,28 @@ class CSVFile(Base):
     file_size = Column(Integer, nullable=False)
     content_type = Column(String, nullable=False)
     file_path = Column(String, nullable=False)
+    # sha256 of the contents; files uploaded before deduplication have none
+    content_hash = Column(String, ForeignKey("csv_blobs.content_hash"), nullable=True, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     # Relationship to session
-    session = relationship("CSVSession", back_populates="csv_files") 
\ No newline at end of file
+    session = relationship("CSVSession", back_populates="csv_files")
+    
+    # Stored contents, shared by every upload of the same data
+    blob = relationship("CSVBlob", back_populates="csv_files")
+    
+    # Executed queries (and cached results) for this file
+    query_executions = relationship("QueryExecution", back_populates="csv_file", cascade="all, delete-orphan") 
+
+class CSVBlob(Base):
+    """Contents of an uploaded CSV, stored once however many times it is uploaded"""
+    __tablename__ = "csv_blobs"
+    
+    content_hash = Column(String, primary_key=True)
+    file_path = Column(String, nullable=False)
+    file_size = Column(Integer, nullable=False)
+    # Number of CSVFile records using this blob; the blob is deleted at zero
+    ref_count = Column(Integer, nullable=False, default=1)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    csv_files = relationship("CSVFile", back_populates="blob")
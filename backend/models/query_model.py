@@ -0,0 +1,29 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text, Float, Boolean, LargeBinary, ForeignKey, Index
+from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
+from db.base import Base
+import uuid
+
+class QueryExecution(Base):
+    __tablename__ = "query_executions"
+    
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    file_id = Column(String, ForeignKey("csv_files.id"), nullable=False, index=True)
+    file_fingerprint = Column(String, nullable=False)
+    sql_hash = Column(String, nullable=False)
+    sql_query = Column(Text, nullable=False)
+    result_fingerprint = Column(String, nullable=True)
+    row_count = Column(Integer, nullable=False)
+    execution_ms = Column(Float, nullable=False)
+    served_from_cache = Column(Boolean, nullable=False, default=False)
+    # zstd-compressed Arrow IPC stream of the result; only kept for small results
+    result_blob = Column(LargeBinary, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    # Relationship to file
+    csv_file = relationship("CSVFile", back_populates="query_executions")
+    
+    __table_args__ = (
+        # Results are looked up by contents, so uploads of the same data share them
+        Index("ix_query_executions_lookup", "file_fingerprint", "sql_hash"),
+    )
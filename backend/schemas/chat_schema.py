@@ -27,4 +27,13 @@ class ChatResponse(BaseModel):
     request_type: RequestType
     message: str
     data: Optional[Dict[str, Any]] = None
-    error: Optional[str] = None 
\ No newline at end of file
+    error: Optional[str] = None
+
+class BatchChatRequest(BaseModel):
+    session_id: str
+    user_messages: List[str]
+
+class BatchChatResponse(BaseModel):
+    session_id: str
+    # One result per message, in order; failed messages have error set
+    results: List[ChatResponse]
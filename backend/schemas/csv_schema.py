@@ -8,6 +8,7 @@ class CSVFileResponse(BaseModel):
     original_filename: str
     file_size: int
     content_type: str
+    content_hash: Optional[str] = None
     created_at: datetime
     
     class Config:
@@ -23,6 +24,17 @@ class CSVSessionResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class CSVSessionSummary(BaseModel):
+    """Session in the paginated listing; only the requested fields are set"""
+    id: Optional[str] = None
+    session_id: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    csv_files: Optional[List[CSVFileResponse]] = None
+    
+    class Config:
+        from_attributes = True
+
 class CSVUploadResponse(BaseModel):
     message: str
     session_id: str
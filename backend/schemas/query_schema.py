@@ -0,0 +1,16 @@
+from pydantic import BaseModel
+from typing import Optional
+from datetime import datetime
+
+class QueryExecutionResponse(BaseModel):
+    id: str
+    file_id: str
+    sql_query: str
+    result_fingerprint: Optional[str]
+    row_count: int
+    execution_ms: float
+    served_from_cache: bool
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
@@ -0,0 +1,286 @@
+import os
+import re
+import pandas as pd
+from typing import Dict, Iterable, List, Optional
+
+from core.config import settings
+from services.csv_parser import read_csv_chunks
+
+CUBE_VERSION = 2
+CUBE_SUFFIX = ".cube.pkl"
+
+IDENTIFIER = r'(?:"[^"]+"|`[^`]+`|\[[^\]]+\]|[A-Za-z_][A-Za-z0-9_]*)'
+
+GROUP_BY_QUERY = re.compile(
+    r"^\s*SELECT\s+(?P<select>.+?)\s+FROM\s+(?P<table>" + IDENTIFIER + r")"
+    r"\s+GROUP\s+BY\s+(?P<group>" + IDENTIFIER + r"|\d+)"
+    r"(?:\s+ORDER\s+BY\s+(?P<order>.+?))?"
+    r"(?:\s+LIMIT\s+(?P<limit>\d+)(?:\s+OFFSET\s+(?P<offset>\d+))?)?"
+    r"\s*;?\s*$",
+    re.IGNORECASE | re.DOTALL
+)
+SELECT_ITEM = re.compile(r"^(?P<expr>.+?)(?:\s+AS\s+(?P<alias>" + IDENTIFIER + r"))?$", re.IGNORECASE | re.DOTALL)
+AGGREGATE = re.compile(r"^(?P<func>COUNT|SUM|AVG|MIN|MAX)\s*\(\s*(?P<arg>\*|" + IDENTIFIER + r")\s*\)$", re.IGNORECASE)
+ORDER_ITEM = re.compile(r"^(?P<key>.+?)(?:\s+(?P<direction>ASC|DESC))?$", re.IGNORECASE | re.DOTALL)
+
+
+def _unquote(identifier: str) -> str:
+    if identifier[:1] in ('"', '`', '['):
+        return identifier[1:-1]
+    return identifier
+
+
+def _normalize(expression: str) -> str:
+    return re.sub(r"\s+", "", expression).lower()
+
+
+def cube_path(file_path: str) -> str:
+    """Location of the cube sidecar for an uploaded CSV"""
+    return file_path + CUBE_SUFFIX
+
+
+def numeric_columns(df: pd.DataFrame) -> List[str]:
+    return [
+        column for column in df.select_dtypes(include=["number"]).columns
+        if not pd.api.types.is_bool_dtype(df[column])
+    ]
+
+
+def _is_text_column(values: pd.Series) -> bool:
+    # SQLite compares text in binary order; mixed-type columns would not match it.
+    # A chunk where the column is entirely empty is parsed as float.
+    if values.isna().all():
+        return True
+    if not (pd.api.types.is_object_dtype(values) or isinstance(values.dtype, pd.CategoricalDtype)):
+        return False
+    return values.dropna().map(type).eq(str).all()
+
+
+def _sqlite_order(key):
+    # NULL sorts first, then numbers, then text
+    if pd.isna(key):
+        return (0, 0)
+    if isinstance(key, str):
+        return (2, key)
+    return (1, key)
+
+
+def group_stats(df: pd.DataFrame, column: str, numeric) -> Dict[str, object]:
+    """Mergeable aggregates of every other column grouped by one column"""
+    keys = df[column].astype(object)
+    grouped = df.drop(columns=[column]).groupby(keys, dropna=False, sort=False)
+    values = [value for value in df.columns if value in numeric and value != column]
+    return {
+        "size": grouped.size(),
+        "count": grouped.count(),
+        "sum": grouped[values].sum(min_count=1),
+        "min": grouped[values].min(),
+        "max": grouped[values].max()
+    }
+
+
+def merge_group_stats(left: Dict[str, object], right: Dict[str, object]) -> Dict[str, object]:
+    merged = {}
+    for name in left:
+        combined = pd.concat([left[name], right[name]]).groupby(level=0, dropna=False, sort=False)
+        if name == "sum":
+            merged[name] = combined.sum(min_count=1)
+        elif name in ("min", "max"):
+            merged[name] = getattr(combined, name)()
+        else:
+            merged[name] = combined.sum()
+    return merged
+
+
+def finalize_group_stats(stats: Dict[str, object], numeric) -> Dict[str, object]:
+    """Keep columns numeric in every chunk and put groups in SQLite's GROUP BY order"""
+    order = sorted(stats["size"].index, key=_sqlite_order)
+    finalized = {}
+    for name, frame in stats.items():
+        if name in ("sum", "min", "max"):
+            frame = frame[[column for column in frame.columns if column in numeric]]
+        finalized[name] = frame.reindex(order)
+    return finalized
+
+
+class AggregateCube:
+    """
+    Materialized group-by aggregates of an uploaded CSV.
+
+    For every low-cardinality text column the cube holds the group sizes,
+    per-column non-null counts and the sum/min/max of every numeric column,
+    so `SELECT cat, AGG(num) FROM df GROUP BY cat [ORDER BY ...] [LIMIT n]`
+    is answered in O(groups) with the same result SQLite would return.
+    """
+
+    def __init__(self, groups: Dict[str, Dict[str, object]], columns: List[str]):
+        self.groups = groups
+        self.columns = columns
+
+    @classmethod
+    def build(cls, df: pd.DataFrame, max_groups: int = settings.aggregate_cube_max_groups) -> "AggregateCube":
+        return cls.build_from_chunks([df], max_groups)
+
+    @classmethod
+    def build_from_chunks(cls, chunks: Iterable[pd.DataFrame], max_groups: int = settings.aggregate_cube_max_groups) -> "AggregateCube":
+        """Build the cube from a stream of DataFrame chunks, merging partial aggregates"""
+        partials, numeric, columns, rejected = {}, None, None, set()
+        for chunk in chunks:
+            if columns is None:
+                columns = list(chunk.columns)
+            chunk_numeric = set(numeric_columns(chunk))
+            numeric = chunk_numeric if numeric is None else numeric & chunk_numeric
+            for column in chunk.columns:
+                if column in rejected:
+                    continue
+                if not _is_text_column(chunk[column]):
+                    rejected.add(column)
+                    partials.pop(column, None)
+                    continue
+                stats = group_stats(chunk, column, chunk_numeric)
+                if column in partials:
+                    stats = merge_group_stats(partials[column], stats)
+                if len(stats["size"]) > max_groups:
+                    rejected.add(column)
+                    partials.pop(column, None)
+                    continue
+                partials[column] = stats
+
+        groups = {column: finalize_group_stats(stats, numeric) for column, stats in partials.items()}
+        return cls(groups, columns or [])
+
+    def save(self, path: str):
+        pd.to_pickle({"version": CUBE_VERSION, "groups": self.groups, "columns": self.columns}, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["AggregateCube"]:
+        """Read a cube sidecar, or None when it is missing or outdated"""
+        if not os.path.exists(path):
+            return None
+        try:
+            data = pd.read_pickle(path)
+        except Exception as e:
+            print(f"Error reading aggregate cube: {str(e)}")
+            return None
+        if data.get("version") != CUBE_VERSION:
+            return None
+        return cls(data["groups"], data["columns"])
+
+    def _resolve(self, identifier: str) -> Optional[str]:
+        # SQLite identifiers are case-insensitive
+        name = _unquote(identifier).lower()
+        matches = [column for column in self.columns if str(column).lower() == name]
+        return matches[0] if len(matches) == 1 else None
+
+    def answer(self, sql_query: str) -> Optional[pd.DataFrame]:
+        """Answer a simple single-column GROUP BY query from the cube, or None if it does not match"""
+        match = GROUP_BY_QUERY.match(sql_query.strip())
+        if not match or _unquote(match.group("table")).lower() != "df":
+            return None
+
+        select_items = [item.strip() for item in match.group("select").split(",")]
+
+        group = match.group("group")
+        if group.isdigit():
+            position = int(group) - 1
+            if not 0 <= position < len(select_items):
+                return None
+            group = SELECT_ITEM.match(select_items[position]).group("expr").strip()
+        group_column = self._resolve(group) if re.fullmatch(IDENTIFIER, group) else None
+        if group_column not in self.groups:
+            return None
+        stats = self.groups[group_column]
+
+        names, expressions, values = [], [], []
+        for item in select_items:
+            item_match = SELECT_ITEM.match(item)
+            expression = item_match.group("expr").strip()
+            alias = item_match.group("alias")
+
+            if re.fullmatch(IDENTIFIER, expression):
+                if self._resolve(expression) != group_column:
+                    return None  # A bare non-grouped column has no defined value
+                keys = stats["size"].index.to_series().astype(object)
+                value = keys.where(keys.notna(), None)
+                name = group_column
+            else:
+                value = self._aggregate(stats, expression)
+                if value is None:
+                    return None
+                name = expression
+            names.append(_unquote(alias) if alias else name)
+            expressions.append(expression)
+            values.append(value)
+
+        result = pd.DataFrame({i: value.values for i, value in enumerate(values)})
+        if match.group("order"):
+            result = self._order(result, match.group("order"), names, expressions)
+            if result is None:
+                return None
+        result.columns = names
+
+        offset = int(match.group("offset") or 0)
+        if match.group("limit"):
+            result = result.iloc[offset:offset + int(match.group("limit"))]
+        return result.reset_index(drop=True)
+
+    def _aggregate(self, stats, expression: str) -> Optional[pd.Series]:
+        match = AGGREGATE.match(expression)
+        if not match:
+            return None
+        func = match.group("func").upper()
+        argument = match.group("arg")
+
+        if argument == "*":
+            return stats["size"] if func == "COUNT" else None
+        column = self._resolve(argument)
+        if func == "COUNT":
+            return stats["count"][column] if column in stats["count"].columns else None
+        if column not in stats["sum"].columns:
+            return None
+        if func == "AVG":
+            return stats["sum"][column] / stats["count"][column].where(stats["count"][column] > 0)
+        return stats[func.lower()][column]
+
+    def _order(self, result, order: str, names, expressions) -> Optional[pd.DataFrame]:
+        keys = []
+        for item in order.split(","):
+            item_match = ORDER_ITEM.match(item.strip())
+            key = item_match.group("key").strip()
+            ascending = (item_match.group("direction") or "ASC").upper() == "ASC"
+
+            if key.isdigit():
+                position = int(key) - 1
+            else:
+                lowered = _unquote(key).lower()
+                positions = [i for i, name in enumerate(names) if str(name).lower() == lowered]
+                positions += [i for i, expression in enumerate(expressions) if _normalize(expression) == _normalize(key)]
+                position = positions[0] if positions else -1
+            if not 0 <= position < len(names):
+                return None
+            keys.append((position, ascending))
+
+        # Stable sorts from the last key to the first; SQLite puts NULLs first in ascending order
+        for position, ascending in reversed(keys):
+            result = result.sort_values(
+                position, ascending=ascending, na_position="first" if ascending else "last", kind="stable"
+            )
+        return result
+
+
+def build_cube_for_file(file_path: str):
+    """Build and store the cube sidecar for an uploaded CSV (run after upload)"""
+    try:
+        # Streamed in chunks so files larger than memory can be processed
+        chunks = read_csv_chunks(file_path, delimiter=",", chunk_rows=settings.out_of_core_chunk_rows)
+        cube = AggregateCube.build_from_chunks(chunks)
+        if cube.groups:
+            cube.save(cube_path(file_path))
+    except Exception as e:
+        print(f"Error building aggregate cube: {str(e)}")
+
+
+def load_cube_for_file(file_path: str) -> Optional[AggregateCube]:
+    if not settings.aggregate_cube_enabled:
+        return None
+    return AggregateCube.load(cube_path(file_path))
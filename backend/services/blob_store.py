@@ -0,0 +1,109 @@
+import hashlib
+import os
+import uuid
+from typing import Tuple
+from fastapi import UploadFile
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from crud.csv_crud import CSVBlobCRUD
+from models.csv_model import CSVBlob
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+STAGING_PREFIX = ".upload-"
+
+# pandas and pyarrow both decompress .zst files while reading them
+STORED_SUFFIXES = {"none": ".csv", "zstd": ".csv.zst"}
+
+
+def upload_compression() -> str:
+    """Compression for new uploads; stored uncompressed if zstandard is missing"""
+    compression = settings.upload_compression
+    if compression not in STORED_SUFFIXES:
+        raise ValueError(f"Unknown upload_compression: {compression}")
+    if compression == "zstd" and zstandard is None:
+        print("zstandard is not installed; storing uploads uncompressed")
+        return "none"
+    return compression
+
+
+async def stage_upload(upload: UploadFile, uploads_dir: str, compression: str = "none") -> Tuple[str, str, int]:
+    """
+    Write an upload to a staging file in chunks, hashing it on the way and
+    compressing it if asked. Returns the staging path, the sha256 of the
+    (uncompressed) contents and their uncompressed size.
+    """
+    staged_path = os.path.join(uploads_dir, f"{STAGING_PREFIX}{uuid.uuid4().hex}.tmp")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(staged_path, "wb") as buffer:
+            writer = buffer
+            if compression == "zstd":
+                compressor = zstandard.ZstdCompressor(level=settings.upload_zstd_level)
+                writer = compressor.stream_writer(buffer, closefd=False)
+            while True:
+                chunk = await upload.read(UPLOAD_CHUNK_BYTES)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                writer.write(chunk)
+                size += len(chunk)
+            if writer is not buffer:
+                writer.close()  # ends the zstd frame
+    except Exception:
+        if os.path.exists(staged_path):
+            os.remove(staged_path)
+        raise
+    return staged_path, digest.hexdigest(), size
+
+
+def store_upload(
+    db: Session,
+    staged_path: str,
+    content_hash: str,
+    file_size: int,
+    uploads_dir: str,
+    compression: str = "none"
+) -> Tuple[CSVBlob, bool]:
+    """
+    Move staged contents into the content-addressed store and take a
+    reference to them. Returns the blob and whether it is new; for contents
+    already stored the staging file is dropped and the existing file (and
+    its sidecars: aggregate cube, profile) is shared, however it was
+    compressed.
+
+    Each new blob gets a fresh path, so removing a blob whose last reference
+    was just deleted can never remove a re-upload of the same contents.
+    """
+    contents_path = staged_path  # where the unrecorded contents are right now
+    try:
+        for _ in range(2):
+            blob = CSVBlobCRUD.add_reference(db, content_hash)
+            if blob is not None:
+                os.remove(staged_path)
+                return blob, False
+
+            file_path = os.path.join(uploads_dir, f"{content_hash}-{uuid.uuid4().hex[:8]}{STORED_SUFFIXES[compression]}")
+            os.replace(staged_path, file_path)
+            contents_path = file_path
+            blob = CSVBlobCRUD.create_blob(db, content_hash, file_path, file_size)
+            if blob is not None:
+                return blob, True
+            # A concurrent upload of the same contents stored them first; use theirs
+            os.replace(file_path, staged_path)
+            contents_path = staged_path
+    except Exception:
+        # No blob references the contents, so nothing else will remove them
+        db.rollback()
+        if os.path.exists(contents_path):
+            os.remove(contents_path)
+        raise
+
+    os.remove(staged_path)
+    raise ValueError("Could not store upload: its contents were deleted and re-created concurrently")
@@ -1,25 +1,39 @@
 import pandas as pd
+import contextvars
 import json
 from typing import Dict, Any, List, Tuple
 from langchain_openai import ChatOpenAI
 from langchain.prompts import PromptTemplate, ChatPromptTemplate
+from langchain_core.language_models.chat_models import BaseChatModel
 from langchain_core.output_parsers import JsonOutputParser
 from langchain.schema import HumanMessage, SystemMessage
-from crud.csv_crud import CSVFileCRUD
+from concurrent.futures import ThreadPoolExecutor
+from core.config import settings
+from core.metrics import current_span, record_llm_usage, span, traced
+from core.profiling import profile_section
+from crud.csv_crud import CSVFileCRUD, CSVSessionCRUD
+from db.session import SessionLocal
 from sqlalchemy.orm import Session
 from schemas.chat_schema import RequestType
+from services.aggregate_cube import AggregateCube, load_cube_for_file
+from services.out_of_core import ChunkedCSVSource, is_large_file
+from services.csv_reader import read_csv_parallel
+from services.result_shaper import inject_limit, shape_result
+from services.sql_validator import SQLValidation, validate_sql
+from services.query_cache import QueryResultCache
 from dotenv import load_dotenv
 
 load_dotenv()
 
 class ChatService:
-    def __init__(self):
-
-        self.llm = ChatOpenAI(
+    def __init__(self, llm: BaseChatModel = None):
+        # Any LangChain chat model can be passed in (benchmarks use a local fake)
+        self.llm = llm or ChatOpenAI(
             model_name="gpt-4o-mini",
             temperature=0.1,
         )
         
+    @traced("classify")
     def classify_request(self, user_message: str) -> str:
         """Classify if the user is asking for an insight or a graph"""
         
@@ -50,6 +64,7 @@ class ChatService:
                 allowed_states=allowed_states,
                 allowed_states_str=allowed_states_str
             ))
+            record_llm_usage(response)
             classification = response.content.strip().lower()
             
             # Validate that the classification is one of the allowed states
@@ -62,28 +77,84 @@ class ChatService:
             # Default to insight if classification fails
             return "insight"
     
-    def load_csv_data(self, db: Session, session_id: str) -> pd.DataFrame:
-        """Load CSV data for a given session"""
+    @traced("classify_batch")
+    def classify_requests(self, user_messages: List[str]) -> List[str]:
+        """Classify several messages with one LLM call (falls back to one call per message)"""
+        allowed_states = [state.value for state in RequestType]
+        numbered = "\n".join(f"{i + 1}. {message}" for i, message in enumerate(user_messages))
+        
+        classification_prompt = f"""
+            Classify each of the following numbered user messages as either {' or '.join(allowed_states)}.
+            
+            User messages:
+            {numbered}
+            
+            Classification rules:
+            - If the user is asking for analysis, trends, patterns, insights, or understanding of the data → "insight"
+            - If the user is asking for a chart, graph, visualization, plot, or visual representation → "graph"
+            
+            Respond with only a JSON array with one classification per message, in order, e.g. ["insight", "graph"]
+            """
+        
+        try:
+            response = self.llm.invoke(classification_prompt)
+            record_llm_usage(response)
+            classifications = JsonOutputParser().parse(response.content)
+            if not isinstance(classifications, list) or len(classifications) != len(user_messages):
+                raise ValueError("Classification count does not match the messages")
+            return [
+                str(c).strip().lower() if str(c).strip().lower() in allowed_states else "insight"
+                for c in classifications
+            ]
+        except Exception as e:
+            print(f"Batch classification failed, classifying one by one: {str(e)}")
+            return [self.classify_request(message) for message in user_messages]
+    
+    def _get_session_file(self, db: Session, session_id: str):
+        """Get the CSV file record used for a session"""
         csv_files = CSVFileCRUD.get_files_by_session(db, session_id)
         
         if not csv_files:
             raise ValueError(f"No CSV files found for session {session_id}")
         
         # For now, use the first CSV file. In the future, you might want to merge multiple files
-        csv_file = csv_files[0]
-        
+        return csv_files[0]
+    
+    def _touch_session(self, db: Session, session_id: str):
+        """Mark the session active so the inactivity TTL does not expire it"""
         try:
-            df = pd.read_csv(csv_file.file_path, delimiter=",")
+            CSVSessionCRUD.touch_session(db, session_id)
+        except Exception as e:
+            db.rollback()
+            print(f"Error recording session activity: {str(e)}")
+    
+    def read_csv_file(self, file_path: str) -> pd.DataFrame:
+        """Read an uploaded CSV file (parsed on all cores when pyarrow is available)"""
+        try:
+            df = read_csv_parallel(file_path, delimiter=",")
             print(df.head())
             return df
         except Exception as e:
             raise ValueError(f"Error reading CSV file: {str(e)}")
     
-    def generate_insight(self, df: pd.DataFrame, user_message: str) -> Dict[str, Any]:
-        """Generate insights from CSV data using SQL queries"""
+    def load_csv_data(self, db: Session, session_id: str) -> pd.DataFrame:
+        """Load CSV data for a given session"""
+        return self.read_csv_file(self._get_session_file(db, session_id).file_path)
+    
+    def _summarize_data(self, df: pd.DataFrame, source: ChunkedCSVSource = None) -> str:
+        """Dataset summary for prompts; for streamed files it describes the whole file, not the sample"""
+        if source is not None:
+            profile = source.profile
+            return f"""
+            Dataset Summary:
+            - Shape: {(profile.rows, len(profile.columns))}
+            - Columns: {profile.columns}
+            - Data types: {profile.dtypes}
+            - Numeric columns: {profile.numeric_columns}
+            - Categorical columns: {profile.categorical_columns}
+        """
         
-        # Create a comprehensive summary of the data
-        data_summary = f"""
+        return f"""
             Dataset Summary:
             - Shape: {df.shape}
             - Columns: {list(df.columns)}
@@ -91,6 +162,21 @@ class ChatService:
             - Numeric columns: {df.select_dtypes(include=['number']).columns.tolist()}
             - Categorical columns: {df.select_dtypes(include=['object']).columns.tolist()}
         """
+    
+    @traced("generate_insight")
+    def generate_insight(
+        self,
+        df: pd.DataFrame,
+        user_message: str,
+        cube: AggregateCube = None,
+        source: ChunkedCSVSource = None,
+        query_cache: QueryResultCache = None,
+        data_summary: str = None
+    ) -> Dict[str, Any]:
+        """Generate insights from CSV data using SQL queries (answered from the aggregate cube when possible)"""
+        
+        # Create a comprehensive summary of the data (unless the caller already has one)
+        data_summary = data_summary or self._summarize_data(df, source)
         
         # First, generate SQL query based on user message
         sql_prompt = ChatPromptTemplate.from_messages([
@@ -118,17 +204,52 @@ class ChatService:
         try:
             # Generate SQL query
             sql_chain = sql_prompt | self.llm
-            sql_response = sql_chain.invoke({
-                'data_summary': data_summary,
-                'user_message': user_message,
-                'columns': list(df.columns)
-            })
-            
-            sql_query = sql_response.content.strip()
+            with span("generate_sql"):
+                sql_response = sql_chain.invoke({
+                    'data_summary': data_summary,
+                    'user_message': user_message,
+                    'columns': list(df.columns)
+                })
+                record_llm_usage(sql_response)
+            
+            # Queries returning raw rows are capped before they run
+            sql_query, row_limit = inject_limit(sql_response.content.strip())
             print(f"Generated SQL: {sql_query}")
             
+            # Check the query against the schema (and repair it) before touching the data
+            if source is not None:
+                dtypes, row_count = source.profile.dtypes, source.profile.rows
+            else:
+                dtypes, row_count = df.dtypes.to_dict(), len(df)
+            with span("validate_sql") as stage:
+                validation = validate_sql(sql_query, dtypes, row_count)
+                for attempt in range(settings.sql_repair_attempts):
+                    if validation.valid:
+                        break
+                    print(f"SQL validation failed: {validation.errors}")
+                    sql_query, row_limit = inject_limit(self._repair_sql(sql_query, validation, list(dtypes), user_message))
+                    print(f"Repaired SQL: {sql_query}")
+                    validation = validate_sql(sql_query, dtypes, row_count)
+                    stage.set(repairs=attempt + 1)
+                stage.set(valid=validation.valid, estimated_rows_scanned=validation.estimated_rows_scanned)
+            if not validation.valid:
+                raise ValueError(f"Generated SQL failed validation: {'; '.join(validation.errors)}")
+            
             # Execute SQL on the DataFrame
-            query_result = self._execute_sql_on_dataframe(df, sql_query)
+            # (served from the stored result when this query already ran on the unchanged file)
+            with span("query") as stage:
+                from_cache = False
+                if query_cache is not None:
+                    query_result, from_cache = query_cache.run(
+                        sql_query, lambda query: self._execute_sql_on_dataframe(df, query, cube, source)
+                    )
+                    stage.set(cache_hit=from_cache)
+                else:
+                    query_result = self._execute_sql_on_dataframe(df, sql_query, cube, source)
+            
+            # Fit the result into the prompt budget, summarizing large results
+            result_text, result_info = shape_result(query_result, row_limit)
+            result_info["from_cache"] = from_cache
             
             # Generate insights based on the SQL results
             insight_prompt = ChatPromptTemplate.from_messages([
@@ -152,18 +273,21 @@ class ChatService:
                 SQL Query Executed: {sql_query}
 
                 Query Results:
-                {query_result}
+                {result_text}
 
                 Analyze these results and provide specific insights based on the User Question.""")
             ])
             
-            insight_chain = insight_prompt | self.llm | JsonOutputParser()
+            insight_chain = insight_prompt | self.llm
             
-            response = insight_chain.invoke({
-                'user_message': user_message,
-                'sql_query': sql_query,
-                'query_results': str(query_result)
-            })
+            with span("insight_llm"):
+                insight_message = insight_chain.invoke({
+                    'user_message': user_message,
+                    'sql_query': sql_query,
+                    'query_results': result_text
+                })
+                record_llm_usage(insight_message)
+            response = JsonOutputParser().invoke(insight_message)
 
             print("Generated insight:", response)
             
@@ -181,12 +305,15 @@ class ChatService:
             if not insights or any('[insert' in str(insight) for insight in insights):
                 raise ValueError("Response contains placeholder text")
             
-            # Add SQL query to response
+            # Add SQL query and what was left out of the results to response
             response['sql_query'] = sql_query
+            response['result_info'] = result_info
+            response['sql_cost'] = validation.cost()
             
             return response
         except Exception as e:
             print(f"Error in generate_insight: {str(e)}")
+            current_span().set(error=str(e))
             return {
                 "message": "An error occurred while analyzing the data",
                 "insights": [f"Error: {str(e)}"],
@@ -194,8 +321,44 @@ class ChatService:
                 "sql_query": "N/A"
             }
     
-    def _execute_sql_on_dataframe(self, df: pd.DataFrame, sql_query: str) -> pd.DataFrame:
-        """Execute SQL query on a pandas DataFrame using pandasql"""
+    @traced("repair_sql")
+    def _repair_sql(self, sql_query: str, validation: SQLValidation, columns: List[str], user_message: str) -> str:
+        """Ask the LLM to fix a query that failed validation"""
+        response = self.llm.invoke([
+            SystemMessage(content=f"""You fix SQL queries over a table named df.
+            Available columns: {columns}
+            Quote column names that contain spaces or special characters with double quotes.
+            Return only the corrected SQL, without explanations or quotes around it."""),
+            HumanMessage(content=f"""User Question: {user_message}
+
+            SQL Query: {sql_query}
+
+            Problems: {'; '.join(validation.errors)}""")
+        ])
+        record_llm_usage(response)
+        return response.content.strip()
+    
+    @traced("execute_sql")
+    def _execute_sql_on_dataframe(self, df: pd.DataFrame, sql_query: str, cube: AggregateCube = None, source: ChunkedCSVSource = None) -> pd.DataFrame:
+        """Execute SQL query on a pandas DataFrame using pandasql (or streamed over a large file)"""
+        if cube is not None:
+            # Simple GROUP BY queries are answered from precomputed aggregates
+            with profile_section("execute_sql.aggregate_cube") as section:
+                result = cube.answer(sql_query)
+                section["rows_out"] = len(result) if result is not None else None
+            if result is not None:
+                print("Answered SQL from aggregate cube")
+                current_span().set(engine="aggregate_cube", cache_hit=True, rows_returned=len(result))
+                return result
+        
+        if source is not None:
+            # df is only a sample of a file too large to load; run on the whole file
+            with profile_section("execute_sql.chunked", rows_in=source.profile.rows) as section:
+                result = source.execute_sql(sql_query)
+                section["rows_out"] = len(result)
+            current_span().set(engine="chunked", rows_scanned=source.profile.rows, rows_returned=len(result))
+            return result
+        
         try:
             # Import pandasql for SQL execution on DataFrames
             from pandasql import sqldf
@@ -204,13 +367,17 @@ class ChatService:
             locals_dict = {'df': df}
             
             # Execute the SQL query
-            result = sqldf(sql_query, locals_dict)
+            with profile_section("execute_sql.pandasql", rows_in=len(df)) as section:
+                result = sqldf(sql_query, locals_dict)
+                section["rows_out"] = len(result)
+            current_span().set(engine="pandasql", rows_scanned=len(df), rows_returned=len(result))
             
             return result
         except ImportError:
             # Fallback to pandas query if pandasql is not available
             print("pandasql not available, using pandas query fallback")
-            return self._fallback_sql_execution(df, sql_query)
+            with profile_section("execute_sql.pandas_fallback", rows_in=len(df)):
+                return self._fallback_sql_execution(df, sql_query)
         except Exception as e:
             print(f"Error executing SQL: {str(e)}")
             # Return empty DataFrame with error message
@@ -253,18 +420,18 @@ class ChatService:
             print(f"Fallback SQL execution error: {str(e)}")
             return pd.DataFrame({'error': [f"Fallback execution error: {str(e)}"]})
     
-    def generate_graph(self, df: pd.DataFrame, user_message: str) -> Dict[str, Any]:
+    @traced("generate_graph")
+    def generate_graph(
+        self,
+        df: pd.DataFrame,
+        user_message: str,
+        source: ChunkedCSVSource = None,
+        data_summary: str = None
+    ) -> Dict[str, Any]:
         """Generate graph configuration from CSV data"""
         
-        # Create a summary of the data
-        data_summary = f"""
-        Dataset Summary:
-        - Shape: {df.shape}
-        - Columns: {list(df.columns)}
-        - Data types: {df.dtypes.to_dict()}
-        - Numeric columns: {df.select_dtypes(include=['number']).columns.tolist()}
-        - Categorical columns: {df.select_dtypes(include=['object']).columns.tolist()}
-        """
+        # Create a summary of the data (unless the caller already has one)
+        data_summary = data_summary or self._summarize_data(df, source)
         
         graph_prompt = ChatPromptTemplate.from_messages([
             SystemMessage(content="""You are a data visualization expert. Based on the dataset summary and user request, suggest the best chart type and provide the configuration.
@@ -297,15 +464,17 @@ User Request: {user_message}""")
         ])
         
         try:
-            chain = graph_prompt | self.llm | JsonOutputParser()
+            chain = graph_prompt | self.llm
 
-            result = chain.invoke({
+            message = chain.invoke({
                 'data_summary': data_summary,
                 'user_message': user_message
             })
+            record_llm_usage(message)
+            result = JsonOutputParser().invoke(message)
             
             # Add actual data based on the suggested configuration
-            chart_data = self._prepare_chart_data(df, result)
+            chart_data = self._prepare_chart_data(df, result, source)
             result["chart_data"] = chart_data
             
             return result
@@ -316,8 +485,14 @@ User Request: {user_message}""")
                 "chart_config": {"title": "Error", "xlabel": "", "ylabel": ""}
             }
     
-    def _prepare_chart_data(self, df: pd.DataFrame, graph_config: Dict[str, Any]) -> Dict[str, Any]:
-        """Prepare actual chart data based on the graph configuration"""
+    @traced("prepare_chart_data")
+    def _prepare_chart_data(self, df: pd.DataFrame, graph_config: Dict[str, Any], source: ChunkedCSVSource = None) -> Dict[str, Any]:
+        """
+        Prepare actual chart data based on the graph configuration.
+        
+        For streamed files, bar and pie aggregates are computed over the whole
+        file; row-level charts (line, scatter) plot the sample in df.
+        """
         try:
             chart_type = graph_config.get("chart_type", "bar")
             chart_data = graph_config.get("chart_data", {})
@@ -328,7 +503,12 @@ User Request: {user_message}""")
                 y_col = chart_data.get("y")
                 
                 if x_col and y_col and x_col in df.columns and y_col in df.columns:
-                    data = df.groupby(x_col)[y_col].mean().reset_index()
+                    with profile_section("prepare_chart_data.group_mean", streamed=source is not None) as section:
+                        if source is not None:
+                            data = source.group_mean(x_col, y_col)
+                        else:
+                            data = df.groupby(x_col)[y_col].mean().reset_index()
+                        section["rows_out"] = len(data)
                     return {
                         "x": data[x_col].tolist(),
                         "y": data[y_col].tolist(),
@@ -341,7 +521,8 @@ User Request: {user_message}""")
                 y_col = chart_data.get("y")
                 
                 if x_col and y_col and x_col in df.columns and y_col in df.columns:
-                    data = df.sort_values(x_col)
+                    with profile_section("prepare_chart_data.sort_values", rows_in=len(df)):
+                        data = df.sort_values(x_col)
                     return {
                         "x": data[x_col].tolist(),
                         "y": data[y_col].tolist(),
@@ -365,7 +546,9 @@ User Request: {user_message}""")
                 x_col = chart_data.get("x")
                 
                 if x_col and x_col in df.columns:
-                    data = df[x_col].value_counts()
+                    with profile_section("prepare_chart_data.value_counts", streamed=source is not None) as section:
+                        data = source.value_counts(x_col) if source is not None else df[x_col].value_counts()
+                        section["rows_out"] = len(data)
                     return {
                         "labels": data.index.tolist(),
                         "values": data.values.tolist(),
@@ -386,41 +569,118 @@ User Request: {user_message}""")
         except Exception as e:
             return {"error": f"Error preparing chart data: {str(e)}"}
     
+    @traced("load_csv")
+    def _load_session_data(self, db: Session, session_id: str) -> Tuple[Any, pd.DataFrame, ChunkedCSVSource]:
+        """
+        The session's CSV file and its data. Files above the out-of-core
+        threshold are streamed: source reads them in chunks and df is only a
+        uniform sample of their rows.
+        """
+        csv_file = self._get_session_file(db, session_id)
+        self._touch_session(db, session_id)
+        source = None
+        if is_large_file(csv_file.file_path, csv_file.file_size):
+            source = ChunkedCSVSource(csv_file.file_path)
+            df = source.sample()
+        else:
+            df = self.read_csv_file(csv_file.file_path)
+        current_span().set(rows=source.profile.rows if source else len(df), streamed=source is not None)
+        return csv_file, df, source
+    
+    def _respond(
+        self,
+        db: Session,
+        csv_file,
+        df: pd.DataFrame,
+        source: ChunkedCSVSource,
+        cube: AggregateCube,
+        request_type: str,
+        user_message: str,
+        data_summary: str = None
+    ) -> Dict[str, Any]:
+        """Answer one classified message about already loaded data"""
+        if request_type == "insight":
+            query_cache = QueryResultCache(db, csv_file.id, csv_file.file_path, csv_file.content_hash) if settings.query_cache_enabled else None
+            result = self.generate_insight(df, user_message, cube, source, query_cache, data_summary)
+            return {
+                "request_type": "insight",
+                "message": result.get("message", "Analysis completed"),
+                "data": {
+                    "insights": result.get("insights", []),
+                    "summary": result.get("summary", ""),
+                    "sql_query": result.get("sql_query", "N/A"),
+                    "result_info": result.get("result_info", {}),
+                    "sql_cost": result.get("sql_cost", {})
+                }
+            }
+        else:  # graph
+            result = self.generate_graph(df, user_message, source, data_summary)
+            return {
+                "request_type": "graph",
+                "message": f"Generated {result.get('chart_type', 'chart')} based on your request",
+                "data": {
+                    "chart_type": result.get("chart_type", "bar"),
+                    "chart_data": result.get("chart_data", {}),
+                    "chart_config": result.get("chart_config", {})
+                }
+            }
+    
+    @traced("chat")
     def process_chat(self, db: Session, session_id: str, user_message: str) -> Dict[str, Any]:
         """Main method to process chat requests"""
         try:
             # Classify the request
             request_type = self.classify_request(user_message)
+            current_span().set(request_type=request_type)
             
             # Load CSV data
-            df = self.load_csv_data(db, session_id)
+            csv_file, df, source = self._load_session_data(db, session_id)
             
-            if request_type == "insight":
-                result = self.generate_insight(df, user_message)
-                return {
-                    "request_type": "insight",
-                    "message": result.get("message", "Analysis completed"),
-                    "data": {
-                        "insights": result.get("insights", []),
-                        "summary": result.get("summary", ""),
-                        "sql_query": result.get("sql_query", "N/A")
-                    }
-                }
-            else:  # graph
-                result = self.generate_graph(df, user_message)
-                return {
-                    "request_type": "graph",
-                    "message": f"Generated {result.get('chart_type', 'chart')} based on your request",
-                    "data": {
-                        "chart_type": result.get("chart_type", "bar"),
-                        "chart_data": result.get("chart_data", {}),
-                        "chart_config": result.get("chart_config", {})
-                    }
-                }
+            cube = load_cube_for_file(csv_file.file_path) if request_type == "insight" else None
+            return self._respond(db, csv_file, df, source, cube, request_type, user_message)
                 
         except Exception as e:
             return {
                 "request_type": "error",
                 "message": "An error occurred while processing your request",
                 "error": str(e)
-            } 
\ No newline at end of file
+            }
+    
+    @traced("chat_batch")
+    def process_batch(self, db: Session, session_id: str, user_messages: List[str]) -> List[Dict[str, Any]]:
+        """
+        Answer several messages about one session's data.
+        
+        The data, the dataset summary and the aggregate cube are loaded once,
+        all messages are classified in one LLM call, and the messages are then
+        answered concurrently. Results are in message order; a failing message
+        gets an error result without affecting the others. Raises ValueError
+        if the session or its data cannot be loaded.
+        """
+        csv_file, df, source = self._load_session_data(db, session_id)
+        data_summary = self._summarize_data(df, source)
+        cube = load_cube_for_file(csv_file.file_path)
+        request_types = self.classify_requests(user_messages)
+        
+        def answer(item: Tuple[str, str]) -> Dict[str, Any]:
+            request_type, user_message = item
+            # Sessions are not thread-safe; each worker records its queries in its own
+            worker_db = SessionLocal()
+            try:
+                return self._respond(worker_db, csv_file, df, source, cube, request_type, user_message, data_summary)
+            except Exception as e:
+                return {
+                    "request_type": "error",
+                    "message": "An error occurred while processing your request",
+                    "error": str(e)
+                }
+            finally:
+                worker_db.close()
+        
+        # Each worker runs in a copy of this context so its spans join the batch's trace
+        contexts = [contextvars.copy_context() for _ in user_messages]
+        current_span().set(messages=len(user_messages))
+        with ThreadPoolExecutor(max_workers=min(settings.batch_max_workers, len(user_messages))) as executor:
+            return list(executor.map(
+                lambda context, item: context.run(answer, item), contexts, zip(request_types, user_messages)
+            ))
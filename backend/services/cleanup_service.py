@@ -0,0 +1,148 @@
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Iterable
+
+from core.config import settings
+from crud.csv_crud import CSVFileCRUD, CSVSessionCRUD
+from db.session import SessionLocal
+from services.aggregate_cube import CUBE_SUFFIX
+from services.out_of_core import PROFILE_SUFFIX
+
+SIDECAR_SUFFIXES = (CUBE_SUFFIX, PROFILE_SUFFIX)
+
+# Sessions expired per sweep, so one sweep never holds the database for long
+EXPIRE_BATCH_SIZE = 500
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print(f"Error removing {path}: {str(e)}")
+
+
+def _base_path(path: str) -> str:
+    """The uploaded file a sidecar belongs to (the path itself for uploads)"""
+    for suffix in SIDECAR_SUFFIXES:
+        if path.endswith(suffix):
+            return path[:-len(suffix)]
+    return path
+
+
+class CleanupWorker:
+    """
+    Removes files from disk on a background thread.
+
+    DELETE endpoints only delete database rows and queue the file paths
+    here. Every cleanup_sweep_interval_s the worker also removes orphans,
+    files in the uploads directory that no database record refers to (e.g.
+    left by a crash between writing an upload and recording it), and
+    expires sessions that have been inactive for longer than
+    session_ttl_hours.
+
+    When the worker is not running (scripts, tests) queued paths are
+    removed immediately instead.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="cleanup-worker", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Finish the queued removals and stop the thread"""
+        if not self.running:
+            return
+        self._stop.set()
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def enqueue(self, paths: Iterable[str]):
+        for path in paths:
+            if self.running:
+                self._queue.put(path)
+            else:
+                _remove(path)
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def _run(self):
+        next_sweep = time.monotonic() + settings.cleanup_sweep_interval_s
+        while True:
+            try:
+                path = self._queue.get(timeout=max(0.0, next_sweep - time.monotonic()))
+            except queue.Empty:
+                path = None
+            if path is not None:
+                _remove(path)
+            elif self._stop.is_set() and self._queue.empty():
+                return
+            if time.monotonic() >= next_sweep:
+                self.sweep()
+                next_sweep = time.monotonic() + settings.cleanup_sweep_interval_s
+
+    def sweep(self):
+        try:
+            expired = self.expire_sessions()
+            orphans = self.sweep_orphans()
+            if expired or orphans:
+                print(f"Cleanup: expired {expired} sessions, removed {orphans} orphaned files")
+        except Exception as e:
+            print(f"Error during cleanup sweep: {str(e)}")
+
+    def expire_sessions(self) -> int:
+        """Delete sessions inactive for longer than session_ttl_hours (0 keeps them forever)"""
+        if settings.session_ttl_hours <= 0:
+            return 0
+        cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(hours=settings.session_ttl_hours)
+        db = SessionLocal()
+        try:
+            session_ids = CSVSessionCRUD.get_expired_session_ids(db, cutoff, EXPIRE_BATCH_SIZE)
+            for session_id in session_ids:
+                self.enqueue(CSVSessionCRUD.delete_session(db, session_id) or [])
+            return len(session_ids)
+        finally:
+            db.close()
+
+    def sweep_orphans(self) -> int:
+        """Remove files in the uploads directory that no record refers to"""
+        if not os.path.isdir(settings.uploads_dir):
+            return 0
+        # Files younger than the grace period may belong to an upload in progress
+        cutoff = time.time() - settings.cleanup_orphan_grace_s
+        db = SessionLocal()
+        try:
+            known = {os.path.normpath(path) for path in CSVFileCRUD.get_all_file_paths(db)}
+        finally:
+            db.close()
+
+        orphans = []
+        with os.scandir(settings.uploads_dir) as entries:
+            for entry in entries:
+                if not entry.is_file() or entry.stat().st_mtime > cutoff:
+                    continue
+                if os.path.normpath(_base_path(entry.path)) not in known:
+                    orphans.append(entry.path)
+        self.enqueue(orphans)
+        return len(orphans)
+
+
+cleanup_worker = CleanupWorker()
@@ -0,0 +1,175 @@
+import numpy as np
+import pandas as pd
+from typing import Iterator, List, Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:
+    pa = None
+
+# Shared by the backend (services.csv_reader) and the Streamlit app
+# (csv_loader), so it must not import anything from the backend's core package
+
+# pandas' default missing-value markers, so both parsers agree on what is null
+NA_VALUES = [
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND",
+    "1.#QNAN", "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null"
+]
+
+
+def _rewind(source):
+    if hasattr(source, "seek"):
+        source.seek(0)
+
+
+def set_parser_threads(threads: int):
+    """
+    Cap pyarrow's CPU pool at threads (0 leaves it at every core). The pool is
+    process-wide, so call this once at startup rather than per parse.
+    """
+    if pa is not None and threads > 0 and pa.cpu_count() != threads:
+        pa.set_cpu_count(threads)
+
+
+def _options(delimiter: str, column_types=None, include_columns=None):
+    return dict(
+        read_options=pa_csv.ReadOptions(use_threads=True),
+        parse_options=pa_csv.ParseOptions(delimiter=delimiter),
+        convert_options=pa_csv.ConvertOptions(
+            null_values=NA_VALUES,
+            strings_can_be_null=True,
+            column_types=column_types or {},
+            include_columns=include_columns or []
+        )
+    )
+
+
+def _first_block_schema(source, delimiter: str):
+    """Column names and the types pyarrow infers on the first block only"""
+    reader = pa_csv.open_csv(source, **_options(delimiter))
+    schema = reader.schema
+    reader.close()
+    _rewind(source)
+    if len(set(schema.names)) != len(schema.names):
+        raise ValueError("duplicate column names")  # pandas renames these; leave it to pandas
+    return schema
+
+
+def _temporal_columns(schema) -> dict:
+    # Keep dates as text like pandas does; pyarrow would parse them
+    return {field.name: pa.string() for field in schema if pa.types.is_temporal(field.type)}
+
+
+def _to_pandas(table, self_destruct: bool = True) -> pd.DataFrame:
+    # pyarrow yields None for missing text where pandas uses NaN
+    text_with_nulls = [
+        field.name for field in table.schema
+        if pa.types.is_string(field.type) and table.column(field.name).null_count
+    ]
+    df = table.to_pandas(split_blocks=True, self_destruct=self_destruct)
+    for column in text_with_nulls:
+        df[column] = df[column].where(df[column].notna(), np.nan)
+    return df
+
+
+def read_csv(source, delimiter: str = ",") -> pd.DataFrame:
+    """
+    Read a CSV with pyarrow's multi-threaded parser, falling back to pandas' C engine.
+
+    source is a path or a seekable binary file object (e.g. a Streamlit
+    upload); file objects are rewound between passes. Paths ending in .zst
+    are decompressed while they are parsed, as both parsers pick the codec
+    from the file name. The parser uses the pool set by set_parser_threads.
+
+    The result matches pd.read_csv: the same missing values, and date-like
+    columns are kept as text (pyarrow would otherwise parse them). Files
+    pyarrow rejects, e.g. a column whose type changes after the first block,
+    are re-read with pandas.
+    """
+    if pa is None:
+        return pd.read_csv(source, delimiter=delimiter)
+
+    try:
+        schema = _first_block_schema(source, delimiter)
+        table = pa_csv.read_csv(source, **_options(delimiter, _temporal_columns(schema)))
+    except (pa.ArrowException, ValueError) as e:
+        print(f"pyarrow CSV parsing failed, using pandas: {str(e)}")
+        _rewind(source)
+        return pd.read_csv(source, delimiter=delimiter)
+
+    return _to_pandas(table)
+
+
+def _pandas_chunks(source, delimiter, chunk_rows, usecols, skip_rows=0) -> Iterator[pd.DataFrame]:
+    """pandas' chunked reader with the same missing values, starting after skip_rows data rows"""
+    _rewind(source)
+    chunks = pd.read_csv(
+        source,
+        delimiter=delimiter,
+        chunksize=chunk_rows,
+        usecols=usecols,
+        na_values=NA_VALUES,
+        keep_default_na=False,
+        skiprows=range(1, skip_rows + 1) if skip_rows else None
+    )
+    for chunk in chunks:
+        chunk.index = chunk.index + skip_rows
+        yield chunk
+
+
+def read_csv_chunks(
+    source,
+    delimiter: str = ",",
+    chunk_rows: int = 100_000,
+    usecols: Optional[List[str]] = None
+) -> Iterator[pd.DataFrame]:
+    """
+    Stream a CSV as DataFrames of chunk_rows rows (only usecols when given),
+    parsed like read_csv: the same missing values, and date-like columns kept
+    as text. Chunks are numbered by file row, like pd.read_csv's chunksize.
+
+    Uses pyarrow's streaming reader, which fixes column types from the first
+    block; if a later block does not fit them, the remaining rows are read
+    with pandas' chunked reader instead.
+    """
+    if pa is None:
+        yield from _pandas_chunks(source, delimiter, chunk_rows, usecols)
+        return
+
+    try:
+        schema = _first_block_schema(source, delimiter)
+        include = [name for name in schema.names if name in usecols] if usecols is not None else None
+        reader = pa_csv.open_csv(source, **_options(delimiter, _temporal_columns(schema), include))
+    except (pa.ArrowException, ValueError) as e:
+        print(f"pyarrow CSV parsing failed, using pandas: {str(e)}")
+        yield from _pandas_chunks(source, delimiter, chunk_rows, usecols)
+        return
+
+    rows, pending = 0, []
+    while True:
+        try:
+            batch = reader.read_next_batch()
+        except StopIteration:
+            break
+        except pa.ArrowException as e:
+            print(f"pyarrow CSV parsing failed after {rows} rows, using pandas: {str(e)}")
+            reader.close()
+            yield from _pandas_chunks(source, delimiter, chunk_rows, usecols, skip_rows=rows)
+            return
+
+        pending.append(batch)
+        buffered = pa.Table.from_batches(pending, schema=reader.schema)
+        while buffered.num_rows >= chunk_rows:
+            chunk = _to_pandas(buffered.slice(0, chunk_rows), self_destruct=False)
+            chunk.index = pd.RangeIndex(rows, rows + len(chunk))
+            rows += len(chunk)
+            yield chunk
+            buffered = buffered.slice(chunk_rows)
+        pending = buffered.to_batches()
+
+    buffered = pa.Table.from_batches(pending, schema=reader.schema)
+    if buffered.num_rows:
+        chunk = _to_pandas(buffered)
+        chunk.index = pd.RangeIndex(rows, rows + len(chunk))
+        yield chunk
@@ -0,0 +1,12 @@
+import pandas as pd
+
+from services.csv_parser import read_csv
+
+
+def read_csv_parallel(source, delimiter: str = ",") -> pd.DataFrame:
+    """
+    Read an uploaded CSV (a path, possibly .zst compressed) with the shared
+    pyarrow reader; its thread pool is sized from settings.csv_parse_threads
+    at startup.
+    """
+    return read_csv(source, delimiter)
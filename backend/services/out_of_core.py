@@ -0,0 +1,344 @@
+import os
+import re
+import numpy as np
+import pandas as pd
+from typing import Dict, Iterator, List, Optional
+
+from core.config import settings
+from services.aggregate_cube import (
+    AggregateCube,
+    GROUP_BY_QUERY,
+    IDENTIFIER,
+    finalize_group_stats,
+    group_stats,
+    merge_group_stats
+)
+from services.csv_parser import read_csv_chunks
+
+PROFILE_VERSION = 2
+PROFILE_SUFFIX = ".profile.pkl"
+
+AGGREGATE_CALL = re.compile(r"\b(?:COUNT|SUM|AVG|MIN|MAX|TOTAL|GROUP_CONCAT)\s*\(", re.IGNORECASE)
+ROW_QUERY = re.compile(
+    r"^\s*SELECT\s+(?P<select>.+?)\s+FROM\s+df"
+    r"(?:\s+WHERE\s+(?P<where>.+?))?"
+    r"(?:\s+ORDER\s+BY\s+(?P<order>.+?))?"
+    r"(?:\s+LIMIT\s+(?P<limit>\d+))?"
+    r"\s*;?\s*$",
+    re.IGNORECASE | re.DOTALL
+)
+FILTERED_QUERY = re.compile(
+    r"^(?P<head>\s*SELECT\s+(?P<select>.+?)\s+FROM\s+df)\s+WHERE\s+(?P<where>.+?)"
+    r"(?P<tail>\s+(?:GROUP\s+BY|ORDER\s+BY|LIMIT)\b.*)?\s*$",
+    re.IGNORECASE | re.DOTALL
+)
+TABLE_AGGREGATE_QUERY = re.compile(r"^\s*SELECT\s+(?P<select>.+?)\s+FROM\s+df\s*;?\s*$", re.IGNORECASE | re.DOTALL)
+UNSUPPORTED_CLAUSES = re.compile(r"\b(?:JOIN|UNION|DISTINCT|HAVING|OFFSET|OVER)\b|\bSELECT\b.*\bSELECT\b", re.IGNORECASE | re.DOTALL)
+
+ALL_ROWS_KEY = "__all_rows__"
+
+
+def is_large_file(file_path: str, file_size: int = None) -> bool:
+    """
+    Whether a CSV is above the out-of-core threshold and should be streamed.
+    Pass the uncompressed size for compressed uploads; the size on disk is
+    used otherwise.
+    """
+    size = file_size if file_size is not None else os.path.getsize(file_path)
+    return size > settings.out_of_core_threshold_mb * 1024 * 1024
+
+
+def profile_path(file_path: str) -> str:
+    return file_path + PROFILE_SUFFIX
+
+
+def _merge_counts(left: Optional[pd.Series], right: pd.Series) -> pd.Series:
+    if left is None:
+        return right
+    return pd.concat([left, right]).groupby(level=0, dropna=False, sort=False).sum()
+
+
+class ColumnProfile:
+    """Row count, dtypes and null counts of a CSV, accumulated chunk by chunk"""
+
+    def __init__(self):
+        self.rows = 0
+        self.dtypes = {}
+        self.nulls = None
+
+    def update(self, chunk: pd.DataFrame):
+        self.rows += len(chunk)
+        self.nulls = _merge_counts(self.nulls, chunk.isna().sum())
+        for column, dtype in chunk.dtypes.items():
+            self.dtypes[column] = self._merge_dtype(self.dtypes.get(column), dtype)
+
+    @staticmethod
+    def _merge_dtype(current, dtype):
+        # The dtype pandas would infer reading the whole file at once
+        if current is None or current == dtype:
+            return dtype
+        if pd.api.types.is_numeric_dtype(current) and pd.api.types.is_numeric_dtype(dtype) \
+                and not pd.api.types.is_bool_dtype(current) and not pd.api.types.is_bool_dtype(dtype):
+            return np.result_type(current, dtype)
+        return np.dtype(object)
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self.dtypes)
+
+    @property
+    def numeric_columns(self) -> List[str]:
+        return [column for column, dtype in self.dtypes.items() if pd.api.types.is_numeric_dtype(dtype)]
+
+    @property
+    def categorical_columns(self) -> List[str]:
+        return [column for column, dtype in self.dtypes.items() if dtype == np.dtype(object)]
+
+
+class ReservoirSample:
+    """
+    Uniform row sample of a stream.
+
+    Every row gets a random key and the rows with the `size` smallest keys are
+    kept, so samples of separate chunks merge into a sample of the whole.
+    """
+
+    def __init__(self, size: int, seed: int = 0):
+        self.size = size
+        self.seen = 0
+        self._rng = np.random.default_rng(seed)
+        self._rows = None
+        self._keys = np.empty(0)
+
+    def update(self, chunk: pd.DataFrame):
+        keys = self._rng.random(len(chunk))
+        chunk = chunk.set_index(pd.RangeIndex(self.seen, self.seen + len(chunk)))
+        self.seen += len(chunk)
+
+        if len(chunk) > self.size:
+            keep = np.argpartition(keys, self.size)[:self.size]
+            chunk, keys = chunk.iloc[keep], keys[keep]
+        rows = chunk if self._rows is None else pd.concat([self._rows, chunk])
+        keys = np.concatenate([self._keys, keys])
+        if len(rows) > self.size:
+            keep = np.argpartition(keys, self.size)[:self.size]
+            rows, keys = rows.iloc[keep], keys[keep]
+        self._rows, self._keys = rows, keys
+
+    def result(self) -> pd.DataFrame:
+        """Sampled rows in file order"""
+        if self._rows is None:
+            return pd.DataFrame()
+        return self._rows.sort_index().reset_index(drop=True)
+
+
+class ChunkedCSVSource:
+    """
+    A CSV file too large to load whole, processed as a stream of chunks.
+
+    A single profiling pass (cached next to the file) yields the row count,
+    dtypes and a uniform row sample; aggregations used by the chat service
+    stream the file with only the columns they need and merge partial states,
+    so memory stays bounded by the chunk size and the number of groups.
+    """
+
+    def __init__(self, file_path: str, chunk_rows: int = None, sample_rows: int = None):
+        self.file_path = file_path
+        self.chunk_rows = chunk_rows or settings.out_of_core_chunk_rows
+        self.sample_rows = sample_rows or settings.out_of_core_sample_rows
+        self._profile = None
+        self._sample = None
+
+    def chunks(self, usecols: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+        return read_csv_chunks(self.file_path, delimiter=",", chunk_rows=self.chunk_rows, usecols=usecols)
+
+    def _scan(self):
+        path = profile_path(self.file_path)
+        if os.path.exists(path):
+            try:
+                data = pd.read_pickle(path)
+                if data.get("version") == PROFILE_VERSION:
+                    self._profile, self._sample = data["profile"], data["sample"]
+                    return
+            except Exception as e:
+                print(f"Error reading CSV profile: {str(e)}")
+
+        profile = ColumnProfile()
+        sample = ReservoirSample(self.sample_rows)
+        for chunk in self.chunks():
+            profile.update(chunk)
+            sample.update(chunk)
+        self._profile, self._sample = profile, sample.result()
+        try:
+            pd.to_pickle({"version": PROFILE_VERSION, "profile": profile, "sample": self._sample}, path)
+        except Exception as e:
+            print(f"Error saving CSV profile: {str(e)}")
+
+    @property
+    def profile(self) -> ColumnProfile:
+        if self._profile is None:
+            self._scan()
+        return self._profile
+
+    def sample(self) -> pd.DataFrame:
+        """A uniform sample of the file's rows"""
+        if self._sample is None:
+            self._scan()
+        return self._sample
+
+    def _resolve(self, identifier: str) -> Optional[str]:
+        name = identifier.strip('"`[]').lower()
+        matches = [column for column in self.profile.columns if str(column).lower() == name]
+        return matches[0] if len(matches) == 1 else None
+
+    def matching_chunks(self, usecols: List[str], where: Optional[str] = None) -> Iterator[pd.DataFrame]:
+        """Chunks of `usecols`, keeping only the rows that match a SQL WHERE condition when one is given"""
+        if not where:
+            yield from self.chunks(usecols=usecols)
+            return
+
+        from pandasql import sqldf
+
+        referenced = [self._resolve(token) for token in re.findall(IDENTIFIER, where)]
+        columns = list(dict.fromkeys(usecols + [column for column in referenced if column is not None]))
+        for chunk in self.chunks(usecols=columns):
+            matching = sqldf(f"SELECT * FROM df WHERE {where}", {"df": chunk})
+            if len(matching):
+                yield matching[usecols]
+
+    def group_stats(self, key: str, values: List[str], where: Optional[str] = None) -> Optional[Dict[str, object]]:
+        """
+        Merged per-group size, counts and sum/min/max of `values` over the rows
+        matching `where`, in SQLite group order; None when no row matches
+        """
+        numeric = set(self.profile.numeric_columns)
+        stats = None
+        for chunk in self.matching_chunks(list(dict.fromkeys([key] + values)), where):
+            partial = group_stats(chunk, key, numeric)
+            stats = partial if stats is None else merge_group_stats(stats, partial)
+            if len(stats["size"]) > settings.out_of_core_max_groups:
+                raise ValueError(f"Too many groups in column {key} to aggregate out of core")
+        return finalize_group_stats(stats, numeric) if stats is not None else None
+
+    def group_mean(self, key: str, value: str) -> pd.DataFrame:
+        """Equivalent of df.groupby(key)[value].mean().reset_index()"""
+        stats = self.group_stats(key, [value])
+        means = (stats["sum"][value] / stats["count"][value].where(stats["count"][value] > 0)).rename(value)
+        means = means[means.index.notna()].sort_index()
+        means.index.name = key
+        return means.reset_index()
+
+    def value_counts(self, column: str) -> pd.Series:
+        """Equivalent of df[column].value_counts()"""
+        counts = None
+        for chunk in self.chunks(usecols=[column]):
+            counts = _merge_counts(counts, chunk[column].value_counts())
+        if counts is None:
+            return pd.Series(dtype="int64", name="count")
+        return counts.sort_values(ascending=False, kind="stable").rename("count")
+
+    def execute_sql(self, sql_query: str) -> pd.DataFrame:
+        """
+        Run the generated SQL over the whole file, one chunk at a time.
+
+        Supported: single-column GROUP BY aggregates and aggregates over the
+        whole table, either with a WHERE condition (chunks are filtered before
+        they are aggregated), and row-level queries (WHERE/ORDER BY), whose
+        results are capped at out_of_core_result_rows when they have no LIMIT.
+        """
+        query = sql_query.strip().rstrip(";")
+        try:
+            if UNSUPPORTED_CLAUSES.search(query):
+                raise ValueError("unsupported clause")
+
+            aggregate_query, where = query, None
+            filtered = FILTERED_QUERY.match(query)
+            if filtered and AGGREGATE_CALL.search(filtered.group("select")):
+                aggregate_query = filtered.group("head") + (filtered.group("tail") or "")
+                where = filtered.group("where")
+
+            if GROUP_BY_QUERY.match(aggregate_query):
+                return self._execute_aggregate(query, aggregate_query, where)
+
+            table_aggregate = TABLE_AGGREGATE_QUERY.match(aggregate_query)
+            if table_aggregate and AGGREGATE_CALL.search(table_aggregate.group("select")):
+                return self._execute_aggregate(query, f"{aggregate_query} GROUP BY {ALL_ROWS_KEY}", where, all_rows=True)
+
+            row_query = ROW_QUERY.match(query)
+            if row_query and not AGGREGATE_CALL.search(row_query.group("select")):
+                return self._execute_rows(query, row_query)
+
+            raise ValueError("unsupported query shape")
+        except Exception as e:
+            print(f"Error executing SQL out of core: {str(e)}")
+            return pd.DataFrame({'error': [
+                f"SQL execution error: {str(e)}. This file is too large to load whole; only "
+                "single-column GROUP BY aggregates, whole-table aggregates (optionally with WHERE) "
+                "and row queries are supported"
+            ]})
+
+    def _execute_aggregate(self, query: str, aggregate_query: str, where: Optional[str], all_rows: bool = False) -> pd.DataFrame:
+        result = self._execute_group_by(aggregate_query, all_rows, where)
+        if result is None:
+            # No row matches: SQLite's answer over no rows (e.g. a NULL average)
+            from pandasql import sqldf
+            return sqldf(query, {"df": self.sample().head(0)})
+        return result
+
+    def _execute_group_by(self, query: str, all_rows: bool = False, where: Optional[str] = None) -> Optional[pd.DataFrame]:
+        """Answer an aggregate query from streamed group stats; None when no row matches `where`"""
+        match = GROUP_BY_QUERY.match(query)
+        referenced = [self._resolve(token) for token in re.findall(IDENTIFIER, match.group("select"))]
+        values = [column for column in dict.fromkeys(referenced) if column is not None]
+
+        if all_rows:
+            stats = None
+            numeric = set(self.profile.numeric_columns)
+            for chunk in self.matching_chunks(values or [self.profile.columns[0]], where):
+                chunk = chunk.assign(**{ALL_ROWS_KEY: ""})
+                partial = group_stats(chunk, ALL_ROWS_KEY, numeric)
+                stats = partial if stats is None else merge_group_stats(stats, partial)
+            if stats is None:
+                return None
+            groups = {ALL_ROWS_KEY: finalize_group_stats(stats, numeric)}
+            columns = self.profile.columns + [ALL_ROWS_KEY]
+        else:
+            key = self._resolve(match.group("group")) if not match.group("group").isdigit() else None
+            if key is None:
+                raise ValueError("unsupported GROUP BY")
+            stats = self.group_stats(key, [column for column in values if column != key], where)
+            if stats is None:
+                return None
+            groups = {key: stats}
+            columns = self.profile.columns
+
+        result = AggregateCube(groups, columns).answer(query)
+        if result is None:
+            raise ValueError("unsupported aggregate")
+        return result
+
+    def _execute_rows(self, query: str, match) -> pd.DataFrame:
+        from pandasql import sqldf
+
+        limit = int(match.group("limit") or settings.out_of_core_result_rows)
+        if not match.group("limit"):
+            query = f"{query} LIMIT {limit}"
+
+        # Each chunk contributes its own top rows; the final query picks among them
+        candidate_query = "SELECT * FROM df"
+        if match.group("where"):
+            candidate_query += f" WHERE {match.group('where')}"
+        if match.group("order"):
+            candidate_query += f" ORDER BY {match.group('order')}"
+        candidate_query += f" LIMIT {limit}"
+
+        candidates = None
+        for chunk in self.chunks():
+            found = sqldf(candidate_query, {"df": chunk})
+            candidates = found if candidates is None else pd.concat([candidates, found], ignore_index=True)
+            if match.group("order"):
+                candidates = sqldf(candidate_query, {"df": candidates})
+            elif len(candidates) >= limit:
+                break
+
+        return sqldf(query, {"df": candidates if candidates is not None else self.sample().head(0)})
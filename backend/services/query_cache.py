@@ -0,0 +1,131 @@
+import hashlib
+import os
+import re
+import time
+import pandas as pd
+from typing import Callable, Optional, Tuple
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from crud.query_crud import QueryExecutionCRUD
+
+try:
+    import pyarrow as pa
+    import zstandard
+except ImportError:
+    pa = None
+
+
+def file_fingerprint(file_path: str) -> str:
+    """Identity of a file's current contents: size and modification time"""
+    stat = os.stat(file_path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+# Quoted SQL strings and identifiers, kept as written, or a run of whitespace
+SQL_QUOTED_OR_SPACE = re.compile(r"""('(?:[^']|'')*'|"(?:[^"]|"")*"|`[^`]*`|\[[^\]]*\])|\s+""")
+
+
+def sql_hash(sql_query: str) -> str:
+    """Hash of a query with whitespace collapsed outside quoted strings and identifiers"""
+    normalized = SQL_QUOTED_OR_SPACE.sub(
+        lambda match: match.group(1) or " ",
+        sql_query.strip().rstrip(";").strip()
+    )
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def _serialize(result: pd.DataFrame) -> Optional[bytes]:
+    """Result as an Arrow IPC stream, or None if it cannot be represented"""
+    if pa is None:
+        return None
+    try:
+        table = pa.Table.from_pandas(result, preserve_index=False)
+    except (pa.ArrowException, ValueError, TypeError):
+        return None
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _deserialize(blob: bytes) -> pd.DataFrame:
+    data = zstandard.ZstdDecompressor().decompress(blob)
+    return pa.ipc.open_stream(data).read_all().to_pandas()
+
+
+def _fingerprint(result: pd.DataFrame, data: Optional[bytes]) -> str:
+    if data is not None:
+        return hashlib.sha256(data).hexdigest()
+    return hashlib.sha256(result.to_csv(index=False).encode("utf-8")).hexdigest()
+
+
+class QueryResultCache:
+    """
+    Records every query executed on an uploaded file and serves repeated
+    queries on the unchanged file from the stored result.
+
+    Each execution is stored with its SQL hash, the file fingerprint, a
+    fingerprint of the result, the row count and the execution time, giving a
+    latency history per file. Results whose compressed size is within
+    query_cache_max_bytes are kept as a zstd-compressed Arrow blob.
+    """
+
+    def __init__(self, db: Session, file_id: str, file_path: str, content_hash: Optional[str] = None):
+        self.db = db
+        self.file_id = file_id
+        # Deduplicated uploads are identified by their contents, so every
+        # upload of the same data shares results; older files by size and mtime
+        if content_hash:
+            self.fingerprint = f"sha256:{content_hash}"
+            self.lookup_file_id = None
+        else:
+            self.fingerprint = file_fingerprint(file_path)
+            self.lookup_file_id = file_id
+
+    def run(self, sql_query: str, execute: Callable[[str], pd.DataFrame]) -> Tuple[pd.DataFrame, bool]:
+        """Return the query's result and whether it came from the cache"""
+        key = sql_hash(sql_query)
+        start = time.perf_counter()
+
+        cached = QueryExecutionCRUD.get_cached_execution(self.db, self.fingerprint, key, self.lookup_file_id)
+        if cached is not None and pa is not None:
+            try:
+                result = _deserialize(cached.result_blob)
+            except Exception as e:
+                print(f"Error reading cached query result: {str(e)}")
+            else:
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                self._record(sql_query, key, cached.result_fingerprint, len(result), elapsed_ms, served_from_cache=True)
+                return result, True
+
+        start = time.perf_counter()
+        result = execute(sql_query)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        data = _serialize(result)
+        blob = None
+        # Error frames from _execute_sql_on_dataframe are recorded but never served again
+        if data is not None and list(result.columns) != ["error"]:
+            compressed = zstandard.ZstdCompressor(level=settings.query_cache_zstd_level).compress(data)
+            if len(compressed) <= settings.query_cache_max_bytes:
+                blob = compressed
+        self._record(sql_query, key, _fingerprint(result, data), len(result), elapsed_ms, result_blob=blob)
+        return result, False
+
+    def _record(self, sql_query, key, result_fingerprint, row_count, execution_ms, served_from_cache=False, result_blob=None):
+        try:
+            QueryExecutionCRUD.create_execution(
+                self.db,
+                file_id=self.file_id,
+                file_fingerprint=self.fingerprint,
+                sql_hash=key,
+                sql_query=sql_query,
+                result_fingerprint=result_fingerprint,
+                row_count=row_count,
+                execution_ms=execution_ms,
+                served_from_cache=served_from_cache,
+                result_blob=result_blob
+            )
+        except Exception as e:
+            self.db.rollback()
+            print(f"Error recording query execution: {str(e)}")
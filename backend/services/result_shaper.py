@@ -0,0 +1,136 @@
+import re
+import pandas as pd
+from typing import Any, Dict, Optional, Tuple
+
+from core.config import settings
+from services.out_of_core import AGGREGATE_CALL
+
+LIMIT_CLAUSE = re.compile(r"\bLIMIT\s+\d+", re.IGNORECASE)
+GROUP_BY_CLAUSE = re.compile(r"\bGROUP\s+BY\b", re.IGNORECASE)
+DISTINCT = re.compile(r"\bDISTINCT\b", re.IGNORECASE)
+
+
+def outer_query(query: str) -> str:
+    """query with string literals and parenthesized parts (subqueries, call arguments) blanked out"""
+    chars, depth, quote = [], 0, None
+    for char in query:
+        if quote is not None:
+            if char == quote:
+                quote = None
+            chars.append(" ")
+        elif char in ("'", '"'):
+            quote = char
+            chars.append(" ")
+        elif char == "(":
+            depth += 1
+            chars.append(char)
+        elif char == ")":
+            depth = max(0, depth - 1)
+            chars.append(char)
+        else:
+            chars.append(char if depth == 0 else " ")
+    return "".join(chars)
+
+
+def is_bounded(sql_query: str) -> bool:
+    """
+    Whether a query's result size is bounded by something other than the row
+    count: a LIMIT, GROUP BY, DISTINCT or an aggregate function. Only the outer
+    query counts, so a LIMIT or aggregate inside a subquery does not.
+    """
+    outer = outer_query(sql_query)
+    return bool(
+        LIMIT_CLAUSE.search(outer) or GROUP_BY_CLAUSE.search(outer)
+        or DISTINCT.search(outer) or AGGREGATE_CALL.search(outer)
+    )
+
+
+def inject_limit(sql_query: str, limit: int = None) -> Tuple[str, Optional[int]]:
+    """
+    Add a LIMIT to queries that return raw rows (see is_bounded).
+
+    One row beyond the limit is requested so shape_result can tell whether
+    rows were cut off. Returns the query and the limit applied (None when
+    unchanged).
+    """
+    limit = limit or settings.result_limit_rows
+    query = sql_query.strip().rstrip(";").rstrip()
+    if is_bounded(query):
+        return sql_query, None
+    return f"{query} LIMIT {limit + 1}", limit
+
+
+def _truncate(text: str, max_chars: int) -> str:
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars] + "\n... (truncated)"
+
+
+def shape_result(
+    result: pd.DataFrame,
+    row_limit: Optional[int] = None,
+    max_rows: int = None,
+    max_chars: int = None
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    Render a query result for the insight prompt within a row and character budget.
+
+    Small results are rendered whole. Larger ones are summarized: per-column
+    statistics, the most frequent values of text columns, the first rows
+    (which respect any ORDER BY) and a sample of the rest. Returns the text and
+    metadata describing what was left out.
+    """
+    max_rows = max_rows or settings.result_max_rows
+    max_chars = max_chars or settings.result_max_chars
+
+    row_limit_hit = row_limit is not None and len(result) > row_limit
+    if row_limit_hit:
+        result = result.iloc[:row_limit]
+
+    info = {
+        "rows": len(result),
+        "columns": len(result.columns),
+        "row_limit_hit": row_limit_hit,
+        "summarized": False,
+        "truncated": row_limit_hit
+    }
+
+    if len(result) <= max_rows:
+        text = result.to_string()
+        if len(text) <= max_chars:
+            info["rows_shown"] = len(result)
+            return text + (f"\n(Stopped at the first {row_limit} rows)" if row_limit_hit else ""), info
+
+    head_rows = min(settings.result_sample_rows, len(result))
+    parts = [
+        f"Result has {len(result)}{'+' if row_limit_hit else ''} rows and {len(result.columns)} columns; "
+        "showing a summary."
+    ]
+
+    numeric = result.select_dtypes(include=["number"])
+    if not numeric.empty:
+        parts.append("Numeric column statistics:\n" + numeric.describe().T.to_string())
+
+    text_columns = result.select_dtypes(exclude=["number"]).columns
+    for column in text_columns:
+        top = result[column].value_counts().head(settings.result_top_k)
+        if not top.empty:
+            parts.append(
+                f"Top values of {column} ({result[column].nunique()} distinct):\n"
+                + top.to_string()
+            )
+
+    parts.append(f"First {head_rows} rows:\n" + result.head(head_rows).to_string())
+    rest = result.iloc[head_rows:]
+    if len(rest):
+        sample = rest.sample(min(settings.result_sample_rows, len(rest)), random_state=0).sort_index()
+        parts.append(f"Random sample of {len(sample)} other rows:\n" + sample.to_string())
+        info["rows_shown"] = head_rows + len(sample)
+    else:
+        info["rows_shown"] = head_rows
+
+    text = "\n\n".join(parts)
+    info["summarized"] = True
+    info["truncated"] = True
+    info["chars_dropped"] = max(0, len(text) - max_chars)
+    return _truncate(text, max_chars), info
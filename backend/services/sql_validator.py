@@ -0,0 +1,119 @@
+import difflib
+import re
+import sqlite3
+import pandas as pd
+from dataclasses import dataclass, field
+from typing import Any, Dict, List
+
+from core.config import settings
+from services.result_shaper import is_bounded
+
+STATEMENT_START = re.compile(r"^\s*(?:SELECT|WITH)\b", re.IGNORECASE)
+NO_SUCH_COLUMN = re.compile(r"no such column: (?:\w+\.)?(.+)$")
+TABLE_SCAN = re.compile(r"^SCAN (?!CONSTANT ROW)(\S+)")
+
+
+def _sqlite_type(dtype) -> str:
+    if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_integer_dtype(dtype):
+        return "INTEGER"
+    if pd.api.types.is_float_dtype(dtype):
+        return "REAL"
+    return "TEXT"
+
+
+def _quote(name) -> str:
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+@dataclass
+class SQLValidation:
+    """Outcome of validating a generated query against the dataset schema"""
+    valid: bool
+    errors: List[str] = field(default_factory=list)
+    warnings: List[str] = field(default_factory=list)
+    plan: List[str] = field(default_factory=list)
+    estimated_rows_scanned: int = 0
+    full_scan: bool = False
+    cartesian: bool = False
+    correlated: bool = False
+    unbounded: bool = False
+
+    def cost(self) -> Dict[str, Any]:
+        return {
+            "estimated_rows_scanned": self.estimated_rows_scanned,
+            "full_scan": self.full_scan,
+            "cartesian": self.cartesian,
+            "correlated": self.correlated,
+            "unbounded": self.unbounded,
+            "warnings": self.warnings
+        }
+
+
+def validate_sql(sql_query: str, dtypes: Dict[str, Any], row_count: int) -> SQLValidation:
+    """
+    Check a query against the schema without touching the data.
+
+    The query is planned with EXPLAIN QUERY PLAN on an empty in-memory SQLite
+    table with the dataset's columns, which reports syntax errors and unknown
+    columns the same way pandasql would. The plan gives a cost estimate: full
+    scans, nested-loop scans of the table against itself (cartesian joins)
+    and results without a LIMIT. Only multiplicative plans (cartesian joins,
+    correlated subqueries) are rejected for cost; a single scan is what the
+    aggregate cube and out-of-core paths are there to serve, however large
+    the file.
+    """
+    if not STATEMENT_START.match(sql_query):
+        return SQLValidation(valid=False, errors=["Only a single SELECT query is allowed"])
+
+    conn = sqlite3.connect(":memory:")
+    try:
+        columns = ", ".join(f"{_quote(name)} {_sqlite_type(dtype)}" for name, dtype in dtypes.items())
+        conn.execute(f"CREATE TABLE df ({columns})")
+        rows = conn.execute(f"EXPLAIN QUERY PLAN {sql_query}").fetchall()
+    except (sqlite3.Error, sqlite3.Warning) as e:
+        message = str(e)
+        if "one statement at a time" in message:
+            message = "Only a single SELECT query is allowed"
+        missing = NO_SUCH_COLUMN.search(message)
+        if missing:
+            name = missing.group(1).strip('"`[]')
+            names = [str(column) for column in dtypes]
+            close = difflib.get_close_matches(name, names, n=3) or [c for c in names if name.lower() in c.lower()][:3]
+            if close:
+                message += f" (did you mean {', '.join(close)}?)"
+        return SQLValidation(valid=False, errors=[message])
+    finally:
+        conn.close()
+
+    validation = SQLValidation(valid=True, plan=[detail for _, _, _, detail in rows])
+
+    # Scans sharing a parent are nested loops: their row counts multiply
+    scans_by_parent = {}
+    correlated = False
+    for _, parent, _, detail in rows:
+        if TABLE_SCAN.match(detail):
+            scans_by_parent[parent] = scans_by_parent.get(parent, 0) + 1
+        if "CORRELATED" in detail:
+            correlated = True
+    rows_scanned = sum(max(row_count, 1) ** scans for scans in scans_by_parent.values())
+    if correlated:
+        rows_scanned *= max(row_count, 1)
+        validation.warnings.append("Correlated subquery runs once per row")
+
+    validation.full_scan = bool(scans_by_parent)
+    validation.cartesian = any(scans > 1 for scans in scans_by_parent.values())
+    validation.correlated = correlated
+    validation.unbounded = not is_bounded(sql_query)
+    validation.estimated_rows_scanned = rows_scanned
+
+    if validation.cartesian:
+        validation.warnings.append("Table is joined with itself without a usable join condition (cartesian product)")
+    if validation.unbounded:
+        validation.warnings.append(f"Query may return all {row_count} rows")
+    if (validation.cartesian or validation.correlated) and rows_scanned > settings.sql_max_rows_scanned:
+        validation.valid = False
+        validation.errors.append(
+            f"Query is too expensive: an estimated {rows_scanned} row visits "
+            f"(limit {settings.sql_max_rows_scanned})"
+        )
+    return validation
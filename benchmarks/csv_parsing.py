@@ -0,0 +1,93 @@
+"""
+Benchmark CSV parsing: pandas' single-threaded C engine against the
+multi-threaded pyarrow path used by ChatService.read_csv_file.
+
+    python benchmarks/csv_parsing.py --sizes 10,100,500 --threads 1,4,8,32
+
+Synthetic files of each size (MB) are written to a temporary directory, and
+each parser is timed (best of --repeat runs) at each thread count.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend')))
+
+from services.csv_reader import read_csv_parallel
+
+ROWS_PER_BLOCK = 100_000
+
+
+def write_csv(path: str, size_mb: int, seed: int = 0):
+    """Write a mixed-type CSV of roughly size_mb megabytes"""
+    rng = np.random.default_rng(seed)
+    target = size_mb * 1024 * 1024
+    header = True
+    with open(path, "w") as f:
+        while f.tell() < target:
+            n = ROWS_PER_BLOCK
+            block = pd.DataFrame({
+                "id": rng.integers(0, 10**9, n),
+                "amount": rng.normal(100, 25, n).round(2),
+                "region": rng.choice(["north", "south", "east", "west", None], n),
+                "day": pd.Timestamp("2020-01-01") + pd.to_timedelta(rng.integers(0, 1500, n), unit="D"),
+                "active": rng.choice([True, False], n),
+                "note": rng.choice(["ok", "late", "refund", "n/a", ""], n)
+            })
+            block["day"] = block["day"].dt.strftime("%Y-%m-%d")
+            block.to_csv(f, index=False, header=header)
+            header = False
+
+
+def best_of(repeat: int, fn):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10,100", help="comma-separated file sizes in MB")
+    parser.add_argument("--threads", default=None, help="comma-separated thread counts (default: 1 and all cores)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    threads = [int(t) for t in args.threads.split(",")] if args.threads else sorted({1, cores})
+    results = []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in [int(s) for s in args.sizes.split(",")]:
+            path = os.path.join(tmp, f"bench_{size}mb.csv")
+            write_csv(path, size)
+            actual_mb = os.path.getsize(path) / 1024 / 1024
+
+            baseline, expected = best_of(args.repeat, lambda: pd.read_csv(path))
+            results.append({"size_mb": round(actual_mb, 1), "parser": "pandas-c", "threads": 1, "seconds": baseline})
+            print(f"{actual_mb:8.1f} MB  pandas C engine        {baseline:8.3f}s")
+
+            for count in threads:
+                pa.set_cpu_count(count)
+                seconds, df = best_of(args.repeat, lambda: read_csv_parallel(path))
+                pd.testing.assert_frame_equal(df, expected)
+                results.append({"size_mb": round(actual_mb, 1), "parser": "pyarrow", "threads": count, "seconds": seconds})
+                print(f"{actual_mb:8.1f} MB  pyarrow, {count:3d} threads   {seconds:8.3f}s  ({baseline / seconds:.1f}x)")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"cores": cores, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Benchmark /api/csv/upload and /api/chat under concurrent load.
+
+    python benchmarks/db_concurrency.py --concurrency 1,8,32 --requests 200
+
+The app is served by uvicorn in-process against a fresh SQLite database in a
+temporary directory, with the LLM replaced by FakeLLM answering instantly,
+so the timings are the HTTP, CSV and database work only. Each client thread
+uploads a CSV to its own session and then asks a question about it.
+
+Settings come from the environment as usual, so the old database setup can
+be measured for comparison:
+
+    SQLITE_JOURNAL_MODE=DELETE SQLITE_SYNCHRONOUS=FULL python benchmarks/db_concurrency.py
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+import httpx
+import numpy as np
+import pandas as pd
+import uvicorn
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+sys.path.append(BACKEND_DIR)
+
+from fake_llm import FakeLLM
+
+
+def csv_payload(rows: int, seed: int = 0) -> bytes:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "region": rng.choice(["north", "south", "east", "west"], rows),
+        "sales": rng.normal(100, 25, rows).round(2),
+        "units": rng.integers(1, 50, rows)
+    }).to_csv(index=False).encode("utf-8")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port: int) -> uvicorn.Server:
+    import main
+    import api.chat_routes as chat_routes
+    chat_routes.chat_service.llm = FakeLLM()
+
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def percentile(values: List[float], q: float) -> float:
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def summarize(name: str, timings: List[float], errors: int, wall: float) -> dict:
+    return {
+        "endpoint": name,
+        "requests": len(timings) + errors,
+        "errors": errors,
+        "p50_ms": percentile(timings, 50) * 1000,
+        "p95_ms": percentile(timings, 95) * 1000,
+        "p99_ms": percentile(timings, 99) * 1000,
+        "mean_ms": (statistics.mean(timings) if timings else 0.0) * 1000,
+        "throughput_rps": len(timings) / wall if wall else 0.0
+    }
+
+
+def run_level(base_url: str, concurrency: int, requests: int, payload: bytes) -> List[dict]:
+    timings = {"upload": [], "chat": []}
+    errors = {"upload": 0, "chat": 0}
+    lock = threading.Lock()
+
+    with httpx.Client(base_url=base_url, timeout=120) as client:
+        sessions = [f"bench-{concurrency}-{i}-{time.time_ns()}" for i in range(concurrency)]
+        for session_id in sessions:
+            client.post("/api/csv/sessions", json={"session_id": session_id}).raise_for_status()
+
+    def worker(index: int):
+        session_id = sessions[index % concurrency]
+        with httpx.Client(base_url=base_url, timeout=120) as client:
+            for name, call in (
+                ("upload", lambda: client.post(
+                    "/api/csv/upload",
+                    data={"session_id": session_id},
+                    files={"file": ("bench.csv", payload, "text/csv")}
+                )),
+                ("chat", lambda: client.post(
+                    "/api/chat",
+                    json={"session_id": session_id, "user_message": "What are total sales by region?"}
+                ))
+            ):
+                start = time.perf_counter()
+                try:
+                    ok = call().status_code == 200
+                except httpx.HTTPError:
+                    ok = False
+                elapsed = time.perf_counter() - start
+                with lock:
+                    if ok:
+                        timings[name].append(elapsed)
+                    else:
+                        errors[name] += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(requests)))
+    wall = time.perf_counter() - start
+
+    return [
+        dict(summarize(name, timings[name], errors[name], wall), concurrency=concurrency)
+        for name in ("upload", "chat")
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated client thread counts")
+    parser.add_argument("--requests", type=int, default=100, help="upload+chat pairs per concurrency level")
+    parser.add_argument("--rows", type=int, default=5000, help="rows in the uploaded CSV")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+    output = os.path.abspath(args.json) if args.json else None
+
+    payload = csv_payload(args.rows)
+    results = []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Uploads and the database go to the temporary directory
+        os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        os.environ.setdefault("OPENAI_API_KEY", "unused")  # the stub replaces the real LLM
+        os.chdir(tmp)
+
+        from core.config import settings
+        print(f"database {settings.database_url}  journal_mode={settings.sqlite_journal_mode} "
+              f"synchronous={settings.sqlite_synchronous}  pool_size={settings.db_pool_size}")
+
+        port = free_port()
+        server = start_server(port)
+        try:
+            for concurrency in [int(c) for c in args.concurrency.split(",")]:
+                for row in run_level(f"http://127.0.0.1:{port}", concurrency, args.requests, payload):
+                    results.append(row)
+                    print(f"{row['concurrency']:4d} clients  {row['endpoint']:6s}  "
+                          f"p50 {row['p50_ms']:8.1f} ms  p95 {row['p95_ms']:8.1f} ms  "
+                          f"p99 {row['p99_ms']:8.1f} ms  {row['throughput_rps']:7.1f} req/s  "
+                          f"errors {row['errors']}")
+        finally:
+            server.should_exit = True
+
+    if output:
+        with open(output, "w") as f:
+            json.dump({
+                "journal_mode": settings.sqlite_journal_mode,
+                "synchronous": settings.sqlite_synchronous,
+                "pool_size": settings.db_pool_size,
+                "results": results
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+"""
+The backend app with FakeLLM in place of ChatOpenAI, for load tests:
+
+    cd <scratch dir> && uvicorn fake_app:app --app-dir <repo>/benchmarks --workers 4
+
+FAKE_LLM_LATENCY sets the seconds FakeLLM waits before each answer.
+"""
+import os
+import sys
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.join(os.path.dirname(BENCH_DIR), "backend"), BENCH_DIR]
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")  # the app's ChatOpenAI is built before being replaced
+
+import main
+import api.chat_routes as chat_routes
+from fake_llm import FakeLLM
+
+chat_routes.chat_service.llm = FakeLLM(latency=float(os.getenv("FAKE_LLM_LATENCY", "0")))
+
+app = main.app
@@ -0,0 +1,129 @@
+"""
+A deterministic local stand-in for ChatOpenAI, for benchmarks.
+
+FakeLLM recognises each prompt the app sends (request classification, SQL
+generation and repair, insights, chart configuration, column descriptions)
+and answers it from canned responses after a fixed delay, so runs are
+repeatable and measure the application rather than the network.
+
+    from fake_llm import FakeLLM
+    service = ChatService(llm=FakeLLM(latency=0.2))
+
+The canned SQL targets the columns of the datasets written by
+run_benchmarks.py (region, product, sales, units); pass answers={...} to
+override any response kind.
+"""
+import json
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import Field, PrivateAttr
+
+USER_QUESTION = re.compile(r"User (?:Question|Request): (.*)")
+
+# Canned queries by words in the question: a filtered row query, a whole-table
+# aggregate, and otherwise a GROUP BY the aggregate cube can answer
+SQL_ANSWERS = [
+    (("largest", "top", "highest"), "SELECT region, product, sales FROM df WHERE sales > 150 ORDER BY sales DESC LIMIT 20"),
+    (("how many", "count"), "SELECT COUNT(*) AS orders, AVG(sales) AS avg_sales, MAX(units) AS max_units FROM df"),
+    ((), "SELECT region, SUM(sales) AS total_sales, AVG(units) AS avg_units FROM df GROUP BY region")
+]
+
+DEFAULT_ANSWERS = {
+    "classify": "insight",
+    "repair": SQL_ANSWERS[-1][1],
+    "insight": json.dumps({
+        "message": "The north region has the highest total sales",
+        "insights": [
+            "Insight 1: north leads total sales",
+            "Insight 2: average units are similar across regions",
+            "Insight 3: a few large orders dominate the top of the distribution"
+        ],
+        "summary": "Sales are concentrated in a few regions and orders"
+    }),
+    "graph": json.dumps({
+        "chart_type": "bar",
+        "chart_data": {"x": "region", "y": "sales", "title": "Sales by region"},
+        "chart_config": {"xlabel": "Region", "ylabel": "Sales", "color": "blue"}
+    }),
+    "column": "A business attribute of each order, as shown by the sample values."
+}
+
+
+def _kind(prompt: str) -> str:
+    if "numbered user messages" in prompt:
+        return "classify_batch"
+    if "classify it as" in prompt:
+        return "classify"
+    if "expert SQL analyst" in prompt:
+        return "sql"
+    if "You fix SQL queries" in prompt:
+        return "repair"
+    if "visualization expert" in prompt:
+        return "graph"
+    if "Analyze the following column information" in prompt:
+        return "column"
+    return "insight"
+
+
+class FakeLLM(BaseChatModel):
+    """Chat model answering the app's prompts from canned responses after `latency` seconds"""
+
+    latency: float = 0.0
+    answers: Dict[str, str] = Field(default_factory=dict)
+    # Requests containing one of these words are classified as graph requests
+    graph_words: List[str] = Field(default_factory=lambda: ["chart", "plot", "graph", "visual"])
+
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _calls: Dict[str, int] = PrivateAttr(default_factory=dict)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-benchmark"
+
+    @property
+    def calls(self) -> Dict[str, int]:
+        """Number of calls per prompt kind"""
+        with self._lock:
+            return dict(self._calls)
+
+    def _is_graph(self, message: str) -> bool:
+        return any(word in message.lower() for word in self.graph_words)
+
+    def _answer(self, kind: str, prompt: str) -> str:
+        if kind in self.answers:
+            return self.answers[kind]
+        if kind == "classify":
+            message = prompt.split("User message:", 1)[-1].split("Allowed classification states", 1)[0]
+            return "graph" if self._is_graph(message) else "insight"
+        if kind == "classify_batch":
+            messages = re.findall(r"^\s*\d+\. (.*)$", prompt.split("User messages:", 1)[-1], re.MULTILINE)
+            return json.dumps(["graph" if self._is_graph(m) else "insight" for m in messages])
+        if kind == "sql":
+            question = USER_QUESTION.search(prompt)
+            question = question.group(1).lower() if question else ""
+            for words, sql in SQL_ANSWERS:
+                if not words or any(word in question for word in words):
+                    return sql
+        return DEFAULT_ANSWERS[kind]
+
+    def _generate(self, messages, stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs) -> ChatResult:
+        prompt = "\n".join(str(message.content) for message in messages)
+        kind = _kind(prompt)
+        content = self._answer(kind, prompt)
+        with self._lock:
+            self._calls[kind] = self._calls.get(kind, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+        # Roughly four characters per token, like the usage OpenAI reports
+        usage = {
+            "input_tokens": len(prompt) // 4,
+            "output_tokens": len(content) // 4,
+            "total_tokens": (len(prompt) + len(content)) // 4
+        }
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content, usage_metadata=usage))])
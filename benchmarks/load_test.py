@@ -0,0 +1,367 @@
+"""
+Load-test the backend: ramp concurrent clients through traffic scenarios and
+find where each route saturates.
+
+    python benchmarks/load_test.py --workers 4 --concurrency 1,4,16,64 --duration 15
+    python benchmarks/load_test.py --scenarios listing --sessions 2000
+
+The app runs under uvicorn in a subprocess (--workers processes) against a
+fresh SQLite database in a scratch directory, with FakeLLM (fake_app.py)
+answering after --latency seconds. Scenarios:
+
+  upload_storm  every client uploads CSVs (distinct contents, so none are deduplicated)
+  chat_mixed    insight and graph questions on uploaded sessions, with a batch request every tenth call
+  listing       large /api/csv/sessions pages (limit 500, with files) over --sessions sessions
+
+Each client loops for --duration seconds per concurrency level. Per route
+and level the throughput, p50/p95/p99 latency and error rate are recorded,
+along with the RSS of each worker process after the level (Linux only).
+A route is saturated at the first level whose throughput is less than
+--min-gain above the best lower level, or whose error rate exceeds
+--max-error-rate. Results are written to --output-dir as JSON.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import httpx
+import numpy as np
+import pandas as pd
+
+from run_benchmarks import BENCH_DIR, QUESTIONS, git_info, percentile
+
+SCENARIOS = ["upload_storm", "chat_mixed", "listing"]
+LISTING_PAGE = 500
+
+
+def csv_payload(rows: int, seed: int = 0) -> bytes:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "region": rng.choice(["north", "south", "east", "west"], rows),
+        "product": rng.choice(["widget", "gadget", "gizmo"], rows),
+        "sales": rng.gamma(2.0, 50.0, rows).round(2),
+        "units": rng.integers(1, 50, rows)
+    }).to_csv(index=False).encode("utf-8")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# Server
+
+def start_server(workdir: str, port: int, args) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.update({
+        "DATABASE_URL": "sqlite:///./load.db",
+        "FAKE_LLM_LATENCY": str(args.latency),
+        "SPAN_LOGS_ENABLED": "false",
+        "PYTHONPATH": BENCH_DIR
+    })
+    # Create the tables first: workers starting together on an empty database race to create them
+    subprocess.run([sys.executable, "-c", "import fake_app"], cwd=workdir, env=env, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "fake_app:app", "--app-dir", BENCH_DIR,
+         "--host", "127.0.0.1", "--port", str(port), "--workers", str(args.workers), "--log-level", "warning"],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL  # the app prints its pipeline progress
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/", timeout=1).status_code == 200:
+                return process
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("Server did not start within 60s")
+
+
+def _parent_pids() -> Dict[int, int]:
+    parents = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # Fields after the parenthesised command name: state, ppid, ...
+                parents[int(entry)] = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+    return parents
+
+
+def _rss_mb(pid: int):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+def worker_rss(server: subprocess.Popen) -> Dict[str, float]:
+    """RSS in MB of each process serving requests (the server itself when it has one worker)"""
+    if not os.path.isdir("/proc"):
+        return {}
+    children = []
+    for pid, parent in _parent_pids().items():
+        if parent != server.pid:
+            continue
+        try:
+            with open(f"/proc/{pid}/cmdline", "rb") as f:
+                if b"resource_tracker" in f.read():
+                    continue
+        except OSError:
+            continue
+        children.append(pid)
+    pids = sorted(children) or [server.pid]
+    return {str(pid): rss for pid in pids if (rss := _rss_mb(pid)) is not None}
+
+
+# Scenarios: setup once, then each call makes one request and returns its route and whether it failed
+
+class UploadStorm:
+    def __init__(self, args):
+        self.payload = csv_payload(args.rows)
+        self.sessions = []
+
+    async def setup(self, client: httpx.AsyncClient, max_clients: int):
+        self.sessions = [f"upload-{i}-{time.time_ns()}" for i in range(max_clients)]
+        for session_id in self.sessions:
+            (await client.post("/api/csv/sessions", json={"session_id": session_id})).raise_for_status()
+
+    async def call(self, client: httpx.AsyncClient, worker: int, n: int):
+        # A unique trailing row keeps every upload distinct
+        payload = self.payload + f"north,widget,{worker}.{n},1\n".encode("utf-8")
+        response = await client.post(
+            "/api/csv/upload",
+            data={"session_id": self.sessions[worker % len(self.sessions)]},
+            files={"file": ("load.csv", payload, "text/csv")}
+        )
+        return "POST /api/csv/upload", response.status_code >= 400
+
+
+class ChatMixed:
+    def __init__(self, args):
+        self.payload = csv_payload(args.rows)
+        self.session_count = args.chat_sessions
+        self.sessions = []
+
+    async def setup(self, client: httpx.AsyncClient, max_clients: int):
+        self.sessions = [f"chat-{i}-{time.time_ns()}" for i in range(self.session_count)]
+        for i, session_id in enumerate(self.sessions):
+            (await client.post("/api/csv/sessions", json={"session_id": session_id})).raise_for_status()
+            (await client.post(
+                "/api/csv/upload",
+                data={"session_id": session_id},
+                files={"file": ("chat.csv", self.payload + f"north,widget,{i},1\n".encode("utf-8"), "text/csv")}
+            )).raise_for_status()
+
+    async def call(self, client: httpx.AsyncClient, worker: int, n: int):
+        session_id = self.sessions[(worker + n) % len(self.sessions)]
+        if n % 10 == 9:
+            response = await client.post(
+                "/api/chat/batch",
+                json={"session_id": session_id, "user_messages": QUESTIONS[:3]}
+            )
+            return "POST /api/chat/batch", response.status_code >= 400
+        response = await client.post(
+            "/api/chat",
+            json={"session_id": session_id, "user_message": QUESTIONS[(worker + n) % len(QUESTIONS)]}
+        )
+        # The route reports pipeline failures in the body
+        return "POST /api/chat", response.status_code >= 400 or response.json().get("request_type") == "error"
+
+
+class Listing:
+    def __init__(self, args):
+        self.session_count = args.sessions
+        self.payload = csv_payload(10)
+
+    async def setup(self, client: httpx.AsyncClient, max_clients: int):
+        for i in range(self.session_count):
+            session_id = f"list-{i}-{time.time_ns()}"
+            (await client.post("/api/csv/sessions", json={"session_id": session_id})).raise_for_status()
+            # Every session shares one stored blob, so this is cheap however many there are
+            (await client.post(
+                "/api/csv/upload",
+                data={"session_id": session_id},
+                files={"file": ("list.csv", self.payload, "text/csv")}
+            )).raise_for_status()
+
+    async def call(self, client: httpx.AsyncClient, worker: int, n: int):
+        response = await client.get("/api/csv/sessions", params={"limit": LISTING_PAGE})
+        return "GET /api/csv/sessions", response.status_code >= 400
+
+
+SCENARIO_CLASSES = {"upload_storm": UploadStorm, "chat_mixed": ChatMixed, "listing": Listing}
+
+
+# Load generation
+
+async def run_level(base_url: str, scenario, concurrency: int, duration: float) -> Dict[str, dict]:
+    """Run `concurrency` closed-loop clients for `duration` seconds; per-route stats"""
+    timings: Dict[str, List[float]] = {}
+    errors: Dict[str, int] = {}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        deadline = time.monotonic() + duration
+
+        async def client_loop(worker: int):
+            n = 0
+            while time.monotonic() < deadline:
+                start = time.perf_counter()
+                try:
+                    route, failed = await scenario.call(client, worker, n)
+                except httpx.HTTPError:
+                    route, failed = "transport", True
+                elapsed = time.perf_counter() - start
+                if failed:
+                    errors[route] = errors.get(route, 0) + 1
+                else:
+                    timings.setdefault(route, []).append(elapsed)
+                n += 1
+
+        start = time.monotonic()
+        await asyncio.gather(*(client_loop(i) for i in range(concurrency)))
+        wall = time.monotonic() - start
+
+    stats = {}
+    for route in sorted(set(timings) | set(errors)):
+        ok = timings.get(route, [])
+        failed = errors.get(route, 0)
+        stats[route] = {
+            "requests": len(ok) + failed,
+            "errors": failed,
+            "error_rate": failed / (len(ok) + failed),
+            "throughput_rps": len(ok) / wall,
+            "p50_ms": percentile(ok, 50) * 1000,
+            "p95_ms": percentile(ok, 95) * 1000,
+            "p99_ms": percentile(ok, 99) * 1000
+        }
+    return stats
+
+
+def find_saturation(levels: List[dict], route: str, min_gain: float, max_error_rate: float):
+    """The first level where the route stops scaling (throughput gain below min_gain, or too many errors)"""
+    best = None
+    for level in levels:
+        stats = level["routes"].get(route)
+        if stats is None:
+            continue
+        if stats["error_rate"] > max_error_rate:
+            return {"concurrency": level["concurrency"], "reason": f"error rate {stats['error_rate']:.1%}",
+                    "throughput_rps": stats["throughput_rps"]}
+        if best is not None and stats["throughput_rps"] < best["throughput_rps"] * (1 + min_gain):
+            return {"concurrency": level["concurrency"],
+                    "reason": f"throughput {stats['throughput_rps']:.1f} rps vs {best['throughput_rps']:.1f} rps "
+                              f"at {best['concurrency']} clients",
+                    "throughput_rps": stats["throughput_rps"]}
+        if best is None or stats["throughput_rps"] > best["throughput_rps"]:
+            best = {"concurrency": level["concurrency"], "throughput_rps": stats["throughput_rps"]}
+    return None
+
+
+async def run_scenario(base_url: str, server: subprocess.Popen, name: str, args, levels: List[int]) -> dict:
+    scenario = SCENARIO_CLASSES[name](args)
+    async with httpx.AsyncClient(base_url=base_url, timeout=300) as client:
+        await scenario.setup(client, max(levels))
+
+    baseline = worker_rss(server)
+    results = []
+    for concurrency in levels:
+        routes = await run_level(base_url, scenario, concurrency, args.duration)
+        rss = worker_rss(server)
+        results.append({
+            "concurrency": concurrency,
+            "routes": routes,
+            "worker_rss_mb": rss,
+            "worker_rss_growth_mb": {pid: mb - baseline[pid] for pid, mb in rss.items() if pid in baseline}
+        })
+        total_rss = sum(rss.values())
+        for route, stats in routes.items():
+            print(f"{name:12s} {concurrency:4d} clients  {route:24s} {stats['throughput_rps']:8.1f} rps  "
+                  f"p50 {stats['p50_ms']:8.1f} ms  p99 {stats['p99_ms']:8.1f} ms  "
+                  f"errors {stats['error_rate']:6.1%}  RSS {total_rss:7.1f} MB")
+
+    saturation = {}
+    for route in sorted({route for level in results for route in level["routes"]}):
+        point = find_saturation(results, route, args.min_gain, args.max_error_rate)
+        saturation[route] = point
+        if point:
+            print(f"{name:12s} {route}: saturates at {point['concurrency']} clients ({point['reason']})")
+        else:
+            print(f"{name:12s} {route}: still scaling at {levels[-1]} clients")
+    return {"scenario": name, "levels": results, "saturation": saturation}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated scenarios to run")
+    parser.add_argument("--concurrency", default="1,2,4,8,16,32,64", help="comma-separated client counts to ramp through")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per concurrency level")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds FakeLLM waits before each answer")
+    parser.add_argument("--rows", type=int, default=1000, help="rows in each uploaded CSV")
+    parser.add_argument("--chat-sessions", type=int, default=8, help="sessions the chat scenario asks about")
+    parser.add_argument("--sessions", type=int, default=1000, help="sessions created for the listing scenario")
+    parser.add_argument("--min-gain", type=float, default=0.1, help="throughput gain below which a level counts as saturated")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--output-dir", default=os.path.join(BENCH_DIR, "results"))
+    args = parser.parse_args()
+
+    scenarios = args.scenarios.split(",")
+    for name in scenarios:
+        if name not in SCENARIO_CLASSES:
+            parser.error(f"unknown scenario: {name}")
+    levels = sorted(int(c) for c in args.concurrency.split(","))
+
+    results = []
+    for name in scenarios:
+        # A fresh server and database per scenario, so one scenario's data doesn't skew the next
+        with tempfile.TemporaryDirectory() as workdir:
+            port = free_port()
+            server = start_server(workdir, port, args)
+            try:
+                results.append(asyncio.run(run_scenario(f"http://127.0.0.1:{port}", server, name, args, levels)))
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+
+    info = git_info()
+    report = {
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "git": info,
+        "cores": os.cpu_count(),
+        "config": {key: getattr(args, key) for key in ("workers", "duration", "latency", "rows", "sessions", "min_gain")},
+        "concurrency": levels,
+        "results": results
+    }
+    os.makedirs(args.output_dir, exist_ok=True)
+    stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+    commit = (info["commit"] or "nogit")[:10] + ("-dirty" if info["dirty"] else "")
+    output_path = os.path.join(args.output_dir, f"load-{stamp}-{commit}.json")
+    with open(output_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,374 @@
+"""
+Offline benchmarks of the hot paths, with the LLM replaced by FakeLLM.
+
+    python benchmarks/run_benchmarks.py --rows 10k,100k,1m --latency 0.2
+    python benchmarks/run_benchmarks.py --compare benchmarks/results/<earlier run>.json
+
+Suites:
+  chat     ChatService.process_chat on an uploaded file (insight and graph questions)
+  columns  ColumnAnalyzer.analyze_columns on the loaded DataFrame
+  code     CodeProcessor.execute_code with fixed analysis and plotting snippets
+  routes   POST /api/chat and GET /api/csv/sessions/{id} through the FastAPI app
+
+A CSV of each size is generated once (reused from --data-dir if given) and
+every (suite, rows) case runs in its own process against a fresh database,
+so its peak RSS is its own. Each case reports p50/p99/mean latency and
+throughput per operation; the query result cache is off so every chat
+question runs its query. Results are written to --output-dir as JSON,
+tagged with the git commit, and --compare prints the change against an
+earlier results file.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+BACKEND_DIR = os.path.join(REPO_DIR, "backend")
+
+GENERATE_CHUNK_ROWS = 1_000_000
+SUITES = ["chat", "columns", "code", "routes"]
+
+QUESTIONS = [
+    "What are total sales by region?",
+    "Which orders had the largest sales?",
+    "How many orders are there and what is the average sale?",
+    "Plot sales by region as a bar chart",
+    "Which region sells the most units on average?",
+    "Show a chart of units by product"
+]
+
+CODE_SNIPPETS = [
+    ("groupby", "INSIGHTS_TASK", "result = df.groupby('region')['sales'].agg(['sum', 'mean', 'count'])\nprint(result)"),
+    ("describe", "INSIGHTS_TASK", "print(df.describe())"),
+    ("bar_chart", "GRAPH_TASK", (
+        "plt.figure(figsize=(8, 5))\n"
+        "df.groupby('product')['units'].sum().plot(kind='bar')\n"
+        "plt.tight_layout()\n"
+        "plt.show()"
+    ))
+]
+
+
+def parse_rows(value: str) -> List[int]:
+    """Row counts like 10k,1m,50m"""
+    multipliers = {"k": 1_000, "m": 1_000_000}
+    rows = []
+    for item in value.lower().split(","):
+        item = item.strip()
+        if item[-1] in multipliers:
+            rows.append(int(float(item[:-1]) * multipliers[item[-1]]))
+        else:
+            rows.append(int(item))
+    return rows
+
+
+def write_dataset(path: str, rows: int, seed: int = 0):
+    """Write an orders CSV with the columns FakeLLM's canned SQL uses"""
+    rng = np.random.default_rng(seed)
+    with open(path, "w") as f:
+        for start in range(0, rows, GENERATE_CHUNK_ROWS):
+            n = min(GENERATE_CHUNK_ROWS, rows - start)
+            pd.DataFrame({
+                "order_id": np.arange(start, start + n),
+                "region": rng.choice(["north", "south", "east", "west"], n),
+                "product": rng.choice(["widget", "gadget", "gizmo", "doohickey", "sprocket"], n),
+                "sales": rng.gamma(2.0, 50.0, n).round(2),
+                "units": rng.integers(1, 50, n),
+                "order_date": (pd.Timestamp("2022-01-01") + pd.to_timedelta(rng.integers(0, 730, n), unit="D")).strftime("%Y-%m-%d")
+            }).to_csv(f, index=False, header=start == 0)
+
+
+def dataset_path(data_dir: str, rows: int) -> str:
+    path = os.path.join(data_dir, f"orders_{rows}.csv")
+    if not os.path.exists(path):
+        print(f"Generating {rows:,} rows -> {path}")
+        write_dataset(path + ".tmp", rows)
+        os.replace(path + ".tmp", path)
+    return path
+
+
+def percentile(values: List[float], q: float) -> float:
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def summarize(timings: List[float], errors: int) -> dict:
+    total = sum(timings)
+    return {
+        "calls": len(timings),
+        "errors": errors,
+        "p50_ms": percentile(timings, 50) * 1000,
+        "p99_ms": percentile(timings, 99) * 1000,
+        "mean_ms": (statistics.mean(timings) if timings else 0.0) * 1000,
+        "throughput_per_s": len(timings) / total if total else 0.0
+    }
+
+
+def measure(iterations: int, call: Callable[[int], bool]) -> dict:
+    """
+    Time call(i) for each iteration; it returns whether the call succeeded.
+    One untimed call first warms up caches, pools and lazy imports.
+    """
+    call(0)
+    timings, errors = [], 0
+    for i in range(iterations):
+        start = time.perf_counter()
+        ok = call(i)
+        timings.append(time.perf_counter() - start)
+        if not ok:
+            errors += 1
+    return summarize(timings, errors)
+
+
+# Cases (run in a child process)
+
+def _upload(client, session_id: str, csv_path: str):
+    client.post("/api/csv/sessions", json={"session_id": session_id}).raise_for_status()
+    with open(csv_path, "rb") as f:
+        response = client.post(
+            "/api/csv/upload",
+            data={"session_id": session_id},
+            files={"file": (os.path.basename(csv_path), f, "text/csv")}
+        )
+    response.raise_for_status()
+
+
+def case_chat(csv_path: str, llm, iterations: int) -> Dict[str, dict]:
+    from fastapi.testclient import TestClient
+    import main
+    from db.session import SessionLocal
+    from services.chat_service import ChatService
+
+    with TestClient(main.app) as client:
+        _upload(client, "bench", csv_path)  # builds the aggregate cube as the app does
+
+    service = ChatService(llm=llm)
+    db = SessionLocal()
+    try:
+        def chat(i: int) -> bool:
+            result = service.process_chat(db, "bench", QUESTIONS[i % len(QUESTIONS)])
+            return result["request_type"] != "error"
+
+        return {"process_chat": measure(iterations, chat)}
+    finally:
+        db.close()
+
+
+def case_columns(csv_path: str, llm, iterations: int) -> Dict[str, dict]:
+    from column_analyzer import ColumnAnalyzer
+
+    df = pd.read_csv(csv_path)
+    analyzer = ColumnAnalyzer(llm=llm)
+    return {"analyze_columns": measure(iterations, lambda i: bool(analyzer.analyze_columns(df)))}
+
+
+def case_code(csv_path: str, llm, iterations: int) -> Dict[str, dict]:
+    from code_processor import CodeProcessor
+
+    df = pd.read_csv(csv_path)
+    processor = CodeProcessor(df)
+    try:
+        results = {}
+        for name, task_type, code in CODE_SNIPPETS:
+            results[f"execute_code[{name}]"] = measure(iterations, lambda i: processor.execute_code(code, task_type)[0])
+        return results
+    finally:
+        if processor.sandbox is not None:
+            processor.sandbox.shutdown()
+            processor.shared_dataset.close()
+
+
+def case_routes(csv_path: str, llm, iterations: int) -> Dict[str, dict]:
+    from fastapi.testclient import TestClient
+    import main
+    import api.chat_routes as chat_routes
+
+    chat_routes.chat_service.llm = llm
+    with TestClient(main.app) as client:
+        start = time.perf_counter()
+        _upload(client, "bench", csv_path)
+        upload_seconds = time.perf_counter() - start
+
+        def chat(i: int) -> bool:
+            response = client.post(
+                "/api/chat",
+                json={"session_id": "bench", "user_message": QUESTIONS[i % len(QUESTIONS)]}
+            )
+            return response.status_code == 200 and response.json()["request_type"] != "error"
+
+        return {
+            "POST /api/csv/upload": summarize([upload_seconds], 0),
+            "POST /api/chat": measure(iterations, chat),
+            "GET /api/csv/sessions/{id}": measure(
+                iterations, lambda i: client.get("/api/csv/sessions/bench").status_code == 200
+            )
+        }
+
+
+CASES = {"chat": case_chat, "columns": case_columns, "code": case_code, "routes": case_routes}
+
+
+def run_case(args):
+    """Child process: run one case in a scratch directory and print its result as JSON"""
+    sys.path[:0] = [BACKEND_DIR, REPO_DIR, BENCH_DIR]
+    from fake_llm import FakeLLM
+
+    csv_path = os.path.abspath(args.csv)
+    workdir = tempfile.mkdtemp(prefix="insightquery-bench-")
+    os.chdir(workdir)
+
+    llm = FakeLLM(latency=args.latency)
+    start = time.perf_counter()
+    operations = CASES[args.case](csv_path, llm, args.iterations)
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    result = {
+        "suite": args.case,
+        "seconds": time.perf_counter() - start,
+        "operations": operations,
+        "llm_calls": llm.calls,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale,
+        "children_peak_rss_mb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale
+    }
+    print("BENCH_RESULT " + json.dumps(result))
+
+
+def spawn_case(suite: str, rows: int, csv_path: str, args) -> dict:
+    env = dict(os.environ)
+    env.setdefault("OPENAI_API_KEY", "benchmark")  # ChatOpenAI is still constructed for the app's own service
+    env.update({
+        "DATABASE_URL": "sqlite:///./bench.db",
+        "QUERY_CACHE_ENABLED": "false",
+        "SPAN_LOGS_ENABLED": "false"
+    })
+    command = [
+        sys.executable, os.path.abspath(__file__), "--case", suite, "--csv", csv_path,
+        "--latency", str(args.latency), "--iterations", str(args.iterations)
+    ]
+    completed = subprocess.run(command, env=env, capture_output=True, text=True)
+    for line in completed.stdout.splitlines():
+        if line.startswith("BENCH_RESULT "):
+            result = json.loads(line[len("BENCH_RESULT "):])
+            result["rows"] = rows
+            return result
+    print(completed.stdout[-2000:])
+    print(completed.stderr[-4000:])
+    return {"suite": suite, "rows": rows, "error": f"exited with code {completed.returncode}"}
+
+
+def git_info() -> dict:
+    def git(*command):
+        try:
+            return subprocess.run(["git", *command], cwd=REPO_DIR, capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    status = git("status", "--porcelain", "--untracked-files=no")
+    return {"commit": git("rev-parse", "HEAD"), "dirty": bool(status) if status is not None else None}
+
+
+def case_key(result: dict, operation: str):
+    return result["suite"], result["rows"], operation
+
+
+def print_result(result: dict):
+    if "error" in result:
+        print(f"{result['suite']:8s} {result['rows']:>11,} rows  ERROR: {result['error']}")
+        return
+    print(f"{result['suite']:8s} {result['rows']:>11,} rows  peak RSS {result['peak_rss_mb']:8.1f} MB")
+    for name, stats in result["operations"].items():
+        print(f"    {name:44s} p50 {stats['p50_ms']:9.1f} ms  p99 {stats['p99_ms']:9.1f} ms  "
+              f"{stats['throughput_per_s']:8.2f}/s  errors {stats['errors']}")
+
+
+def compare(results: List[dict], baseline_path: str):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    before = {}
+    for result in baseline["results"]:
+        for name, stats in result.get("operations", {}).items():
+            before[case_key(result, name)] = (stats, result["peak_rss_mb"])
+
+    print(f"\nCompared with {baseline_path} (commit {(baseline['git']['commit'] or '?')[:10]}):")
+    for result in results:
+        for name, stats in result.get("operations", {}).items():
+            key = case_key(result, name)
+            if key not in before:
+                continue
+            old, old_rss = before[key]
+            p50 = stats["p50_ms"] / old["p50_ms"] - 1 if old["p50_ms"] else 0.0
+            p99 = stats["p99_ms"] / old["p99_ms"] - 1 if old["p99_ms"] else 0.0
+            rss = result["peak_rss_mb"] / old_rss - 1 if old_rss else 0.0
+            print(f"{result['suite']:8s} {result['rows']:>11,}  {name:44s} p50 {p50:+7.1%}  p99 {p99:+7.1%}  RSS {rss:+7.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", default="10k,100k", help="comma-separated row counts (10k, 1m, 50m, ...)")
+    parser.add_argument("--suites", default=",".join(SUITES), help="comma-separated suites to run")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds FakeLLM waits before each answer")
+    parser.add_argument("--iterations", type=int, default=20, help="timed calls per operation")
+    parser.add_argument("--data-dir", help="keep generated CSVs here and reuse them across runs")
+    parser.add_argument("--output-dir", default=os.path.join(BENCH_DIR, "results"))
+    parser.add_argument("--compare", help="results file of an earlier run to compare with")
+    # Internal: run one case in this process
+    parser.add_argument("--case", choices=SUITES, help=argparse.SUPPRESS)
+    parser.add_argument("--csv", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        run_case(args)
+        return
+
+    suites = args.suites.split(",")
+    for suite in suites:
+        if suite not in CASES:
+            parser.error(f"unknown suite: {suite}")
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = os.path.abspath(args.data_dir) if args.data_dir else tmp
+        os.makedirs(data_dir, exist_ok=True)
+        for rows in parse_rows(args.rows):
+            csv_path = dataset_path(data_dir, rows)
+            for suite in suites:
+                result = spawn_case(suite, rows, csv_path, args)
+                results.append(result)
+                print_result(result)
+
+    info = git_info()
+    report = {
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "git": info,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cores": os.cpu_count(),
+        "config": {"latency": args.latency, "iterations": args.iterations},
+        "results": results
+    }
+    os.makedirs(args.output_dir, exist_ok=True)
+    stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+    commit = (info["commit"] or "nogit")[:10] + ("-dirty" if info["dirty"] else "")
+    output_path = os.path.join(args.output_dir, f"{stamp}-{commit}.json")
+    with open(output_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output_path}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmark zstd-compressed upload storage: disk footprint against the cost
+of compressing during upload and decompressing while loading.
+
+    python benchmarks/upload_compression.py --sizes 10,100 --levels 1,3,9
+
+For each synthetic file (MB) the upload path (stage_upload, 1 MB chunks) is
+timed uncompressed and at each zstd level, then the stored file is loaded
+with read_csv_parallel as ChatService.load_csv_data does. Load times are
+best of --repeat runs.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+from starlette.datastructures import UploadFile
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend')))
+
+from core.config import settings
+from services.blob_store import stage_upload
+from services.csv_reader import read_csv_parallel
+from csv_parsing import best_of, write_csv
+
+
+def stage(path: str, uploads_dir: str, compression: str, level: int):
+    """Run the upload path on a file; returns the staged path and the seconds taken"""
+    settings.upload_zstd_level = level
+    with open(path, "rb") as f:
+        start = time.perf_counter()
+        staged_path, _, _ = asyncio.run(stage_upload(UploadFile(file=f), uploads_dir, compression))
+        seconds = time.perf_counter() - start
+    suffix = ".csv.zst" if compression == "zstd" else ".csv"
+    stored_path = staged_path[:-len(".tmp")] + suffix  # the readers pick the codec from the name
+    os.replace(staged_path, stored_path)
+    return stored_path, seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10,100", help="comma-separated file sizes in MB")
+    parser.add_argument("--levels", default="1,3,9", help="comma-separated zstd levels")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in [int(s) for s in args.sizes.split(",")]:
+            source = os.path.join(tmp, f"bench_{size}mb.csv")
+            write_csv(source, size)
+            raw_bytes = os.path.getsize(source)
+
+            variants = [("none", 0)] + [("zstd", int(level)) for level in args.levels.split(",")]
+            baseline = None
+            for compression, level in variants:
+                stored_path, upload_seconds = stage(source, tmp, compression, level)
+                stored_bytes = os.path.getsize(stored_path)
+                load_seconds, df = best_of(args.repeat, lambda: read_csv_parallel(stored_path))
+                if baseline is None:
+                    baseline, expected = load_seconds, df
+                else:
+                    pd.testing.assert_frame_equal(df, expected)
+                os.remove(stored_path)
+
+                row = {
+                    "size_mb": round(raw_bytes / 1024 / 1024, 1),
+                    "compression": compression,
+                    "level": level,
+                    "stored_mb": round(stored_bytes / 1024 / 1024, 2),
+                    "ratio": raw_bytes / stored_bytes,
+                    "upload_seconds": upload_seconds,
+                    "load_seconds": load_seconds,
+                    "load_overhead": load_seconds / baseline - 1
+                }
+                results.append(row)
+                label = "uncompressed" if compression == "none" else f"zstd level {level}"
+                print(f"{row['size_mb']:8.1f} MB  {label:13s}  stored {row['stored_mb']:8.2f} MB "
+                      f"({row['ratio']:4.1f}x)  upload {upload_seconds:7.3f}s  "
+                      f"load {load_seconds:7.3f}s ({row['load_overhead']:+.0%})")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"cores": os.cpu_count(), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+import json
+import os
+import sqlite3
+import tempfile
+import uuid
+import weakref
+
+HISTORY_WINDOW = int(os.getenv("CHAT_HISTORY_WINDOW", "20"))
+HISTORY_PAGE_SIZE = int(os.getenv("CHAT_HISTORY_PAGE_SIZE", "10"))
+HISTORY_DIR = os.getenv("CHAT_HISTORY_DIR", os.path.join(tempfile.gettempdir(), "insightquery-chat"))
+
+
+def _close_store(conn, path):
+    conn.close()
+    if os.path.exists(path):
+        os.remove(path)
+
+
+class ChatHistory:
+    """
+    Chat messages for one Streamlit session.
+
+    Only the most recent `window` messages are kept in memory; older ones (and
+    the chart images they reference) are spilled to a per-session SQLite file
+    and paged back in on request with load_earlier().
+    """
+
+    def __init__(self, figure_store, window: int = HISTORY_WINDOW, page_size: int = HISTORY_PAGE_SIZE):
+        self.figure_store = figure_store
+        self.window = window
+        self.page_size = page_size
+        self.recent = []
+        self.earlier = []
+        self._spilled = 0
+        self._conn = None
+        self._finalizer = None
+
+    def __len__(self):
+        return self._spilled + len(self.recent)
+
+    @property
+    def has_earlier(self) -> bool:
+        """Whether spilled messages remain that are not currently shown"""
+        return len(self.earlier) < self._spilled
+
+    def visible(self) -> list:
+        """Messages to render: any paged-in earlier messages followed by the recent window"""
+        return self.earlier + self.recent
+
+    def append(self, message: dict):
+        """Add a message, spilling the oldest in-memory ones beyond the window"""
+        # A new message collapses any paged-in history back to the window
+        self.earlier = []
+        self.recent.append(message)
+        while len(self.recent) > self.window:
+            self._spill(self.recent.pop(0))
+
+    def load_earlier(self):
+        """Page the previous block of spilled messages back into view"""
+        end = self._spilled - len(self.earlier)
+        start = max(0, end - self.page_size)
+        rows = self._connection().execute(
+            "SELECT payload FROM messages WHERE seq >= ? AND seq < ? ORDER BY seq",
+            (start, end)
+        ).fetchall()
+        self.earlier = [json.loads(payload) for (payload,) in rows] + self.earlier
+
+    def get_image(self, key: str):
+        """Image bytes for a chart, from memory or the spill store"""
+        image = self.figure_store.get(key)
+        if image is None and self._conn is not None:
+            row = self._conn.execute("SELECT data FROM images WHERE key = ?", (key,)).fetchone()
+            image = row[0] if row else None
+        return image
+
+    def clear(self):
+        """Drop all messages, images and the spill file"""
+        if self._finalizer is not None:
+            self._finalizer()
+        self._conn = None
+        self._finalizer = None
+        self._spilled = 0
+        self.recent = []
+        self.earlier = []
+        self.figure_store.clear()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(HISTORY_DIR, exist_ok=True)
+            path = os.path.join(HISTORY_DIR, f"{uuid.uuid4()}.sqlite3")
+            # Streamlit may run successive reruns of a session on different threads
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.executescript("""
+                CREATE TABLE messages (seq INTEGER PRIMARY KEY, payload TEXT NOT NULL);
+                CREATE TABLE images (key TEXT PRIMARY KEY, data BLOB NOT NULL);
+            """)
+            self._finalizer = weakref.finalize(self, _close_store, self._conn, path)
+        return self._conn
+
+    def _spill(self, message: dict):
+        conn = self._connection()
+        image_keys = message.get("graph_images") or []
+        with conn:
+            conn.execute(
+                "INSERT INTO messages (seq, payload) VALUES (?, ?)",
+                (self._spilled, json.dumps(message, default=str))
+            )
+            for key in image_keys:
+                image = self.figure_store.get(key)
+                if image is not None:
+                    conn.execute("INSERT OR IGNORE INTO images (key, data) VALUES (?, ?)", (key, image))
+        self._spilled += 1
+
+        # Free images no longer referenced by the in-memory window
+        in_memory = {key for m in self.recent for key in (m.get("graph_images") or [])}
+        for key in image_keys:
+            if key not in in_memory:
+                self.figure_store.discard(key)
@@ -1,35 +1,22 @@
 import re
 import sys
-import streamlit as st
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-from agent import validate_graph_code, validate_insights_code
-
-def replace_plt_show_with_streamlit(code: str) -> str:
-    """
-    Replace plt.show() with st.pyplot(plt) in the generated code
-    """
-    # Replace plt.show() with st.pyplot(plt)
-    code = re.sub(r'plt\.show\(\)', 'st.pyplot(plt)', code)
-    
-    # Also replace plt.show() with different spacing
-    code = re.sub(r'plt\.show\( \)', 'st.pyplot(plt)', code)
-    
-    return code
+from code_validator import CodeValidationError, compile_generated_code
+from code_sandbox import SharedDataset, execute_generated_code, get_sandbox_pool
 
 class CodeProcessor:
     """Class to process and execute code returned by the agent"""
     
-    def __init__(self, df):
+    def __init__(self, df, sandbox=None):
         self.df = df
+        # plt, sns, fig, ax and st are bound per run by execute_generated_code
         self.globals_dict = {
             'df': df,
-            'pd': pd,
-            'plt': plt,
-            'sns': sns,
-            'st': st
+            'pd': pd
         }
+        # Generated code runs in the sandbox pool unless it is disabled
+        self.sandbox = sandbox if sandbox is not None else get_sandbox_pool()
+        self.shared_dataset = SharedDataset(df) if self.sandbox is not None else None
     
     def extract_code(self, response):
         """Extract Python code from the agent's response"""
@@ -81,35 +68,17 @@ class CodeProcessor:
         try:
             print("Original code:", code)
             
-            # Replace plt.show() with st.pyplot(plt) before execution
-            code = replace_plt_show_with_streamlit(code)
-            
-            print("Code after replacement:", code)
-            
-            # Validate code based on task type
-            if task_type == "GRAPH_TASK":
-                if not validate_graph_code(code):
-                    return False, "Graph code missing required Streamlit elements", None
-            else:
-                if not validate_insights_code(code):
-                    return False, "Insights code contains dangerous elements", None
-            
-            # Create a new namespace for execution
-            local_dict = {}
-            
-            # Execute the code
-            exec(code, self.globals_dict, local_dict)
+            # Validate and rewrite plt.show() in one (cached) AST pass
+            try:
+                compiled = compile_generated_code(code, task_type)
+            except CodeValidationError as e:
+                return False, str(e), None
             
-            # If it's a graph, return the figure for display
-            if task_type == "GRAPH_TASK":
-                # Check if there's a current figure
-                if plt.get_fignums():
-                    fig = plt.gcf()
-                    return True, "Code executed successfully", fig
-                else:
-                    return True, "Code executed successfully", None
+            # Execute in a sandbox worker, or in-process if sandboxing is disabled
+            if self.sandbox is not None:
+                return self.sandbox.run(self.shared_dataset, code, task_type)
             
-            return True, "Code executed successfully", None
+            return execute_generated_code(self.globals_dict, compiled, task_type)
         except Exception as e:
             return False, f"Error executing code: {str(e)}", None
     
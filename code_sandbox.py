@@ -0,0 +1,390 @@
+import io
+import os
+import pickle
+import queue
+import signal
+import tempfile
+import threading
+import atexit
+import weakref
+import multiprocessing as mp
+from contextlib import redirect_stdout
+import pandas as pd
+from code_validator import CodeValidationError, compile_generated_code
+from figure_context import FigureContext
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+# Pool configuration (SANDBOX_WORKERS=0 runs generated code in-process)
+SANDBOX_WORKERS = int(os.getenv("SANDBOX_WORKERS", "2"))
+SANDBOX_TIMEOUT = float(os.getenv("SANDBOX_TIMEOUT", "30"))
+SANDBOX_CPU_SECONDS = int(os.getenv("SANDBOX_CPU_SECONDS", "20"))
+SANDBOX_MEMORY_MB = int(os.getenv("SANDBOX_MEMORY_MB", "4096"))
+SANDBOX_MAX_TASKS = int(os.getenv("SANDBOX_MAX_TASKS", "50"))
+SANDBOX_QUEUE_TIMEOUT = float(os.getenv("SANDBOX_QUEUE_TIMEOUT", "60"))
+SANDBOX_MAX_OUTPUT_CHARS = 10_000  # print() output returned from a worker
+SANDBOX_STARTUP_TIMEOUT = 60
+
+
+class CPULimitExceeded(Exception):
+    """Raised inside a worker when a task uses up its CPU-time allowance"""
+
+
+class StreamlitRecorder:
+    """
+    Stand-in for the streamlit module inside generated code.
+
+    Text-like calls are recorded so they can be shown by the app afterwards;
+    everything else (including st.pyplot) is a no-op because the run's figure
+    is returned to the app and rendered there.
+    """
+
+    TEXT_CALLS = {"write", "markdown", "text", "code", "dataframe", "table", "metric", "json"}
+
+    def __init__(self):
+        self.outputs = []
+
+    def __getattr__(self, name):
+        if name in self.TEXT_CALLS:
+            def record(*args, **kwargs):
+                self.outputs.extend(str(arg) for arg in args)
+            return record
+        return lambda *args, **kwargs: None
+
+
+def execute_generated_code(globals_dict, code, task_type="INSIGHTS_TASK"):
+    """
+    Execute code compiled by compile_generated_code.
+
+    Each run gets its own FigureContext (fig, ax, plt, sns) and a
+    StreamlitRecorder as st on top of globals_dict, so global pyplot state is
+    never touched. Returns a (success, message, figure) tuple, the same shape
+    as CodeProcessor.execute_code.
+    """
+    figure_context = FigureContext()
+    recorder = StreamlitRecorder()
+    namespace = dict(globals_dict, st=recorder, **figure_context.namespace())
+
+    try:
+        exec(code, namespace)
+
+        message = "Code executed successfully"
+        if recorder.outputs:
+            message = message + "\n\n" + "\n\n".join(recorder.outputs)
+
+        if task_type == "GRAPH_TASK" and figure_context.has_plot():
+            return True, message, figure_context.figure
+
+        return True, message, None
+    except CPULimitExceeded:
+        raise
+    except Exception as e:
+        return False, f"Error executing code: {str(e) or type(e).__name__}", None
+
+
+class SharedDataset:
+    """
+    A DataFrame published once to a temporary file that worker processes load
+    from, so the frame is never pickled per call.
+
+    Arrow IPC is used when the frame converts cleanly (workers memory-map it);
+    otherwise it falls back to a pickle file.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        fd, path = tempfile.mkstemp(prefix="insightquery-", suffix=".arrow")
+        os.close(fd)
+        try:
+            import pyarrow.feather as feather
+            feather.write_feather(df, path, compression="uncompressed")
+        except Exception as e:
+            print(f"Arrow export failed, falling back to pickle: {str(e)}")
+            os.remove(path)
+            path = path[:-len(".arrow")] + ".pkl"
+            df.to_pickle(path)
+
+        self.path = path
+        self._finalizer = weakref.finalize(self, _remove_file, path)
+
+    def close(self):
+        self._finalizer()
+
+
+def _remove_file(path):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def load_shared_dataset(path: str) -> pd.DataFrame:
+    """
+    Load a dataset published by SharedDataset.
+
+    Arrow files are converted with split_blocks, so numeric columns without
+    nulls (and float columns) stay read-only views of the memory-mapped file
+    and their pages are shared by every worker. String, object, datetime and
+    nullable integer/bool columns cannot be viewed zero-copy and are copied
+    into each worker, as is the whole frame for the pickle fallback. Mapped
+    pages still count towards each worker's RLIMIT_AS.
+    """
+    if path.endswith(".arrow"):
+        import pyarrow.feather as feather
+        return feather.read_table(path, memory_map=True).to_pandas(split_blocks=True)
+    return pd.read_pickle(path)
+
+
+def _raise_cpu_limit(signum, frame):
+    raise CPULimitExceeded()
+
+
+def _apply_memory_limit(memory_mb):
+    if resource is None or memory_mb <= 0:
+        return
+    limit = memory_mb * 1024 * 1024
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+
+def _arm_cpu_limit(cpu_seconds):
+    """Set the soft CPU limit to the time used so far plus this task's allowance"""
+    if resource is None or cpu_seconds <= 0:
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    soft = int(usage.ru_utime + usage.ru_stime) + cpu_seconds
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def _disarm_cpu_limit():
+    if resource is None:
+        return
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    resource.setrlimit(resource.RLIMIT_CPU, (hard, hard))
+
+
+def _worker_main(conn, cpu_seconds, memory_mb):
+    """Worker loop: receive (dataset path, code, task type), send back a pickled result"""
+    import matplotlib
+    matplotlib.use("Agg")
+    # Writes copy the affected columns, so the cached (partly read-only,
+    # memory-mapped) frame is never modified by a task
+    pd.set_option("mode.copy_on_write", True)
+
+    if resource is not None:
+        signal.signal(signal.SIGXCPU, _raise_cpu_limit)
+    _apply_memory_limit(memory_mb)
+    conn.send_bytes(b"ready")
+
+    dataset_key, df = None, None
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+
+        path, code, task_type = task
+        try:
+            key = (path, os.stat(path).st_mtime_ns)
+            if key != dataset_key:
+                df, dataset_key = None, None
+                df = load_shared_dataset(path)
+                dataset_key = key
+        except Exception as e:
+            conn.send_bytes(pickle.dumps((False, f"Error loading dataset: {str(e)}", None)))
+            continue
+
+        try:
+            compiled = compile_generated_code(code, task_type)
+        except CodeValidationError as e:
+            conn.send_bytes(pickle.dumps((False, str(e), None)))
+            continue
+
+        # The worker runs one task at a time, so stdout can be captured for the task
+        printed = io.StringIO()
+        _arm_cpu_limit(cpu_seconds)
+        try:
+            with redirect_stdout(printed):
+                success, message, fig = execute_generated_code({"df": df.copy(deep=False), "pd": pd}, compiled, task_type)
+        except CPULimitExceeded:
+            success, message, fig = False, "Error executing code: CPU time limit exceeded", None
+        finally:
+            _disarm_cpu_limit()
+
+        output = printed.getvalue().strip()
+        if output:
+            if len(output) > SANDBOX_MAX_OUTPUT_CHARS:
+                output = output[:SANDBOX_MAX_OUTPUT_CHARS] + "\n... (output truncated)"
+            message = message + "\n\n" + output
+
+        try:
+            payload = pickle.dumps((success, message, fig))
+        except Exception as e:
+            payload = pickle.dumps((success, f"{message} (figure could not be returned: {str(e)})", None))
+
+        conn.send_bytes(payload)
+
+
+class _Worker:
+    """A single pre-started worker process and its pipe"""
+
+    def __init__(self, ctx, cpu_seconds, memory_mb):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_worker_main,
+            args=(child_conn, cpu_seconds, memory_mb),
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+        self.tasks = 0
+
+    def wait_ready(self, timeout):
+        """Wait for the worker to finish importing its libraries"""
+        if not self.ready and self.conn.poll(timeout):
+            self.ready = self.conn.recv_bytes() == b"ready"
+        return self.ready
+
+    def stop(self):
+        """Ask the worker to exit, killing it if it does not"""
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.kill()
+        else:
+            self.conn.close()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class SandboxPool:
+    """
+    Pool of pre-started worker processes that execute generated code under
+    CPU-time and memory limits.
+
+    A task that exceeds the wall-clock timeout gets its worker killed and
+    replaced; workers are also recycled after max_tasks executions. A task
+    that waits longer than queue_timeout for an idle worker is rejected.
+    """
+
+    def __init__(
+        self,
+        workers: int = SANDBOX_WORKERS,
+        timeout: float = SANDBOX_TIMEOUT,
+        cpu_seconds: int = SANDBOX_CPU_SECONDS,
+        memory_mb: int = SANDBOX_MEMORY_MB,
+        max_tasks: int = SANDBOX_MAX_TASKS,
+        queue_timeout: float = SANDBOX_QUEUE_TIMEOUT
+    ):
+        self.timeout = timeout
+        self.queue_timeout = queue_timeout
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.max_tasks = max_tasks
+        # spawn keeps workers independent of the (threaded) Streamlit server
+        self._ctx = mp.get_context("spawn")
+        self._idle = queue.Queue()
+        self._workers = set()
+        self._lock = threading.Lock()
+        self._closed = False
+
+        for _ in range(workers):
+            self._idle.put(self._spawn())
+
+    def _spawn(self) -> _Worker:
+        worker = _Worker(self._ctx, self.cpu_seconds, self.memory_mb)
+        with self._lock:
+            self._workers.add(worker)
+        return worker
+
+    def _retire(self, worker: _Worker, kill: bool = False):
+        with self._lock:
+            self._workers.discard(worker)
+        if kill:
+            worker.kill()
+        else:
+            worker.stop()
+
+    def run(self, dataset: SharedDataset, code: str, task_type: str = "INSIGHTS_TASK"):
+        """Execute code against a shared dataset, returning (success, message, figure)"""
+        try:
+            worker = self._idle.get(timeout=self.queue_timeout)
+        except queue.Empty:
+            return False, "Error executing code: sandbox busy, try again shortly", None
+        if not worker.process.is_alive():
+            self._retire(worker, kill=True)
+            worker = self._spawn()
+        try:
+            if not worker.wait_ready(SANDBOX_STARTUP_TIMEOUT):
+                self._retire(worker, kill=True)
+                worker = self._spawn()
+                return False, "Error executing code: sandbox worker failed to start", None
+
+            try:
+                worker.conn.send((dataset.path, code, task_type))
+            except (BrokenPipeError, OSError):
+                self._retire(worker, kill=True)
+                worker = self._spawn()
+                return False, "Error executing code: sandbox worker exited unexpectedly", None
+
+            if not worker.conn.poll(self.timeout):
+                self._retire(worker, kill=True)
+                worker = self._spawn()
+                return False, f"Error executing code: timed out after {self.timeout:g} seconds", None
+
+            try:
+                payload = worker.conn.recv_bytes()
+            except (EOFError, OSError):
+                self._retire(worker, kill=True)
+                worker = self._spawn()
+                return False, "Error executing code: worker exceeded its resource limits", None
+
+            worker.tasks += 1
+            if worker.tasks >= self.max_tasks:
+                self._retire(worker)
+                worker = self._spawn()
+
+            return pickle.loads(payload)
+        finally:
+            self._idle.put(worker)
+
+    def shutdown(self):
+        """Stop every worker in the pool"""
+        if self._closed:
+            return
+        self._closed = True
+        with self._lock:
+            workers = list(self._workers)
+            self._workers.clear()
+        for worker in workers:
+            worker.stop()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_sandbox_pool():
+    """Return the process-wide sandbox pool, or None when sandboxing is disabled"""
+    global _pool
+    if SANDBOX_WORKERS <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = SandboxPool()
+            atexit.register(_pool.shutdown)
+        return _pool
@@ -0,0 +1,271 @@
+import ast
+import hashlib
+import threading
+from collections import OrderedDict
+from figure_context import PANDAS_PLOT_METHODS, PLOT_HELPER
+
+# Top-level modules generated code may import
+ALLOWED_IMPORTS = {
+    "pandas", "numpy", "matplotlib", "seaborn", "scipy", "math", "statistics",
+    "datetime", "collections", "itertools", "functools", "re", "textwrap"
+}
+
+# Builtins and names generated code may not reference
+DENIED_NAMES = {
+    "exec", "eval", "compile", "open", "__import__", "globals", "locals", "vars",
+    "input", "breakpoint", "exit", "quit", "getattr", "setattr", "delattr"
+}
+
+# Attributes that reach the OS or write files
+DENIED_ATTRIBUTES = {
+    "system", "popen", "unlink", "rmdir", "rmtree", "chmod", "chown", "fork",
+    "savefig", "to_pickle", "read_pickle", "to_csv", "to_excel", "to_parquet",
+    "to_sql", "to_hdf", "to_feather"
+}
+
+# Attributes that are only dangerous on these modules (list.remove and the
+# like are ordinary agent code)
+OS_MODULES = {"os", "shutil", "subprocess", "signal"}
+OS_ATTRIBUTES = {"remove", "kill", "spawn"}
+
+# Modules whose imports are bound to the names the namespace provides: the
+# per-run plt/sns facades, and pd (a PandasFacade for the agent's python tool)
+INJECTED_MODULES = {"matplotlib.pyplot": "plt", "seaborn": "sns", "pandas": "pd"}
+
+CACHE_SIZE = 256
+
+
+class CodeValidationError(ValueError):
+    """Raised when generated code is rejected by validation"""
+
+
+def _dotted_name(node):
+    """Return 'plt.figure' for plt.figure, None for anything not a plain dotted name"""
+    parts = []
+    while isinstance(node, ast.Attribute):
+        parts.append(node.attr)
+        node = node.value
+    if isinstance(node, ast.Name):
+        parts.append(node.id)
+        return ".".join(reversed(parts))
+    return None
+
+
+def _route_plot_call(node):
+    """
+    Rewrite obj.plot(...), obj.hist(...), obj.boxplot(...) and obj.plot.<kind>(...)
+    to _plot_on_axes(obj, "<method>", ...), which draws pandas plots on the
+    run's axes instead of global pyplot. Other calls are returned unchanged.
+    """
+    func = node.func
+    if not isinstance(func, ast.Attribute) or any(keyword.arg == "ax" for keyword in node.keywords):
+        return node
+    if func.attr in PANDAS_PLOT_METHODS:
+        receiver, method = func.value, func.attr
+    elif isinstance(func.value, ast.Attribute) and func.value.attr == "plot" and not func.attr.startswith("_"):
+        receiver, method = func.value.value, f"plot.{func.attr}"
+    else:
+        return node
+    call = ast.Call(
+        func=ast.Name(id=PLOT_HELPER, ctx=ast.Load()),
+        args=[receiver, ast.Constant(method)] + node.args,
+        keywords=node.keywords
+    )
+    return ast.copy_location(call, node)
+
+
+def _bind_injected(aliases):
+    """Turn `import seaborn as sb` style aliases into `sb = sns` assignments"""
+    return [
+        ast.Assign(
+            targets=[ast.Name(id=bound, ctx=ast.Store())],
+            value=ast.Name(id=injected, ctx=ast.Load())
+        )
+        for bound, injected in aliases
+    ]
+
+
+class _GeneratedCodeTransformer(ast.NodeTransformer):
+    """
+    Rewrites plt.show() to st.pyplot(plt) and pandas plotting calls to the run's
+    axes, points pyplot/seaborn imports at the injected per-run facades, and
+    collects validation problems
+    """
+
+    def __init__(self):
+        self.errors = []
+        self.calls = set()
+        self.aliases = {}
+        self.matplotlib_names = set()
+
+    def visit_Import(self, node):
+        kept, injected = [], []
+        for alias in node.names:
+            self._check_import(alias.name)
+            if alias.name in INJECTED_MODULES and (alias.asname or "." not in alias.name):
+                injected.append((alias.asname or alias.name, INJECTED_MODULES[alias.name]))
+            else:
+                kept.append(alias)
+                if alias.name == "matplotlib" or (alias.name.startswith("matplotlib.") and not alias.asname):
+                    self.matplotlib_names.add(alias.asname or "matplotlib")
+        return self._replace_import(node, kept, injected)
+
+    def visit_ImportFrom(self, node):
+        self._check_import(node.module or "")
+        kept, injected = [], []
+        for alias in node.names:
+            full_name = f"{node.module}.{alias.name}"
+            if full_name in INJECTED_MODULES:
+                injected.append((alias.asname or alias.name, INJECTED_MODULES[full_name]))
+            else:
+                kept.append(alias)
+        return self._replace_import(node, kept, injected)
+
+    def _replace_import(self, node, kept, injected):
+        if not injected:
+            return node
+        self.aliases.update(injected)
+        statements = _bind_injected(injected)
+        if kept:
+            node.names = kept
+            statements.insert(0, node)
+        return [ast.copy_location(statement, node) for statement in statements]
+
+    def _check_import(self, module):
+        if module.split(".")[0] not in ALLOWED_IMPORTS:
+            self.errors.append(f"import of '{module}' is not allowed")
+
+    def visit_Name(self, node):
+        if node.id in DENIED_NAMES or node.id.startswith("__") or node.id == PLOT_HELPER:
+            self.errors.append(f"use of '{node.id}' is not allowed")
+        return node
+
+    def visit_Attribute(self, node):
+        self.generic_visit(node)
+        if node.attr in DENIED_ATTRIBUTES or node.attr.startswith("__"):
+            self.errors.append(f"access to attribute '{node.attr}' is not allowed")
+        if node.attr in OS_ATTRIBUTES and (_dotted_name(node.value) or "").split(".")[0] in OS_MODULES:
+            self.errors.append(f"access to attribute '{node.attr}' is not allowed")
+        if node.attr == "pyplot" and isinstance(node.value, ast.Name) and node.value.id in self.matplotlib_names:
+            # matplotlib.pyplot.<x> after `import matplotlib` goes to the per-run facade too
+            return ast.copy_location(ast.Name(id=INJECTED_MODULES["matplotlib.pyplot"], ctx=node.ctx), node)
+        return node
+
+    def visit_Call(self, node):
+        self.generic_visit(node)
+        name = _dotted_name(node.func)
+        if name:
+            root, _, rest = name.partition(".")
+            if root in self.aliases:
+                name = ".".join(filter(None, [self.aliases[root], rest]))
+
+        if name == "plt.show" and not node.args and not node.keywords:
+            replacement = ast.Call(
+                func=ast.Attribute(value=ast.Name(id="st", ctx=ast.Load()), attr="pyplot", ctx=ast.Load()),
+                args=[ast.Name(id="plt", ctx=ast.Load())],
+                keywords=[]
+            )
+            node = ast.copy_location(replacement, node)
+            name = "st.pyplot"
+
+        if name:
+            self.calls.add(name)
+        return _route_plot_call(node)
+
+
+def rewrite_generated_code(source: str) -> str:
+    """
+    Source with the rewrites compile_generated_code applies (pyplot, seaborn
+    and pandas imports bound to the injected names, pandas plotting routed to
+    the run's axes, plt.show() to st.pyplot), for code that is executed
+    without it, such as the agent's python tool. Nothing is validated; the
+    source is returned unchanged if it needs no rewrite or does not parse.
+    """
+    try:
+        tree = ast.parse(source, mode="exec")
+    except SyntaxError:
+        return source
+    before = ast.dump(tree)
+    tree = ast.fix_missing_locations(_GeneratedCodeTransformer().visit(tree))
+    return ast.unparse(tree) if ast.dump(tree) != before else source
+
+
+def _check_graph_calls(calls):
+    """Graph code must create (or use the injected) figure, lay it out and hand it to Streamlit"""
+    missing = []
+    uses_injected = any(call.startswith(("ax.", "fig.")) for call in calls)
+    if not calls & {"plt.figure", "plt.subplots"} and not uses_injected:
+        missing.append("plt.figure(...)")
+    if not any(call.endswith("tight_layout") for call in calls):
+        missing.append("plt.tight_layout()")
+    if "st.pyplot" not in calls:
+        missing.append("st.pyplot(...)")
+    return missing
+
+
+def _compile(source, task_type):
+    try:
+        tree = ast.parse(source, mode="exec")
+    except SyntaxError as e:
+        raise CodeValidationError(f"Syntax error in generated code: {e.msg} (line {e.lineno})")
+
+    transformer = _GeneratedCodeTransformer()
+    tree = ast.fix_missing_locations(transformer.visit(tree))
+
+    if transformer.errors:
+        raise CodeValidationError("Code contains dangerous elements: " + "; ".join(sorted(set(transformer.errors))))
+
+    if task_type == "GRAPH_TASK":
+        missing = _check_graph_calls(transformer.calls)
+        if missing:
+            raise CodeValidationError("Graph code missing required Streamlit elements: " + ", ".join(missing))
+
+    return compile(tree, "<generated>", "exec")
+
+
+class CompiledCodeCache:
+    """Bounded LRU of compiled code objects (or validation error messages) keyed by source hash"""
+
+    def __init__(self, maxsize: int = CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compile(self, source: str, task_type: str):
+        key = hashlib.sha256(f"{task_type}\0{source}".encode("utf-8")).hexdigest()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+
+        if entry is None:
+            try:
+                entry = _compile(source, task_type)
+            except CodeValidationError as e:
+                entry = str(e)
+            with self._lock:
+                self._entries[key] = entry
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+
+        if isinstance(entry, str):
+            raise CodeValidationError(entry)
+        return entry
+
+
+_cache = CompiledCodeCache()
+
+
+def compile_generated_code(source: str, task_type: str = "INSIGHTS_TASK"):
+    """
+    Validate and compile generated code in a single AST pass.
+
+    plt.show() calls are rewritten to st.pyplot(plt) and pandas plotting calls
+    are drawn on the run's axes (see _route_plot_call). Compiled code objects
+    are cached by source hash, so reruns and history replays skip parsing.
+
+    Raises:
+        CodeValidationError: if the code fails to parse or validate
+    """
+    return _cache.get_or_compile(source, task_type)
@@ -7,8 +7,9 @@ from typing import Dict, List, Any
 class ColumnAnalyzer:
     """Analyzes CSV columns and generates descriptions using LLM"""
     
-    def __init__(self):
-        self.llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
+    def __init__(self, llm=None):
+        # Any LangChain chat model can be passed in (benchmarks use a local fake)
+        self.llm = llm or ChatOpenAI(model="gpt-4o-mini", temperature=0)
         
     def analyze_columns(self, df: pd.DataFrame, sample_size: int = 10) -> Dict[str, str]:
         """
@@ -0,0 +1,17 @@
+import os
+import pandas as pd
+
+from backend.services.csv_parser import read_csv, set_parser_threads
+
+CSV_PARSE_THREADS = int(os.getenv("CSV_PARSE_THREADS", "0"))  # 0 uses every core
+
+# pyarrow's thread pool is process-wide, so it is sized once when the app loads
+set_parser_threads(CSV_PARSE_THREADS)
+
+
+def load_csv(source, delimiter: str = ",") -> pd.DataFrame:
+    """
+    Read a CSV given to the Streamlit app (a path or an uploaded file object)
+    with the backend's shared pyarrow reader.
+    """
+    return read_csv(source, delimiter)
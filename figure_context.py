@@ -0,0 +1,235 @@
+from types import ModuleType
+import matplotlib.pyplot as plt
+import pandas as pd
+import seaborn as sns
+from matplotlib.axes import Axes
+from matplotlib.figure import Figure
+from lazy_frame import materialize
+
+DEFAULT_FIGSIZE = (10, 6)
+
+# seaborn functions that draw onto a single Axes and accept ax=
+AXES_LEVEL_PLOTS = {
+    "barplot", "countplot", "boxplot", "boxenplot", "violinplot", "stripplot",
+    "swarmplot", "pointplot", "histplot", "kdeplot", "ecdfplot", "rugplot",
+    "scatterplot", "lineplot", "regplot", "residplot", "heatmap"
+}
+
+# seaborn functions that create their own figure
+FIGURE_LEVEL_PLOTS = {"catplot", "relplot", "displot", "lmplot", "pairplot", "jointplot", "clustermap"}
+
+# pandas plotting methods (df.plot(...), df.plot.bar(...), s.hist(...), ...) draw on
+# global pyplot unless given ax=; code_validator routes them through this helper
+PANDAS_PLOT_METHODS = {"plot", "hist", "boxplot"}
+PLOT_HELPER = "_plot_on_axes"
+
+# pyplot members that hold no figure state and are passed through unchanged
+PYPLOT_PASSTHROUGH = {"cm", "colormaps", "get_cmap"}
+
+
+class FigureContext:
+    """
+    A figure created explicitly for one code run.
+
+    Generated code gets `fig`, `ax` and pyplot/seaborn facades bound to this
+    figure instead of the global pyplot state, so sessions running in
+    different threads never see each other's figures. pandas plotting calls
+    rewritten by code_validator are drawn on the current
+    axes through plot_on_axes.
+    """
+
+    def __init__(self, figsize=DEFAULT_FIGSIZE):
+        self.figure = Figure(figsize=figsize)
+        self.axes = self.figure.add_subplot()
+
+    def namespace(self) -> dict:
+        """Names to inject into the exec namespace of a run"""
+        return {
+            "fig": self.figure,
+            "ax": self.axes,
+            "plt": PyplotFacade(self),
+            "sns": SeabornFacade(self),
+            PLOT_HELPER: self.plot_on_axes
+        }
+
+    def plot_on_axes(self, obj, method: str, *args, **kwargs):
+        """
+        Call obj.<method>(*args, **kwargs), where method is "plot", "hist",
+        "boxplot" or "plot.<kind>", passing the current axes as ax= when obj
+        is a pandas object and no ax was given
+        """
+        name, _, kind = method.partition(".")
+        args, kwargs = materialize(args), materialize(kwargs)
+        if name not in PANDAS_PLOT_METHODS or (kind and (name != "plot" or not kind.isidentifier() or kind.startswith("_"))):
+            raise ValueError(f"Unsupported plotting call: {method}")
+
+        target = getattr(obj, name)
+        # Proxies such as LazyFrame hand out methods bound to the real pandas object
+        owner = getattr(target, "__self__", obj)
+        if kind:
+            target = getattr(target, kind)
+        if "ax" not in kwargs and not isinstance(owner, (Axes, Figure, PyplotFacade, SeabornFacade, ModuleType)):
+            kwargs["ax"] = self.axes
+            if name == "hist" and isinstance(owner, pd.Series):
+                # Series.hist opens a global pyplot figure even when given ax=;
+                # Series.plot.hist draws the same histogram on the axes alone
+                return owner.plot.hist(*args, **self._series_hist_options(kwargs))
+        return target(*args, **kwargs)
+
+    @staticmethod
+    def _series_hist_options(kwargs):
+        """Series.hist keyword arguments in Series.plot.hist terms"""
+        kwargs.setdefault("grid", True)
+        kwargs.pop("figure", None)
+        if "xrot" in kwargs:
+            kwargs["rot"] = kwargs.pop("xrot")
+        if "xlabelsize" in kwargs:
+            kwargs["fontsize"] = kwargs.pop("xlabelsize")
+        kwargs.pop("yrot", None)
+        kwargs.pop("ylabelsize", None)
+        return kwargs
+
+    def has_plot(self) -> bool:
+        """Whether anything was drawn on the figure"""
+        return any(ax.has_data() for ax in self.figure.axes)
+
+    def adopt(self, figure: Figure):
+        """Take over a figure created elsewhere (e.g. by a seaborn figure-level plot)"""
+        plt.close(figure)  # Unregister it from pyplot; the figure itself stays usable
+        self.figure = figure
+        self.axes = figure.axes[0] if figure.axes else figure.add_subplot()
+
+
+def _materializing(function):
+    """function with LazyFrame/LazyColumn arguments (e.g. the agent's df) passed as pandas objects"""
+    def call(*args, **kwargs):
+        return function(*materialize(args), **materialize(kwargs))
+    return call
+
+
+class PyplotFacade:
+    """
+    The subset of matplotlib.pyplot generated code uses, bound to a FigureContext.
+
+    Figure-level helpers act on the run's figure and plotting calls on its
+    current axes; any other pyplot name raises AttributeError rather than
+    reaching the global pyplot state.
+    """
+
+    def __init__(self, context: FigureContext):
+        self._context = context
+
+    def figure(self, *args, figsize=None, **kwargs):
+        if figsize is not None:
+            self._context.figure.set_size_inches(figsize)
+        return self._context.figure
+
+    def subplots(self, nrows=1, ncols=1, figsize=None, **kwargs):
+        figure = self._context.figure
+        figure.clear()
+        if figsize is not None:
+            figure.set_size_inches(figsize)
+        axes = figure.subplots(nrows, ncols, **kwargs)
+        self._context.axes = axes if isinstance(axes, Axes) else axes.flat[0]
+        return figure, axes
+
+    def subplot(self, *args, **kwargs):
+        self._context.axes = self._context.figure.add_subplot(*args, **kwargs)
+        return self._context.axes
+
+    def gcf(self):
+        return self._context.figure
+
+    def gca(self):
+        return self._context.axes
+
+    def sca(self, ax):
+        self._context.axes = ax
+
+    def show(self, *args, **kwargs):
+        pass
+
+    def close(self, *args, **kwargs):
+        # The run's figure is returned to the app after the run, so it stays open
+        pass
+
+    def clf(self):
+        self._context.figure.clear()
+        self._context.axes = self._context.figure.add_subplot()
+
+    def tight_layout(self, **kwargs):
+        self._context.figure.tight_layout(**kwargs)
+
+    def subplots_adjust(self, **kwargs):
+        self._context.figure.subplots_adjust(**kwargs)
+
+    def suptitle(self, *args, **kwargs):
+        return self._context.figure.suptitle(*args, **kwargs)
+
+    def colorbar(self, mappable=None, **kwargs):
+        if mappable is None:
+            mappable = self.gca().collections[-1] if self.gca().collections else self.gca().images[-1]
+        return self._context.figure.colorbar(mappable, ax=kwargs.pop("ax", self.gca()), **kwargs)
+
+    def title(self, label, **kwargs):
+        return self.gca().set_title(label, **kwargs)
+
+    def xlabel(self, label, **kwargs):
+        return self.gca().set_xlabel(label, **kwargs)
+
+    def ylabel(self, label, **kwargs):
+        return self.gca().set_ylabel(label, **kwargs)
+
+    def xlim(self, *args, **kwargs):
+        return self.gca().set_xlim(*args, **kwargs) if args or kwargs else self.gca().get_xlim()
+
+    def ylim(self, *args, **kwargs):
+        return self.gca().set_ylim(*args, **kwargs) if args or kwargs else self.gca().get_ylim()
+
+    def xticks(self, ticks=None, labels=None, **kwargs):
+        return self._ticks(self.gca().xaxis, ticks, labels, kwargs)
+
+    def yticks(self, ticks=None, labels=None, **kwargs):
+        return self._ticks(self.gca().yaxis, ticks, labels, kwargs)
+
+    @staticmethod
+    def _ticks(axis, ticks, labels, kwargs):
+        if ticks is not None:
+            axis.set_ticks(ticks, labels)
+        tick_labels = axis.get_ticklabels()
+        for label in tick_labels:
+            label.update(kwargs)
+        return axis.get_ticklocs(), tick_labels
+
+    def __getattr__(self, name):
+        # Plotting calls (bar, plot, hist, legend, grid, ...) go to the current axes
+        if hasattr(Axes, name) and not name.startswith("_"):
+            return _materializing(getattr(self.gca(), name))
+        if name in PYPLOT_PASSTHROUGH:
+            return getattr(plt, name)
+        raise AttributeError(f"plt.{name} is not available in generated code")
+
+
+class SeabornFacade:
+    """seaborn with axes-level plots drawn on a FigureContext's current axes"""
+
+    def __init__(self, context: FigureContext):
+        self._context = context
+
+    def __getattr__(self, name):
+        attr = getattr(sns, name)
+
+        if name in AXES_LEVEL_PLOTS:
+            def plot_on_context(*args, **kwargs):
+                kwargs.setdefault("ax", self._context.axes)
+                return attr(*materialize(args), **materialize(kwargs))
+            return plot_on_context
+
+        if name in FIGURE_LEVEL_PLOTS:
+            def plot_and_adopt(*args, **kwargs):
+                grid = attr(*materialize(args), **materialize(kwargs))
+                self._context.adopt(grid.figure)
+                return grid
+            return plot_and_adopt
+
+        return _materializing(attr) if callable(attr) and not isinstance(attr, type) else attr
@@ -0,0 +1,41 @@
+import hashlib
+import io
+import matplotlib.pyplot as plt
+
+IMAGE_FORMAT = "png"
+IMAGE_DPI = 100
+
+
+def render_figure(fig, fmt: str = IMAGE_FORMAT, dpi: int = IMAGE_DPI) -> bytes:
+    """Render a matplotlib figure to compressed image bytes and close it"""
+    buffer = io.BytesIO()
+    try:
+        fig.savefig(buffer, format=fmt, dpi=dpi, bbox_inches="tight")
+    finally:
+        plt.close(fig)
+    return buffer.getvalue()
+
+
+class FigureStore:
+    """Rendered chart images for a chat session, keyed by content hash"""
+
+    def __init__(self):
+        self._images = {}
+
+    def add_figure(self, fig) -> str:
+        """Render and close a figure, returning the key of its image"""
+        return self.add_image(render_figure(fig))
+
+    def add_image(self, data: bytes) -> str:
+        key = hashlib.sha256(data).hexdigest()
+        self._images.setdefault(key, data)
+        return key
+
+    def get(self, key: str):
+        return self._images.get(key)
+
+    def discard(self, key: str):
+        self._images.pop(key, None)
+
+    def clear(self):
+        self._images.clear()
@@ -0,0 +1,665 @@
+import functools
+import inspect
+import operator
+import threading
+import weakref
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:
+    pa = None
+
+PREVIEW_ROWS = 10
+
+# pandas groupby reductions with an Arrow hash-aggregate equivalent
+ARROW_AGGREGATES = {
+    "sum": "sum",
+    "mean": "mean",
+    "min": "min",
+    "max": "max",
+    "count": "count",
+    "nunique": "count_distinct",
+    "size": "count_all"
+}
+
+# groupby keyword arguments the Arrow path reproduces
+ARROW_GROUPBY_KWARGS = {"as_index", "sort", "dropna"}
+
+# pandas methods that modify their frame or Series even without inplace=True
+MUTATING_METHODS = {"insert", "pop", "update"}
+
+AMBIGUOUS_TRUTH_VALUE = "The truth value of a Series is ambiguous. Use a.empty, a.bool(), a.item(), a.any() or a.all()."
+
+
+class _Source:
+    """The full dataset behind a LazyFrame, plus an Arrow copy built on first use"""
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self._table = None
+        self._lock = threading.Lock()
+
+    @property
+    def table(self):
+        """Arrow table of the dataset, or None when pyarrow is missing or cannot convert it"""
+        if pa is None:
+            return None
+        with self._lock:
+            if self._table is None:
+                try:
+                    self._table = pa.Table.from_pandas(self.df, preserve_index=False)
+                except Exception as e:
+                    print(f"Arrow conversion failed, using pandas only: {str(e)}")
+                    self._table = False
+        return self._table or None
+
+
+_sources = {}
+_sources_lock = threading.Lock()
+
+
+def _source_for(df: pd.DataFrame) -> _Source:
+    """Share one _Source (and its Arrow copy) between every LazyFrame over the same DataFrame"""
+    key = id(df)
+    with _sources_lock:
+        entry = _sources.get(key)
+        if entry is not None and entry[0]() is df:
+            return entry[1]
+        source = _Source(df)
+        _sources[key] = (weakref.ref(df, lambda _: _sources.pop(key, None)), source)
+        return source
+
+
+class _Expr:
+    """
+    A row predicate recorded from comparisons on LazyColumns, e.g. df['a'] > 5.
+
+    Used as a filter it stays lazy; used like a Series it is evaluated.
+    """
+
+    COMPARISONS = {
+        "eq": operator.eq, "ne": operator.ne, "lt": operator.lt,
+        "le": operator.le, "gt": operator.gt, "ge": operator.ge
+    }
+
+    def __init__(self, frame, op, *args):
+        self._frame = frame
+        self._op = op
+        self._args = args
+
+    def columns(self) -> set:
+        if self._op == "col":
+            return {self._args[0]}
+        found = set()
+        for arg in self._args:
+            if isinstance(arg, _Expr):
+                found |= arg.columns()
+        return found
+
+    def evaluate(self, df: pd.DataFrame):
+        """Evaluate against the full DataFrame"""
+        op, args = self._op, self._args
+        if op == "col":
+            return df[args[0]]
+        values = [arg.evaluate(df) if isinstance(arg, _Expr) else arg for arg in args]
+        if op in self.COMPARISONS:
+            return self.COMPARISONS[op](values[0], values[1])
+        if op == "and":
+            return values[0] & values[1]
+        if op == "or":
+            return values[0] | values[1]
+        if op == "xor":
+            return values[0] ^ values[1]
+        if op == "not":
+            return ~values[0]
+        if op == "isin":
+            return values[0].isin(values[1])
+        if op == "isna":
+            return values[0].isna()
+        if op == "notna":
+            return values[0].notna()
+        if op == "between":
+            return values[0].between(values[1], values[2])
+        raise ValueError(f"Unknown expression {op}")
+
+    def _combine(self, op, other):
+        if isinstance(other, _Expr):
+            return _Expr(self._frame, op, self, other)
+        return getattr(self.collect(), f"__{op}__")(other)
+
+    def __and__(self, other):
+        return self._combine("and", other)
+
+    def __or__(self, other):
+        return self._combine("or", other)
+
+    def __xor__(self, other):
+        return self._combine("xor", other)
+
+    def __invert__(self):
+        return _Expr(self._frame, "not", self)
+
+    def collect(self) -> pd.Series:
+        """The boolean Series this predicate stands for"""
+        mask = self.evaluate(self._frame._source.df)
+        if self._frame._predicate is not None:
+            mask = mask[self._frame._mask()]
+        return mask
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.collect(), name)
+
+    def __bool__(self):
+        raise ValueError(AMBIGUOUS_TRUTH_VALUE)
+
+    def __len__(self):
+        return len(self.collect())
+
+    def __iter__(self):
+        return iter(self.collect())
+
+    def __array__(self, dtype=None, copy=None):
+        return np.asarray(self.collect(), dtype=dtype)
+
+    def __repr__(self):
+        return repr(self.collect())
+
+
+def materialize(value):
+    """
+    Lazy objects (also inside lists, tuples and dicts) as the pandas objects
+    they stand for, before they reach pandas or libraries that only accept
+    real DataFrames and Series
+    """
+    if isinstance(value, (LazyFrame, LazyColumn, _Expr)):
+        return value.collect()
+    if isinstance(value, (list, tuple)):
+        items = [materialize(item) for item in value]
+        return items if isinstance(value, list) else tuple(items)
+    if isinstance(value, dict):
+        return {key: materialize(item) for key, item in value.items()}
+    return value
+
+
+class PandasFacade:
+    """
+    pandas as the agent's python tool sees it: top-level functions (concat,
+    merge, crosstab, ...) get LazyFrame/LazyColumn arguments materialized.
+    Classes, modules and constants are pandas' own.
+    """
+
+    def __getattr__(self, name):
+        attr = getattr(pd, name)
+        if not inspect.isfunction(attr):
+            return attr
+
+        @functools.wraps(attr)
+        def call(*args, **kwargs):
+            return attr(*materialize(args), **materialize(kwargs))
+        return call
+
+
+class _Indexer:
+    """
+    .loc/.iloc/.at/.iat of a LazyFrame or LazyColumn. Lazy keys are evaluated
+    before pandas sees them; assignments go through the owner's copy on write.
+    """
+
+    def __init__(self, owner, kind):
+        self._owner = owner
+        self._kind = kind
+
+    def _key(self, key):
+        key = materialize(key)
+        if self._kind == "iloc":
+            # iloc takes boolean arrays, not boolean Series
+            parts = key if isinstance(key, tuple) else (key,)
+            parts = tuple(part.to_numpy() if isinstance(part, pd.Series) and part.dtype == bool else part for part in parts)
+            key = parts if isinstance(key, tuple) else parts[0]
+        return key
+
+    def __getitem__(self, key):
+        return getattr(self._owner.collect(), self._kind)[self._key(key)]
+
+    def __setitem__(self, key, value):
+        self._owner._write(lambda target: getattr(target, self._kind).__setitem__(self._key(key), materialize(value)))
+
+
+def _copy_on_write(owner, name, method):
+    """
+    Wrap a pandas method of the collected data: called with inplace=True (or
+    one that always mutates, like insert) it runs on a copy that the owner
+    then adopts, so the shared dataset is never modified.
+    """
+    def call(*args, **kwargs):
+        args = [materialize(arg) for arg in args]
+        kwargs = {key: materialize(value) for key, value in kwargs.items()}
+        if not kwargs.get("inplace") and name not in MUTATING_METHODS:
+            return method(*args, **kwargs)
+        result = []
+        owner._write(lambda target: result.append(getattr(target, name)(*args, **kwargs)))
+        return result[0]
+    functools.update_wrapper(call, method)
+    # Keep the pandas owner visible, as on the bound method (figure_context relies on it)
+    call.__self__ = method.__self__
+    return call
+
+
+class LazyColumn:
+    """A single column of a LazyFrame; comparisons build predicates, anything else evaluates it"""
+
+    def __init__(self, frame, name):
+        self._frame = frame
+        self._name = name
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def dtype(self):
+        return self._frame._source.df[self._name].dtype
+
+    def _expr(self):
+        return _Expr(self._frame, "col", self._name)
+
+    def _compare(self, op, other):
+        if isinstance(other, LazyColumn):
+            other = other._expr()
+        return _Expr(self._frame, op, self._expr(), other)
+
+    def __eq__(self, other):
+        return self._compare("eq", other)
+
+    def __ne__(self, other):
+        return self._compare("ne", other)
+
+    def __lt__(self, other):
+        return self._compare("lt", other)
+
+    def __le__(self, other):
+        return self._compare("le", other)
+
+    def __gt__(self, other):
+        return self._compare("gt", other)
+
+    def __ge__(self, other):
+        return self._compare("ge", other)
+
+    __hash__ = object.__hash__
+
+    def isin(self, values):
+        return _Expr(self._frame, "isin", self._expr(), list(values))
+
+    def isna(self):
+        return _Expr(self._frame, "isna", self._expr())
+
+    isnull = isna
+
+    def notna(self):
+        return _Expr(self._frame, "notna", self._expr())
+
+    notnull = notna
+
+    def between(self, left, right):
+        return _Expr(self._frame, "between", self._expr(), left, right)
+
+    def collect(self) -> pd.Series:
+        """Evaluate the column on the full data (only this column is read)"""
+        frame = self._frame
+        if frame._predicate is None:
+            return frame._source.df[self._name]
+        return frame._source.df.loc[frame._mask(), self._name]
+
+    def _write(self, change):
+        """Apply change to a copy of the column and assign it back to the frame"""
+        series = self.collect().copy()
+        change(series)
+        self._frame[self._name] = series
+
+    @property
+    def loc(self):
+        return _Indexer(self, "loc")
+
+    @property
+    def iloc(self):
+        return _Indexer(self, "iloc")
+
+    @property
+    def at(self):
+        return _Indexer(self, "at")
+
+    @property
+    def iat(self):
+        return _Indexer(self, "iat")
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        attr = getattr(self.collect(), name)
+        return _copy_on_write(self, name, attr) if inspect.ismethod(attr) else attr
+
+    def __getitem__(self, key):
+        return self.collect()[materialize(key)]
+
+    def __bool__(self):
+        raise ValueError(AMBIGUOUS_TRUTH_VALUE)
+
+    def __len__(self):
+        return len(self.collect())
+
+    def __iter__(self):
+        return iter(self.collect())
+
+    def __array__(self, dtype=None, copy=None):
+        return np.asarray(self.collect(), dtype=dtype)
+
+    def __repr__(self):
+        return repr(self.collect())
+
+
+def _materializing(op):
+    def method(self, *args):
+        args = [arg.collect() if isinstance(arg, (LazyColumn, _Expr)) else arg for arg in args]
+        return getattr(self.collect(), op)(*args)
+    method.__name__ = op
+    return method
+
+
+for _op in (
+    "__add__", "__radd__", "__sub__", "__rsub__", "__mul__", "__rmul__", "__truediv__",
+    "__rtruediv__", "__floordiv__", "__rfloordiv__", "__mod__", "__rmod__", "__pow__",
+    "__rpow__", "__neg__", "__abs__", "__invert__", "__and__", "__or__"
+):
+    setattr(LazyColumn, _op, _materializing(_op))
+
+
+class LazyGroupBy:
+    """A recorded groupby; reductions run on the full data with only the needed columns"""
+
+    def __init__(self, frame, keys, selection=None, kwargs=None):
+        self._frame = frame
+        self._keys = keys
+        self._selection = selection
+        self._kwargs = kwargs or {}
+
+    def __getitem__(self, selection):
+        return LazyGroupBy(self._frame, self._keys, selection, self._kwargs)
+
+    def __iter__(self):
+        return iter(self._pandas())
+
+    def __len__(self):
+        return len(self._pandas())
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        if name in ARROW_AGGREGATES or name in {"median", "std", "var", "first", "last"}:
+            return lambda *args, **kwargs: self._aggregate(name, args, kwargs)
+        return getattr(self._pandas(), name)
+
+    def _key_list(self):
+        return self._keys if isinstance(self._keys, list) else [self._keys]
+
+    def _value_columns(self):
+        if self._selection is None:
+            keys = set(self._key_list())
+            return [column for column in self._frame.columns if column not in keys]
+        return self._selection if isinstance(self._selection, list) else [self._selection]
+
+    def _pandas(self):
+        """The equivalent pandas groupby over just the key and selected columns"""
+        columns = list(dict.fromkeys(self._key_list() + self._value_columns()))
+        grouped = self._frame[columns].collect().groupby(self._keys, **self._kwargs)
+        return grouped if self._selection is None else grouped[self._selection]
+
+    def _arrow_eligible(self, funcs):
+        table = self._frame._source.table
+        if table is None or self._selection is None or set(self._kwargs) - ARROW_GROUPBY_KWARGS:
+            return False
+        df = self._frame._source.df
+        if any(isinstance(df[key].dtype, pd.CategoricalDtype) for key in self._key_list()):
+            return False
+        for column, func in funcs:
+            if func not in ARROW_AGGREGATES:
+                return False
+            if func == "size":
+                continue
+            dtype = df[column].dtype
+            if not pd.api.types.is_numeric_dtype(dtype) or pd.api.types.is_bool_dtype(dtype):
+                return False
+        return True
+
+    def _arrow_groupby(self, funcs):
+        """Run [(column, func), ...] as one Arrow hash aggregation, indexed like pandas"""
+        keys = self._key_list()
+        values = [column for column, func in funcs if func != "size"]
+        table = self._frame._source.table.select(list(dict.fromkeys(keys + values)))
+        if self._frame._predicate is not None:
+            table = table.filter(pa.array(self._frame._mask().to_numpy(dtype=bool)))
+
+        aggregations, names = [], []
+        for column, func in funcs:
+            if func == "size":
+                aggregations.append(([], "count_all"))
+                names.append(("count_all", "size"))
+            elif func == "sum":
+                aggregations.append((column, "sum", pc.ScalarAggregateOptions(min_count=0)))
+                names.append((f"{column}_sum", column))
+            else:
+                aggregations.append((column, ARROW_AGGREGATES[func]))
+                names.append((f"{column}_{ARROW_AGGREGATES[func]}", column))
+
+        result = table.group_by(keys).aggregate(aggregations).to_pandas()
+        if self._kwargs.get("dropna", True):
+            result = result.dropna(subset=keys)
+        result = result.set_index(keys)[[arrow_name for arrow_name, _ in names]]
+        result.columns = [name for _, name in names]
+        if self._kwargs.get("sort", True):
+            result = result.sort_index()
+        return result
+
+    def _shape(self, result, series_name=None):
+        if isinstance(result, pd.Series):
+            result.name = series_name
+        if not self._kwargs.get("as_index", True):
+            result = result.reset_index()
+        return result
+
+    def _aggregate(self, func, args=(), kwargs=None):
+        if func == "size":
+            funcs = [(None, "size")]
+        else:
+            funcs = [(column, func) for column in self._value_columns()]
+
+        if args or kwargs or not self._arrow_eligible(funcs):
+            return getattr(self._pandas(), func)(*args, **(kwargs or {}))
+
+        result = self._arrow_groupby(funcs)
+        if func == "size":
+            # pandas names the counts after a single selected column, or "size" as a column
+            name = self._selection if self._selection is not None and not isinstance(self._selection, list) else None
+            if not self._kwargs.get("as_index", True):
+                name = "size"
+            return self._shape(result["size"], name)
+        if not isinstance(self._selection, list):
+            return self._shape(result[self._selection], self._selection)
+        return self._shape(result)
+
+    def agg(self, spec=None, *args, **kwargs):
+        if isinstance(spec, str) and not args and not kwargs:
+            return self._aggregate(spec)
+        if isinstance(spec, dict) and not args and not kwargs and all(isinstance(f, str) for f in spec.values()):
+            funcs = list(spec.items())
+            grouped = self if self._selection is not None else self[list(spec)]
+            if grouped._arrow_eligible(funcs):
+                return grouped._shape(grouped._arrow_groupby(funcs))
+        return self._pandas().agg(spec, *args, **kwargs)
+
+    aggregate = agg
+
+    def __repr__(self):
+        return f"<LazyGroupBy by={self._keys!r} selection={self._selection!r}>"
+
+
+class LazyFrame:
+    """
+    Stand-in for the full DataFrame, exposed as `df` to the agent's python tool.
+
+    Column selections, row filters built from column comparisons and groupby
+    reductions are recorded and evaluated on the full data only when a result
+    is needed, reading only the columns involved. Grouped numeric reductions
+    run as multi-threaded Arrow hash aggregations when pyarrow is available.
+    Any other attribute materializes the (pruned, filtered) frame and defers
+    to pandas. Writes (item and .loc/.iloc assignment, inplace=True calls)
+    copy the frame first, so the shared dataset is never modified.
+    """
+
+    def __init__(self, df: pd.DataFrame, _source=None, _columns=None, _predicate=None):
+        self._source = _source or _source_for(df)
+        self._columns = _columns
+        self._predicate = _predicate
+
+    def _derive(self, columns=None, predicate=None):
+        if predicate is not None and self._predicate is not None:
+            predicate = _Expr(self, "and", self._predicate, predicate)
+        return LazyFrame(
+            None,
+            _source=self._source,
+            _columns=columns if columns is not None else self._columns,
+            _predicate=predicate if predicate is not None else self._predicate
+        )
+
+    def _mask(self) -> pd.Series:
+        return self._predicate.evaluate(self._source.df)
+
+    @property
+    def columns(self) -> pd.Index:
+        df = self._source.df
+        return df.columns if self._columns is None else pd.Index(self._columns)
+
+    @property
+    def dtypes(self) -> pd.Series:
+        return self._source.df.dtypes[self.columns]
+
+    @property
+    def shape(self):
+        return len(self), len(self.columns)
+
+    @property
+    def size(self):
+        rows, columns = self.shape
+        return rows * columns
+
+    @property
+    def ndim(self):
+        return 2
+
+    @property
+    def empty(self):
+        return len(self) == 0 or len(self.columns) == 0
+
+    def __len__(self):
+        if self._predicate is None:
+            return len(self._source.df)
+        return int(self._mask().sum())
+
+    def __iter__(self):
+        return iter(self.columns)
+
+    def __contains__(self, column):
+        return column in self.columns
+
+    def __getitem__(self, key):
+        if isinstance(key, _Expr):
+            return self._derive(predicate=key)
+        if isinstance(key, list) and all(column in self._source.df.columns for column in key):
+            return self._derive(columns=key)
+        if isinstance(key, str) and key in self.columns:
+            return LazyColumn(self, key)
+        return self.collect()[key]
+
+    def _write(self, change):
+        """Copy on write: apply change to a copy of the frame, which replaces the shared dataset for this frame"""
+        frame = self.collect().copy()
+        change(frame)
+        self._source = _Source(frame)
+        self._columns = None
+        self._predicate = None
+
+    def __setitem__(self, key, value):
+        value = materialize(value)
+        self._write(lambda frame: frame.__setitem__(key, value))
+
+    def __delitem__(self, key):
+        self._write(lambda frame: frame.__delitem__(key))
+
+    @property
+    def loc(self):
+        return _Indexer(self, "loc")
+
+    @property
+    def iloc(self):
+        return _Indexer(self, "iloc")
+
+    @property
+    def at(self):
+        return _Indexer(self, "at")
+
+    @property
+    def iat(self):
+        return _Indexer(self, "iat")
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        # DataFrame members win over columns of the same name, as in pandas
+        if name in self.columns and not hasattr(pd.DataFrame, name):
+            return LazyColumn(self, name)
+        attr = getattr(self.collect(), name)
+        return _copy_on_write(self, name, attr) if inspect.ismethod(attr) else attr
+
+    def __array__(self, dtype=None, copy=None):
+        return np.asarray(self.collect(), dtype=dtype)
+
+    def __dataframe__(self, nan_as_null: bool = False, allow_copy: bool = True):
+        # DataFrame interchange protocol, for libraries that accept any dataframe
+        return self.collect().__dataframe__(nan_as_null=nan_as_null, allow_copy=allow_copy)
+
+    def head(self, n: int = 5) -> pd.DataFrame:
+        if self._predicate is None:
+            return self._source.df[self.columns].head(n)
+        return self.collect().head(n)
+
+    def tail(self, n: int = 5) -> pd.DataFrame:
+        if self._predicate is None:
+            return self._source.df[self.columns].tail(n)
+        return self.collect().tail(n)
+
+    def groupby(self, by, **kwargs):
+        keys = by if isinstance(by, list) else [by]
+        if all(isinstance(key, str) and key in self._source.df.columns for key in keys):
+            return LazyGroupBy(self, by, kwargs=kwargs)
+        return self.collect().groupby(by, **kwargs)
+
+    def collect(self) -> pd.DataFrame:
+        """Materialize the frame: only the selected columns, only the matching rows"""
+        df = self._source.df
+        if self._predicate is None:
+            return df if self._columns is None else df[self._columns]
+        return df.loc[self._mask(), self.columns]
+
+    to_pandas = collect
+
+    def __repr__(self):
+        preview = self.head(PREVIEW_ROWS)
+        rows, columns = self.shape
+        return f"{preview!r}\n\n[{rows} rows x {columns} columns; preview of the full dataset]"
+
+    __str__ = __repr__
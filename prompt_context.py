@@ -0,0 +1,230 @@
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+import pandas as pd
+
+PROMPT_CONTEXT_TOKENS = int(os.getenv("PROMPT_CONTEXT_TOKENS", "2000"))
+SAMPLE_ROWS = 5
+SAMPLE_SHARE = 0.2  # Part of the budget held back for sample rows
+CACHE_SIZE = 16
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "by", "data", "do", "does", "for", "from", "how",
+    "in", "is", "it", "me", "of", "on", "or", "show", "the", "to", "what", "which",
+    "who", "with"
+}
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens with tiktoken when it is installed, else estimate ~4 characters per token"""
+    global _encoding
+    if _encoding is None:
+        with _encoding_lock:
+            if _encoding is None:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding("o200k_base")
+                except Exception:
+                    _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text))
+    return len(text) // 4 + 1
+
+
+def dataset_fingerprint(df: pd.DataFrame) -> str:
+    """
+    Identity of a dataset's contents: schema plus a hash of every row. Keys the
+    prompt section cache and the agent's tool result cache, so two files that
+    differ anywhere never share cached answers. Vectorized, one pass per column.
+    """
+    digest = hashlib.sha256()
+    digest.update(repr((list(df.columns), [str(t) for t in df.dtypes], df.shape)).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(df.index).values.tobytes())
+    for _, column in df.items():
+        try:
+            hashed = pd.util.hash_pandas_object(column, index=False)
+        except TypeError:
+            # Unhashable cell values (lists, dicts)
+            hashed = pd.util.hash_pandas_object(column.map(repr), index=False)
+        digest.update(hashed.values.tobytes())
+    return digest.hexdigest()
+
+
+def _words(text: str) -> set:
+    # Split snake_case, camelCase and punctuation into lowercase words
+    text = re.sub(r"([a-z])([A-Z])", r"\1 \2", str(text))
+    return {word for word in re.findall(r"[a-z0-9]+", text.lower()) if word not in STOPWORDS}
+
+
+@dataclass
+class PromptContext:
+    """Rendered dataset context for one question"""
+    text: str
+    token_count: int
+    columns: List[str] = field(default_factory=list)
+    total_columns: int = 0
+    fingerprint: str = ""
+
+
+class _DatasetSections:
+    """Per-dataset pieces of the context, rendered once and shared between questions"""
+
+    def __init__(self, df: pd.DataFrame, column_descriptions: Dict[str, str]):
+        self.columns = list(df.columns)
+        self.overview = (
+            "Dataset Overview:\n"
+            f"- Total rows: {len(df)}\n"
+            f"- Total columns: {len(df.columns)}"
+        )
+        self.column_names = ", ".join(str(column) for column in self.columns)
+
+        stats = df.describe(include="all")
+        self.sections = {}
+        self.words = {}
+        for column in self.columns:
+            description = column_descriptions.get(column, "")
+            section = f"- {column} ({df[column].dtype}): {description}"
+            summary = self._summarize(stats[column]) if column in stats.columns else ""
+            if summary:
+                section += f" [{summary}]"
+            self.sections[column] = (section, count_tokens(section))
+            self.words[column] = (_words(column), _words(description))
+
+        self.sample = df.head(SAMPLE_ROWS)
+
+    @staticmethod
+    def _summarize(stats: pd.Series) -> str:
+        parts = []
+        for name, value in stats.dropna().items():
+            if isinstance(value, float):
+                value = f"{value:.4g}"
+            parts.append(f"{name}={value}")
+        return ", ".join(parts)
+
+
+_sections_cache = OrderedDict()
+_sections_lock = threading.Lock()
+
+
+def _get_sections(fingerprint: str, df: pd.DataFrame, column_descriptions: Dict[str, str]) -> _DatasetSections:
+    key = hashlib.sha256(
+        (fingerprint + repr(sorted(column_descriptions.items(), key=str))).encode("utf-8")
+    ).hexdigest()
+    with _sections_lock:
+        sections = _sections_cache.get(key)
+        if sections is not None:
+            _sections_cache.move_to_end(key)
+            return sections
+
+    sections = _DatasetSections(df, column_descriptions)
+    with _sections_lock:
+        _sections_cache[key] = sections
+        while len(_sections_cache) > CACHE_SIZE:
+            _sections_cache.popitem(last=False)
+    return sections
+
+
+class PromptContextBuilder:
+    """
+    Builds the dataset context for the agent prompt within a token budget.
+
+    Columns are ranked by relevance to the question (name and description word
+    overlap) and added until the budget is spent; sample rows are limited to
+    the chosen columns. Rendered pieces are cached per dataset.
+    """
+
+    def __init__(self, df: pd.DataFrame, column_descriptions: Dict[str, str], token_budget: int = PROMPT_CONTEXT_TOKENS):
+        self.token_budget = token_budget
+        self.fingerprint = dataset_fingerprint(df)
+        self._sections = _get_sections(self.fingerprint, df, column_descriptions or {})
+        self._rendered = OrderedDict()
+
+    def rank_columns(self, question: Optional[str] = None) -> List[str]:
+        """Columns ordered by relevance to the question (dataset order when there is none)"""
+        columns = self._sections.columns
+        if not question:
+            return list(columns)
+
+        question_lower = question.lower()
+        question_words = _words(question)
+
+        def score(column):
+            name_words, description_words = self._sections.words[column]
+            value = 3 * len(name_words & question_words) + len(description_words & question_words)
+            if str(column).lower() in question_lower:
+                value += 10
+            return value
+
+        scores = {column: score(column) for column in columns}
+        return sorted(columns, key=lambda column: -scores[column])
+
+    def build(self, question: Optional[str] = None) -> PromptContext:
+        """Render the context for a question within the token budget"""
+        sections = self._sections
+        header = sections.overview
+        names_line = f"- All columns: {sections.column_names}"
+        used = count_tokens(header)
+
+        # The full column list is cheap insurance, unless it alone eats a quarter of the budget
+        names_tokens = count_tokens(names_line)
+        if names_tokens <= self.token_budget // 4:
+            header += "\n" + names_line
+            used += names_tokens
+
+        selected = []
+        column_budget = int(self.token_budget * (1 - SAMPLE_SHARE))
+        for column in self.rank_columns(question):
+            section, tokens = sections.sections[column]
+            if used + tokens > column_budget:
+                continue
+            selected.append(column)
+            used += tokens
+
+        key = (tuple(selected), "All columns" in header)
+
+        cached = self._rendered.get(key)
+        if cached is None:
+            cached = self._render(header, selected, used)
+            self._rendered[key] = cached
+            while len(self._rendered) > CACHE_SIZE:
+                self._rendered.popitem(last=False)
+        else:
+            self._rendered.move_to_end(key)
+
+        text, token_count = cached
+        return PromptContext(
+            text=text,
+            token_count=token_count,
+            columns=selected,
+            total_columns=len(sections.columns),
+            fingerprint=self.fingerprint
+        )
+
+    def _render(self, header, selected, used):
+        sections = self._sections
+        parts = [header]
+        if selected:
+            parts.append(
+                f"Column Descriptions ({len(selected)} of {len(sections.columns)} columns shown):\n"
+                + "\n".join(sections.sections[column][0] for column in selected)
+            )
+            used += count_tokens(parts[-1]) - sum(sections.sections[column][1] for column in selected)
+
+            # Sample rows for the chosen columns, dropping rows until they fit
+            for rows in range(len(sections.sample), 0, -1):
+                sample = f"Sample Data (first {rows} rows):\n{sections.sample[selected].head(rows).to_string()}"
+                tokens = count_tokens(sample)
+                if used + tokens <= self.token_budget:
+                    parts.append(sample)
+                    used += tokens
+                    break
+
+        text = "\n\n".join(parts)
+        return text, count_tokens(text)
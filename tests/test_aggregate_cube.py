@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pandas.testing as tm
+import pytest
+from pandasql import sqldf
+
+from services.aggregate_cube import AggregateCube
+
+
+def make_df():
+    rng = np.random.default_rng(1)
+    region = rng.choice(["east", "west", "north", "South"], 500).astype(object)
+    region[::37] = np.nan
+    sales = rng.integers(0, 1000, 500).astype(float)
+    sales[::11] = np.nan
+    return pd.DataFrame({"region": region, "sales": sales, "units": rng.integers(1, 10, 500)})
+
+
+@pytest.fixture(scope="module")
+def data():
+    df = make_df()
+    return df, AggregateCube.build_from_chunks([df.iloc[start:start + 75] for start in range(0, len(df), 75)], max_groups=50)
+
+
+@pytest.mark.parametrize("query", [
+    "SELECT region, SUM(sales) FROM df GROUP BY region",
+    "SELECT region, AVG(sales) AS avg_sales FROM df GROUP BY region ORDER BY avg_sales DESC",
+    "SELECT region, COUNT(*) AS n, COUNT(sales) FROM df GROUP BY region ORDER BY n DESC, region LIMIT 3",
+    "SELECT region, MIN(sales), MAX(units) FROM df GROUP BY 1 ORDER BY 1 DESC LIMIT 2 OFFSET 1",
+    "SELECT COUNT(*), region FROM df GROUP BY region ORDER BY region",
+    "SELECT Region, SUM(Units) AS total FROM df GROUP BY Region ORDER BY total LIMIT 2;",
+])
+def test_answers_match_sqlite(data, query):
+    df, cube = data
+    result = cube.answer(query)
+    assert result is not None
+    expected = sqldf(query, {"df": df})
+    tm.assert_frame_equal(result, expected, check_dtype=False, check_exact=False)
+
+
+@pytest.mark.parametrize("query", [
+    "SELECT region, SUM(sales) FROM df WHERE units > 5 GROUP BY region",
+    "SELECT region, units FROM df GROUP BY region",
+    "SELECT units, SUM(sales) FROM df GROUP BY units",
+    "SELECT region, SUM(sales) FROM other GROUP BY region",
+    "SELECT region, SUM(sales) FROM df GROUP BY region HAVING SUM(sales) > 10",
+])
+def test_unsupported_queries_are_left_to_sqlite(data, query):
+    _, cube = data
+    assert cube.answer(query) is None
+
+
+def test_chunked_build_matches_a_single_pass(data):
+    df, cube = data
+    whole = AggregateCube.build(df, max_groups=50)
+    query = "SELECT region, SUM(sales), MIN(units), COUNT(*) FROM df GROUP BY region"
+    tm.assert_frame_equal(cube.answer(query), whole.answer(query))
+
+
+def test_high_cardinality_columns_are_not_cubed():
+    df = pd.DataFrame({"id": [f"id{i}" for i in range(100)], "value": range(100)})
+    cube = AggregateCube.build(df, max_groups=10)
+    assert "id" not in cube.groups
+    assert cube.answer("SELECT id, SUM(value) FROM df GROUP BY id") is None
@@ -0,0 +1,105 @@
+import asyncio
+import hashlib
+import io
+import os
+
+import pytest
+from fastapi import BackgroundTasks, HTTPException, UploadFile
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import models.csv_model  # noqa: F401 (registers the tables)
+import models.query_model  # noqa: F401
+from core.config import settings
+from crud.csv_crud import CSVBlobCRUD, CSVSessionCRUD
+from db.base import Base
+from models.csv_model import CSVBlob, CSVFile
+from services.blob_store import stage_upload, store_upload
+
+CSV = b"region,sales\neast,1\nwest,2\n"
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'blobs.db'}")
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)()
+
+
+def stage(uploads_dir, contents=CSV):
+    return asyncio.run(stage_upload(UploadFile(io.BytesIO(contents), filename="data.csv"), str(uploads_dir)))
+
+
+def test_identical_contents_share_one_blob(db, tmp_path):
+    staged_path, content_hash, size = stage(tmp_path)
+    assert content_hash == hashlib.sha256(CSV).hexdigest() and size == len(CSV)
+    first, created = store_upload(db, staged_path, content_hash, size, str(tmp_path))
+    assert created and first.ref_count == 1
+
+    staged_path, content_hash, size = stage(tmp_path)
+    second, created = store_upload(db, staged_path, content_hash, size, str(tmp_path))
+    assert not created
+    assert second.file_path == first.file_path
+    assert not os.path.exists(staged_path)
+    db.refresh(second)
+    assert second.ref_count == 2
+
+
+def test_last_reference_release_deletes_the_blob(db, tmp_path):
+    for _ in range(2):
+        blob, _ = store_upload(db, *stage(tmp_path), str(tmp_path))
+    content_hash, file_path = blob.content_hash, blob.file_path
+
+    assert CSVBlobCRUD.remove_reference(db, content_hash) == []
+    assert db.query(CSVBlob).filter(CSVBlob.content_hash == content_hash).one().ref_count == 1
+    assert file_path in CSVBlobCRUD.remove_reference(db, content_hash)
+    assert db.query(CSVBlob).filter(CSVBlob.content_hash == content_hash).first() is None
+
+
+def test_failed_file_record_releases_its_reference(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "uploads_dir", str(tmp_path))
+    import api.csv_routes as csv_routes
+
+    monkeypatch.setattr(csv_routes, "UPLOADS_DIR", str(tmp_path))
+    removed = []
+    monkeypatch.setattr(csv_routes.cleanup_worker, "enqueue", removed.extend)
+    CSVSessionCRUD.create_session(db, "s1")
+
+    def upload():
+        file = UploadFile(io.BytesIO(CSV), filename="data.csv")
+        return asyncio.run(csv_routes._store_csv_upload(BackgroundTasks(), file, "s1", db))
+
+    def fail(**kwargs):
+        raise RuntimeError("disk full")
+
+    upload()  # an earlier upload keeps the contents referenced
+    with monkeypatch.context() as patch:
+        patch.setattr(csv_routes.CSVFileCRUD, "create_csv_file", fail)
+        with pytest.raises(HTTPException):
+            upload()
+    blob = db.query(CSVBlob).one()
+    file_path = blob.file_path
+    assert blob.ref_count == 1
+    assert removed == []
+    assert db.query(CSVFile).count() == 1
+
+    # Without other references the failed upload's contents are removed
+    CSVBlobCRUD.remove_reference(db, blob.content_hash)
+    db.query(CSVFile).delete()
+    db.commit()
+    monkeypatch.setattr(csv_routes.CSVFileCRUD, "create_csv_file", fail)
+    with pytest.raises(HTTPException):
+        upload()
+    assert db.query(CSVBlob).count() == 0
+    assert len(removed) == 3 and removed[0] != file_path
+
+    # A failure while recording the contents leaves neither a staging nor a stored file
+    removed.clear()
+    monkeypatch.setattr(csv_routes.CSVBlobCRUD, "create_blob", fail)
+    for path in os.listdir(tmp_path):
+        if path.endswith(".csv"):
+            os.remove(tmp_path / path)
+    with pytest.raises(HTTPException):
+        upload()
+    assert [path for path in os.listdir(tmp_path) if path != "blobs.db"] == []
+    assert db.query(CSVBlob).count() == 0 and removed == []
@@ -0,0 +1,93 @@
+import os
+import threading
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key")  # the chat service builds its client on import
+
+import models.csv_model  # noqa: F401 (registers the tables)
+import models.query_model  # noqa: F401
+import api.chat_routes as chat_routes
+import services.chat_service as chat_service_module
+from core.config import settings
+from crud.csv_crud import CSVFileCRUD, CSVSessionCRUD
+from db.base import Base
+from db.session import get_db
+
+CSV = "region,sales\neast,1\nwest,2\n"
+
+
+class TrackedSession(Session):
+    closed = []
+
+    def close(self):
+        TrackedSession.closed.append(self)
+        super().close()
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'batch.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine)
+    db = factory()
+    CSVSessionCRUD.create_session(db, "s1")
+    file_path = tmp_path / "data.csv"
+    file_path.write_text(CSV)
+    CSVFileCRUD.create_csv_file(db, "s1", "data.csv", "data.csv", len(CSV), "text/csv", str(file_path))
+
+    # Workers open their sessions on the same database
+    TrackedSession.closed = []
+    monkeypatch.setattr(chat_service_module, "SessionLocal", sessionmaker(bind=engine, class_=TrackedSession))
+    monkeypatch.setattr(settings, "batch_max_workers", 4)
+    monkeypatch.setattr(settings, "aggregate_cube_enabled", False)
+
+    app = FastAPI()
+    app.include_router(chat_routes.router, prefix="/api")
+    app.dependency_overrides[get_db] = lambda: db
+    yield TestClient(app)
+    db.close()
+
+
+def test_batch_results_keep_message_order_and_isolate_failures(client, monkeypatch):
+    service = chat_routes.chat_service
+    messages = ["slow", "fail", "medium", "fast"]
+    delays = {"slow": 0.2, "medium": 0.1, "fast": 0.0}
+    used = []
+    lock = threading.Lock()
+
+    def respond(db, csv_file, df, source, cube, request_type, user_message, data_summary=None):
+        with lock:
+            used.append(db)
+        assert len(df) == 2 and "region" in data_summary
+        if user_message == "fail":
+            raise RuntimeError("model unavailable")
+        time.sleep(delays[user_message])  # later messages finish first
+        return {"request_type": request_type, "message": user_message, "data": {}}
+
+    monkeypatch.setattr(service, "classify_requests", lambda user_messages: ["insight"] * len(user_messages))
+    monkeypatch.setattr(service, "_respond", respond)
+
+    response = client.post("/api/chat/batch", json={"session_id": "s1", "user_messages": messages})
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [result["message"] for result in results] == ["slow", "An error occurred while processing your request", "medium", "fast"]
+    assert results[1]["error"] == "model unavailable"
+    assert all(result["error"] is None for index, result in enumerate(results) if index != 1)
+
+    # Every worker had a session of its own, and each was closed
+    assert len(used) == 4 and len(set(map(id, used))) == 4
+    assert all(isinstance(db, TrackedSession) for db in used)
+    assert sorted(map(id, TrackedSession.closed)) == sorted(map(id, used))
+
+
+def test_batch_limits_and_missing_session(client, monkeypatch):
+    assert client.post("/api/chat/batch", json={"session_id": "s1", "user_messages": []}).status_code == 400
+    monkeypatch.setattr(settings, "batch_max_messages", 2)
+    assert client.post("/api/chat/batch", json={"session_id": "s1", "user_messages": ["a"] * 3}).status_code == 400
+    assert client.post("/api/chat/batch", json={"session_id": "missing", "user_messages": ["a"]}).status_code == 404
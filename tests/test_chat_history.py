@@ -0,0 +1,86 @@
+import os
+
+import pytest
+
+import chat_history
+from chat_history import ChatHistory
+from figure_store import FigureStore
+
+
+@pytest.fixture(autouse=True)
+def history_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(chat_history, "HISTORY_DIR", str(tmp_path))
+    return tmp_path
+
+
+def message(index, **fields):
+    return {"role": "user", "content": f"message {index}", **fields}
+
+
+def contents(messages):
+    return [m["content"] for m in messages]
+
+
+def test_messages_within_the_window_stay_in_memory(history_dir):
+    history = ChatHistory(FigureStore(), window=3, page_size=2)
+    for index in range(3):
+        history.append(message(index))
+    assert len(history) == 3 and not history.has_earlier
+    assert os.listdir(history_dir) == []
+
+    history.append(message(3))
+    assert contents(history.visible()) == ["message 1", "message 2", "message 3"]
+    assert len(history) == 4 and history.has_earlier
+    assert len(os.listdir(history_dir)) == 1
+
+
+def test_earlier_pages_come_back_in_order():
+    history = ChatHistory(FigureStore(), window=2, page_size=2)
+    for index in range(7):
+        history.append(message(index))
+
+    history.load_earlier()
+    assert contents(history.visible()) == [f"message {i}" for i in range(3, 7)]
+    history.load_earlier()
+    history.load_earlier()
+    assert contents(history.visible()) == [f"message {i}" for i in range(7)]
+    assert not history.has_earlier
+
+    # A new message collapses the view back to the window
+    history.append(message(7))
+    assert contents(history.visible()) == ["message 6", "message 7"]
+    assert history.has_earlier
+
+
+def test_spilled_images_are_served_from_the_spill_store():
+    store = FigureStore()
+    history = ChatHistory(store, window=1)
+    spilled = store.add_image(b"spilled chart")
+    shared = store.add_image(b"shared chart")
+    history.append(message(0, graph_images=[spilled, shared]))
+    history.append(message(1, graph_images=[shared]))
+
+    # Only the image still referenced by the window is kept in memory
+    assert store.get(spilled) is None and store.get(shared) == b"shared chart"
+    assert history.get_image(spilled) == b"spilled chart"
+    assert history.get_image(shared) == b"shared chart"
+    assert history.get_image("missing") is None
+
+
+def test_clear_drops_messages_images_and_the_spill_file(history_dir):
+    store = FigureStore()
+    history = ChatHistory(store, window=1)
+    key = store.add_image(b"chart")
+    history.append(message(0, graph_images=[key]))
+    history.append(message(1))
+    assert len(os.listdir(history_dir)) == 1
+
+    history.clear()
+    assert len(history) == 0 and history.visible() == [] and not history.has_earlier
+    assert history.get_image(key) is None
+    assert os.listdir(history_dir) == []
+
+    history.append(message(2))
+    history.append(message(3))
+    history.load_earlier()
+    assert contents(history.visible()) == ["message 2", "message 3"]
@@ -0,0 +1,15 @@
+import pytest
+
+from code_validator import CodeValidationError, compile_generated_code
+
+
+def test_list_remove_passes_validation():
+    namespace = {}
+    exec(compile_generated_code("cols = ['id', 'a']\ncols.remove('id')\nseen = {1, 2}\nseen.remove(1)"), namespace)
+    assert namespace["cols"] == ["a"] and namespace["seen"] == {2}
+
+
+@pytest.mark.parametrize("code", ["os.remove('x')", "os.kill(1, 9)", "subprocess.os.spawn('x')", "os.system('ls')"])
+def test_os_calls_are_rejected(code):
+    with pytest.raises(CodeValidationError):
+        compile_generated_code(code)
@@ -0,0 +1,47 @@
+import io
+
+import pandas as pd
+import pandas.testing as tm
+
+CSV = b"name,day,score\nann,2024-01-02,1.5\n,2024-01-03,NA\nbob,2024-01-04,3\n"
+
+
+def test_both_entry_points_match_pandas(tmp_path):
+    from csv_loader import load_csv
+    from services.csv_reader import read_csv_parallel
+
+    path = tmp_path / "data.csv"
+    path.write_bytes(CSV)
+    expected = pd.read_csv(io.BytesIO(CSV))
+
+    tm.assert_frame_equal(load_csv(io.BytesIO(CSV)), expected)
+    tm.assert_frame_equal(read_csv_parallel(str(path)), expected)
+    assert load_csv(io.BytesIO(CSV))["day"].dtype == object
+
+
+def test_chunks_match_the_whole_file(tmp_path):
+    from services.csv_parser import read_csv_chunks
+
+    path = tmp_path / "data.csv"
+    path.write_bytes(CSV)
+    expected = pd.read_csv(io.BytesIO(CSV))
+
+    chunks = list(read_csv_chunks(str(path), chunk_rows=2))
+    assert [len(chunk) for chunk in chunks] == [2, 1]
+    tm.assert_frame_equal(pd.concat(chunks), expected)
+    tm.assert_frame_equal(pd.concat(read_csv_chunks(str(path), chunk_rows=2, usecols=["score", "name"])), expected[["name", "score"]])
+
+
+def test_chunks_fall_back_to_pandas_when_a_later_block_changes_type(tmp_path):
+    from services.csv_parser import read_csv_chunks
+
+    # Past pyarrow's first 1 MB block, the numeric column turns to text
+    rows = ["id,value"] + [f"{i},{i}" for i in range(150_000)] + ["150000,n/a", "150001,text"]
+    path = tmp_path / "data.csv"
+    path.write_text("\n".join(rows) + "\n")
+    expected = pd.concat(pd.read_csv(path, chunksize=40_000))
+
+    result = pd.concat(read_csv_chunks(str(path), chunk_rows=40_000))
+    tm.assert_frame_equal(result, expected)
+    assert result["value"].iloc[-1] == "text"
+    assert pd.isna(result["value"].iloc[-2])
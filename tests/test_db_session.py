@@ -0,0 +1,48 @@
+import asyncio
+
+import pytest
+from sqlalchemy import text
+
+pytest.importorskip("aiosqlite")
+
+import db.session as db_session
+from core.config import settings
+
+
+def test_async_engine_shares_the_pool_and_pragmas(tmp_path):
+    engine = db_session.build_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'async.db'}")
+
+    async def pragmas():
+        async with engine.connect() as conn:
+            journal_mode = (await conn.execute(text("PRAGMA journal_mode"))).scalar()
+            busy_timeout = (await conn.execute(text("PRAGMA busy_timeout"))).scalar()
+        await engine.dispose()
+        return journal_mode, busy_timeout
+
+    assert asyncio.run(pragmas()) == (settings.sqlite_journal_mode.lower(), settings.sqlite_busy_timeout_ms)
+    assert engine.pool.size() == settings.db_pool_size
+
+
+def test_async_url_defaults_to_the_async_driver(monkeypatch):
+    monkeypatch.setattr(settings, "database_async_url", None)
+    monkeypatch.setattr(db_session, "DATABASE_URL", "sqlite:///./app.db")
+    assert db_session.async_database_url() == "sqlite+aiosqlite:///./app.db"
+    monkeypatch.setattr(db_session, "DATABASE_URL", "postgresql://u:p@host/db")
+    assert db_session.async_database_url() == "postgresql+asyncpg://u:p@host/db"
+
+
+def test_get_async_db_yields_a_working_session(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "database_async_url", f"sqlite+aiosqlite:///{tmp_path / 'app.db'}")
+    monkeypatch.setattr(db_session, "_async_engine", None)
+    monkeypatch.setattr(db_session, "_async_session_factory", None)
+
+    async def query():
+        sessions = db_session.get_async_db()
+        db = await sessions.__anext__()
+        value = (await db.execute(text("SELECT 1"))).scalar()
+        await sessions.aclose()
+        await db_session.get_async_engine().dispose()
+        return value
+
+    assert asyncio.run(query()) == 1
+    assert db_session.get_async_engine() is db_session.get_async_engine()
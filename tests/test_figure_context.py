@@ -0,0 +1,134 @@
+import matplotlib.pyplot as plt
+import pandas as pd
+import pytest
+
+from code_sandbox import execute_generated_code
+import threading
+from types import SimpleNamespace
+
+from code_validator import CodeValidationError, compile_generated_code, rewrite_generated_code
+from figure_context import FigureContext
+
+DF = pd.DataFrame({"a": ["x", "y", "x", "z"], "b": [1, 2, 3, 4]})
+
+
+def run_graph(body):
+    code = "plt.figure(figsize=(6, 4))\n" + body + "\nplt.tight_layout()\nplt.show()"
+    return execute_generated_code({"df": DF, "pd": pd}, compile_generated_code(code, "GRAPH_TASK"), "GRAPH_TASK")
+
+
+@pytest.mark.parametrize("body", [
+    "df['a'].value_counts().plot(kind='bar')",
+    "df.plot(x='a', y='b')",
+    "df.plot.bar(x='a', y='b')",
+    "df['b'].hist()",
+])
+def test_pandas_plotting_draws_on_the_run_figure(body):
+    plt.close("all")
+    success, message, fig = run_graph(body)
+    assert success, message
+    assert fig is not None and any(ax.has_data() for ax in fig.axes)
+    assert plt.get_fignums() == []
+
+
+def test_pyplot_reached_through_matplotlib_uses_the_run_figure():
+    plt.close("all")
+    code = "import matplotlib\nmatplotlib.pyplot.figure()\nmatplotlib.pyplot.bar(['a'], [1])\nplt.tight_layout()\nplt.show()"
+    success, message, fig = execute_generated_code({"df": DF}, compile_generated_code(code, "GRAPH_TASK"), "GRAPH_TASK")
+    assert success, message
+    assert fig is not None
+    assert plt.get_fignums() == []
+
+
+def test_explicit_axes_are_kept():
+    assert rewrite_generated_code("df.plot(ax=other)") == "df.plot(ax=other)"
+    assert "_plot_on_axes(df, 'plot.bar', x='a')" in rewrite_generated_code("df.plot.bar(x='a')")
+
+
+def test_plot_helper_cannot_be_called_directly():
+    with pytest.raises(CodeValidationError):
+        compile_generated_code("_plot_on_axes(df, 'plot')")
+
+
+def test_pandas_plotting_through_the_lazy_frame():
+    from lazy_frame import LazyFrame
+    plt.close("all")
+    code = "plt.figure(figsize=(6, 4))\ndf['b'].hist()\nplt.tight_layout()\nplt.show()"
+    success, message, fig = execute_generated_code({"df": LazyFrame(DF)}, compile_generated_code(code, "GRAPH_TASK"), "GRAPH_TASK")
+    assert success, message
+    assert fig is not None and any(ax.has_data() for ax in fig.axes)
+    assert plt.get_fignums() == []
+
+
+def test_concurrent_runs_keep_their_own_figures():
+    plt.close("all")
+    other_session = plt.figure()  # e.g. a chart another session is still drawing
+    barrier = threading.Barrier(2)
+    results = {}
+
+    def run(label):
+        code = (
+            "import matplotlib.pyplot as plt\nplt.figure(figsize=(4, 3))\n"
+            f"plt.bar(['{label}'], [1])\nplt.tight_layout()\nplt.show()"
+        )
+        compiled = compile_generated_code(code, "GRAPH_TASK")
+        figures = []
+        for _ in range(20):
+            barrier.wait()
+            success, message, fig = execute_generated_code({"df": DF}, compiled, "GRAPH_TASK")
+            assert success, message
+            figures.append(fig)
+        results[label] = figures
+
+    threads = [threading.Thread(target=run, args=(label,)) for label in ("left", "right")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for label, figures in results.items():
+        assert len(figures) == 20
+        for fig in figures:
+            labels = [tick.get_text() for tick in fig.axes[0].get_xticklabels()]
+            assert labels == [label]
+    assert plt.get_fignums() == [other_session.number]
+    plt.close("all")
+
+
+def test_agent_tool_code_draws_on_the_run_figure():
+    from langchain_experimental.tools import PythonAstREPLTool
+
+    from agent import bind_figure_context
+    from tool_cache import MemoizedPythonTool
+
+    plt.close("all")
+    tool = MemoizedPythonTool(PythonAstREPLTool(locals={"df": DF, "pd": pd}), "v1")
+    context = FigureContext()
+    bind_figure_context(SimpleNamespace(tools=[tool]), context)
+    tool._run("import matplotlib.pyplot as plt\nplt.figure()\nplt.bar(df['a'], df['b'])\nplt.title('t')\nplt.show()")
+    assert context.has_plot()
+    assert context.axes.get_title() == "t"
+    assert plt.get_fignums() == []
+
+
+@pytest.mark.parametrize("body", [
+    "plt.gcf().suptitle('s')\nplt.bar(df['a'], df['b'])",
+    "plt.bar(df['a'], df['b'])\nplt.clf()\nplt.plot(df['b'])",
+    "plt.subplot(1, 2, 1)\nplt.bar(df['a'], df['b'])\nplt.subplot(1, 2, 2)\nplt.plot(df['b'])",
+    "plt.suptitle('s')\nplt.scatter(df['b'], df['b'], c=df['b'])\nplt.colorbar()",
+    "plt.bar(df['a'], df['b'])\nplt.close('all')",
+])
+def test_figure_level_helpers_use_the_run_figure(body):
+    plt.close("all")
+    success, message, fig = run_graph(body)
+    assert success, message
+    assert fig is not None and any(ax.has_data() for ax in fig.axes)
+    assert plt.get_fignums() == []
+
+
+def test_other_pyplot_names_are_not_reached():
+    plt.close("all")
+    success, message, fig = run_graph("plt.bar(df['a'], df['b'])\nplt.figimage([[1]])")
+    assert not success
+    assert "plt.figimage is not available" in message
+    assert plt.get_fignums() == []
@@ -0,0 +1,37 @@
+import matplotlib.pyplot as plt
+
+from figure_store import FigureStore, render_figure
+
+
+def bar_figure(values):
+    fig, ax = plt.subplots()
+    ax.bar(range(len(values)), values)
+    return fig
+
+
+def test_rendering_returns_png_bytes_and_closes_the_figure():
+    plt.close("all")
+    fig = bar_figure([1, 2, 3])
+    data = render_figure(fig)
+    assert data.startswith(b"\x89PNG")
+    assert plt.get_fignums() == []
+
+
+def test_identical_charts_share_one_image():
+    store = FigureStore()
+    first = store.add_figure(bar_figure([1, 2, 3]))
+    second = store.add_figure(bar_figure([1, 2, 3]))
+    other = store.add_figure(bar_figure([3, 2, 1]))
+    assert first == second != other
+    assert store.get(first).startswith(b"\x89PNG")
+
+
+def test_discard_and_clear_drop_images():
+    store = FigureStore()
+    first = store.add_image(b"one")
+    second = store.add_image(b"two")
+    store.discard(first)
+    store.discard("missing")
+    assert store.get(first) is None and store.get(second) == b"two"
+    store.clear()
+    assert store.get(second) is None
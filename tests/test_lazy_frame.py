@@ -0,0 +1,164 @@
+import numpy as np
+import pandas as pd
+import pandas.testing as tm
+import pytest
+
+from lazy_frame import LazyFrame
+
+
+def make_df():
+    return pd.DataFrame({"a": ["x", "y", "x", "z"], "b": [1.0, np.nan, 3.0, 400.0], "c": [10, 20, 30, 40]})
+
+
+def test_loc_with_lazy_mask():
+    df = make_df()
+    lazy = LazyFrame(df)
+    tm.assert_frame_equal(lazy.loc[lazy["c"] > 15], df.loc[df["c"] > 15])
+    tm.assert_series_equal(lazy.loc[lazy["c"] > 15, "a"], df.loc[df["c"] > 15, "a"])
+    tm.assert_frame_equal(lazy.loc[(lazy["a"] == "x") & (lazy["c"] > 15), ["a", "c"]], df.loc[(df["a"] == "x") & (df["c"] > 15), ["a", "c"]])
+    tm.assert_frame_equal(lazy.iloc[lazy["c"] > 15], df.iloc[(df["c"] > 15).to_numpy()])
+    tm.assert_series_equal(lazy["a"].loc[lazy["c"] > 15], df["a"].loc[df["c"] > 15])
+
+
+def test_loc_on_filtered_frame():
+    df = make_df()
+    lazy = LazyFrame(df)
+    subset = lazy[lazy["c"] > 15]
+    expected = df[df["c"] > 15]
+    tm.assert_series_equal(subset.loc[subset["a"] == "x", "c"], expected.loc[expected["a"] == "x", "c"])
+
+
+@pytest.mark.parametrize("write", [
+    lambda lazy: lazy.fillna(0, inplace=True),
+    lambda lazy: lazy.drop(columns=["c"], inplace=True),
+    lambda lazy: lazy.loc.__setitem__((0, "b"), 999),
+    lambda lazy: lazy.loc.__setitem__(lazy["c"] > 15, 0),
+    lambda lazy: lazy.iloc.__setitem__((0, 1), 999),
+    lambda lazy: lazy.at.__setitem__((0, "b"), 999),
+    lambda lazy: lazy.insert(0, "d", 1),
+    lambda lazy: lazy.__delitem__("c"),
+    lambda lazy: lazy["b"].fillna(0, inplace=True),
+])
+def test_writes_leave_the_source_unchanged(write):
+    df = make_df()
+    lazy = LazyFrame(df)
+    expected = make_df()
+    write(expected)
+    write(lazy)
+    tm.assert_frame_equal(df, make_df())
+    tm.assert_frame_equal(lazy.collect(), expected)
+
+
+def test_inplace_result_and_chaining():
+    df = make_df()
+    lazy = LazyFrame(df)
+    assert lazy.fillna(0, inplace=True) is None
+    assert lazy["b"].sum() == 404.0
+    tm.assert_frame_equal(lazy.fillna(1), make_df().fillna(0).fillna(1))
+
+
+def test_predicates_have_no_truth_value():
+    lazy = LazyFrame(make_df())
+    with pytest.raises(ValueError, match="truth value of a Series is ambiguous"):
+        bool(lazy["b"] > 100)
+    with pytest.raises(ValueError, match="truth value of a Series is ambiguous"):
+        bool(lazy["b"])
+    assert (lazy["b"] > 100).any()
+
+
+def test_pandas_members_win_over_columns_of_the_same_name():
+    df = pd.DataFrame({"mean": [1.0, 3.0], "count": [1, 2], "index": [5, 6], "values": [7, 8]})
+    lazy = LazyFrame(df)
+    tm.assert_series_equal(lazy.mean(), df.mean())
+    tm.assert_series_equal(lazy.count(), df.count())
+    tm.assert_index_equal(lazy.index, df.index)
+    np.testing.assert_array_equal(lazy.values, df.values)
+    tm.assert_series_equal(lazy["mean"].collect(), df["mean"])
+
+
+def test_array_and_interchange_protocols():
+    df = make_df()
+    lazy = LazyFrame(df)
+    np.testing.assert_array_equal(np.asarray(lazy[["c"]]), df[["c"]].to_numpy())
+    tm.assert_frame_equal(pd.api.interchange.from_dataframe(lazy[["a", "c"]]), df[["a", "c"]])
+
+
+def run_graph(df, body):
+    import matplotlib.pyplot as plt
+
+    from code_sandbox import execute_generated_code
+    from code_validator import compile_generated_code
+
+    plt.close("all")
+    code = "import matplotlib.pyplot as plt\nimport seaborn as sns\nplt.figure()\n" + body + "\nplt.tight_layout()\nplt.show()"
+    success, message, fig = execute_generated_code({"df": df, "pd": pd}, compile_generated_code(code, "GRAPH_TASK"), "GRAPH_TASK")
+    assert success, message
+    assert fig is not None and any(ax.has_data() for ax in fig.axes)
+    assert plt.get_fignums() == []
+
+
+@pytest.mark.parametrize("body", [
+    "sns.barplot(data=df, x='a', y='c')",
+    "sns.scatterplot(x=df['c'], y=df['b'])",
+    "plt.bar(df['a'], df['c'])",
+    "df.plot.scatter(x='c', y='b', c=df['c'])",
+])
+def test_plotting_accepts_the_lazy_frame(body):
+    run_graph(LazyFrame(make_df()), body)
+
+
+def test_agent_tool_pandas_functions_accept_the_lazy_frame():
+    from types import SimpleNamespace
+
+    from langchain_experimental.tools import PythonAstREPLTool
+
+    from agent import bind_figure_context
+    from figure_context import FigureContext
+    from lazy_frame import PandasFacade
+    from tool_cache import MemoizedPythonTool, ToolResultCache
+
+    namespace = {"df": LazyFrame(make_df()), "pd": PandasFacade()}
+    tool = MemoizedPythonTool(PythonAstREPLTool(locals=namespace), "v1", cache=ToolResultCache())
+    bind_figure_context(SimpleNamespace(tools=[tool]), FigureContext())
+
+    def run(code):
+        return str(tool._run(code))
+
+    assert run("import pandas as pd\nlen(pd.concat([df, df[df['c'] > 15]]))") == "7"
+    assert run("pd.merge(df, pd.DataFrame({'a': ['x'], 'd': [1]}), on='a').shape") == "(2, 4)"
+    assert run("pd.crosstab(df['a'], df['c'] > 15).shape") == "(3, 2)"
+    assert run("len(pd.concat([df, df]))") == "8"
+    assert run("len(pd.concat([df, df]))").startswith("8")  # served from the tool cache
+    assert tool.hits == 1
+
+
+def test_groupby_iteration_and_length():
+    df = make_df()
+    lazy = LazyFrame(df)
+    pairs = [(key, group) for key, group in lazy.groupby("a")]
+    expected = list(df.groupby("a"))
+    assert [key for key, _ in pairs] == [key for key, _ in expected]
+    for (_, group), (_, expected_group) in zip(pairs, expected):
+        tm.assert_frame_equal(group, expected_group)
+    assert [key for key, _ in list(lazy.groupby("a"))] == ["x", "y", "z"]
+    assert len(lazy.groupby("a")) == 3
+    assert len(lazy[lazy["c"] > 15].groupby("a")) == 3
+
+
+def test_groupby_agg_leaves_the_groupby_unchanged():
+    df = make_df()
+    grouped = LazyFrame(df).groupby("a")
+    tm.assert_frame_equal(grouped.agg({"c": "sum"}), df.groupby("a").agg({"c": "sum"}))
+    tm.assert_frame_equal(grouped.sum(), df.groupby("a").sum())
+    tm.assert_frame_equal(grouped.mean(), df.groupby("a").mean())
+
+
+def test_groupby_size_on_a_column_selection():
+    df = make_df()
+    lazy = LazyFrame(df)
+    tm.assert_series_equal(lazy.groupby("a")["c"].size(), df.groupby("a")["c"].size())
+    tm.assert_series_equal(lazy.groupby("a")["c"].agg("size"), df.groupby("a")["c"].agg("size"))
+    tm.assert_series_equal(lazy.groupby("a")[["b", "c"]].size(), df.groupby("a")[["b", "c"]].size())
+    tm.assert_series_equal(lazy.groupby("a").size(), df.groupby("a").size())
+    tm.assert_frame_equal(lazy.groupby("a", as_index=False)["c"].size(), df.groupby("a", as_index=False)["c"].size())
+    tm.assert_frame_equal(lazy.groupby("a", as_index=False).size(), df.groupby("a", as_index=False).size())
@@ -0,0 +1,113 @@
+import contextvars
+import json
+import logging
+import os
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key")  # the chat service builds its client on import
+
+from core.config import settings
+from core.metrics import current_span, span, span_logger, traced
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    # main creates its tables on import; keep the database out of the repo
+    import db.session
+    monkeypatch.setattr(db.session, "engine", create_engine(f"sqlite:///{tmp_path / 'metrics.db'}"))
+    import main
+    return TestClient(main.app)
+
+
+class SpanRecords(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.spans = []
+
+    def emit(self, record):
+        self.spans.append(json.loads(record.getMessage()))
+
+
+@pytest.fixture
+def logged_spans(monkeypatch):
+    monkeypatch.setattr(settings, "span_logs_enabled", True)
+    handler = SpanRecords()
+    span_logger.addHandler(handler)
+    yield handler.spans
+    span_logger.removeHandler(handler)
+
+
+@traced("metrics_test_query")
+def run_query():
+    current_span().set(rows_scanned=120, rows_returned=7, prompt_tokens=30, completion_tokens=5, cache_hit=False)
+    return "answer"
+
+
+@traced("metrics_test_failure")
+def fail():
+    raise RuntimeError("query failed")
+
+
+def test_traced_calls_are_exported_at_metrics(client):
+    assert run_query() == "answer"
+    with pytest.raises(RuntimeError):
+        fail()
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    lines = response.text.splitlines()
+    assert "# TYPE insightquery_stage_duration_seconds histogram" in lines
+    assert 'insightquery_stage_duration_seconds_count{stage="metrics_test_query",status="ok"} 1' in lines
+    assert 'insightquery_stage_duration_seconds_bucket{stage="metrics_test_query",status="ok",le="+Inf"} 1' in lines
+    assert 'insightquery_stage_duration_seconds_count{stage="metrics_test_failure",status="error"} 1' in lines
+    assert 'insightquery_llm_tokens_total{stage="metrics_test_query",type="prompt"} 30' in lines
+    assert 'insightquery_llm_tokens_total{stage="metrics_test_query",type="completion"} 5' in lines
+    assert 'insightquery_rows_scanned_total{stage="metrics_test_query"} 120' in lines
+    assert 'insightquery_rows_returned_total{stage="metrics_test_query"} 7' in lines
+    assert 'insightquery_cache_lookups_total{result="miss",stage="metrics_test_query"} 1' in lines
+    # Gauges from registered collectors are rendered too
+    assert "# TYPE insightquery_chat_in_flight gauge" in lines
+
+
+def test_spans_nest_within_a_trace(logged_spans):
+    assert current_span() is None
+    with span("outer") as outer:
+        with span("inner") as inner:
+            assert current_span() is inner
+        assert current_span() is outer
+
+        # A worker running in a copy of the context joins the same trace
+        worker_spans = []
+        context = contextvars.copy_context()
+
+        def work():
+            with span("worker") as worker:
+                worker_spans.append(worker)
+
+        thread = threading.Thread(target=context.run, args=(work,))
+        thread.start()
+        thread.join(5)
+    assert current_span() is None
+
+    assert inner.trace_id == outer.trace_id == worker_spans[0].trace_id
+    assert inner.parent_id == outer.span_id == worker_spans[0].parent_id
+    assert outer.parent_id is None
+
+    logged = {record["span"]: record for record in logged_spans}
+    assert [record["span"] for record in logged_spans] == ["inner", "worker", "outer"]
+    assert logged["inner"]["parent_id"] == logged["outer"]["span_id"]
+    assert logged["worker"]["trace_id"] == logged["outer"]["trace_id"]
+
+
+def test_separate_spans_start_separate_traces():
+    with span("first") as first:
+        pass
+    with span("second") as second:
+        pass
+    assert first.trace_id != second.trace_id
+    assert second.parent_id is None
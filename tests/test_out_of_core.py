@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+import pandas.testing as tm
+import pytest
+from pandasql import sqldf
+
+from services.out_of_core import ChunkedCSVSource
+
+
+@pytest.fixture
+def source(tmp_path):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        "region": rng.choice(["east", "west", "north"], 1000),
+        "city": rng.choice(["New York", "Boston", "Austin"], 1000),
+        "sales": rng.integers(0, 1000, 1000).astype(float),
+        "units": rng.integers(1, 10, 1000)
+    })
+    path = tmp_path / "data.csv"
+    df.to_csv(path, index=False)
+    return df, ChunkedCSVSource(str(path), chunk_rows=128, sample_rows=100)
+
+
+@pytest.mark.parametrize("query", [
+    "SELECT AVG(sales) FROM df WHERE units > 5",
+    "SELECT COUNT(*) AS n, MAX(sales) FROM df WHERE city = 'New York' AND sales >= 500",
+    "SELECT region, SUM(sales) AS total FROM df WHERE units > 5 GROUP BY region ORDER BY total DESC",
+    "SELECT region, COUNT(*) FROM df WHERE city IN ('Boston', 'Austin') GROUP BY region LIMIT 2",
+    "SELECT region, AVG(sales) FROM df GROUP BY region",
+])
+def test_aggregates_with_where_match_sqlite(source, query):
+    df, chunked = source
+    result = chunked.execute_sql(query)
+    assert "error" not in result.columns, result
+    expected = sqldf(query, {"df": df})
+    tm.assert_frame_equal(result.reset_index(drop=True), expected, check_dtype=False, check_exact=False)
+
+
+def test_aggregate_with_no_matching_rows(source):
+    df, chunked = source
+    query = "SELECT COUNT(*), AVG(sales) FROM df WHERE units > 100"
+    result = chunked.execute_sql(query)
+    tm.assert_frame_equal(result, sqldf(query, {"df": df}), check_dtype=False)
@@ -0,0 +1,67 @@
+import asyncio
+import time
+
+import pytest
+
+from core.config import settings
+from core.profiling import profiled
+
+
+@pytest.fixture(autouse=True)
+def profiling_settings(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "profiling_interval_ms", 1)
+    monkeypatch.setattr(settings, "profiles_dir", str(tmp_path))
+
+
+def spin(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def busy_here():
+    spin(0.005)
+
+
+def busy_elsewhere():
+    spin(0.005)
+
+
+async def other_request(stop):
+    while not stop.is_set():
+        busy_elsewhere()
+        await asyncio.sleep(0)
+
+
+async def profiled_request():
+    with profiled("POST /test", True) as profile:
+        for _ in range(40):
+            busy_here()
+            await asyncio.sleep(0)
+    return profile
+
+
+async def run_together():
+    stop = asyncio.Event()
+    other = asyncio.create_task(other_request(stop))
+    await asyncio.sleep(0)
+    profile = await profiled_request()
+    stop.set()
+    await other
+    return profile
+
+
+def test_async_profile_samples_only_its_own_task():
+    profile = asyncio.run(run_together())
+    folded = profile.folded()
+    assert "busy_here" in folded
+    assert "busy_elsewhere" not in folded
+    assert profile.to_dict()["skipped_samples"] > 0
+
+
+def test_sync_profile_samples_the_block():
+    with profiled("GET /test", True) as profile:
+        busy_here()
+        spin(0.05)
+    assert "spin" in profile.folded()
+    assert profile.to_dict()["samples"] > 0
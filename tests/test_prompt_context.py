@@ -0,0 +1,41 @@
+import pandas as pd
+
+from prompt_context import PromptContextBuilder, dataset_fingerprint
+
+
+def make_df(middle_value):
+    values = list(range(5000))
+    values[2500] = middle_value
+    return pd.DataFrame({"id": range(5000), "value": values, "tags": [["a"]] * 5000})
+
+
+def test_fingerprint_covers_every_row():
+    assert dataset_fingerprint(make_df(2500)) == dataset_fingerprint(make_df(2500))
+    assert dataset_fingerprint(make_df(2500)) != dataset_fingerprint(make_df(10 ** 9))
+
+
+def test_sections_are_not_shared_between_different_contents():
+    small = PromptContextBuilder(make_df(2500), {}).build()
+    large = PromptContextBuilder(make_df(10 ** 9), {}).build()
+    assert small.fingerprint != large.fingerprint
+    assert small.text != large.text
+
+
+def test_prompt_context_is_swapped_on_the_same_agent(monkeypatch):
+    from langchain.prompts import ChatPromptTemplate
+
+    from agent import get_agent_with_context, set_prompt_context
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    df = pd.DataFrame({"price": [1.0, 2.0], "region": ["n", "s"]})
+    builder = PromptContextBuilder(df, {"price": "unit price", "region": "sales region"}, token_budget=80)
+    agent = get_agent_with_context(df, builder.build())
+    tools = list(agent.tools)
+
+    context = builder.build("which region sells most?")
+    assert context.text != builder.build().text
+    set_prompt_context(agent, context)
+
+    prompt = next(step for step in agent.agent.runnable.steps if isinstance(step, ChatPromptTemplate))
+    assert context.text in prompt.messages[0].content
+    assert agent.tools == tools
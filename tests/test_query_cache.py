@@ -0,0 +1,11 @@
+from services.query_cache import sql_hash
+
+
+def test_whitespace_is_collapsed_outside_literals():
+    assert sql_hash("SELECT  a,\n  b FROM df ;") == sql_hash("SELECT a, b FROM df")
+
+
+def test_whitespace_inside_literals_is_kept():
+    assert sql_hash("SELECT * FROM df WHERE city = 'New  York'") != sql_hash("SELECT * FROM df WHERE city = 'New York'")
+    assert sql_hash("SELECT \"total  sales\" FROM df") != sql_hash("SELECT \"total sales\" FROM df")
+    assert sql_hash("SELECT * FROM df WHERE name = 'O''Brien  x'") != sql_hash("SELECT * FROM df WHERE name = 'O''Brien x'")
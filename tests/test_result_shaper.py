@@ -0,0 +1,42 @@
+import pandas as pd
+import pytest
+
+from services.result_shaper import inject_limit, shape_result
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("SELECT * FROM df", "SELECT * FROM df LIMIT 11"),
+    ("SELECT * FROM df WHERE sales > 5;", "SELECT * FROM df WHERE sales > 5 LIMIT 11"),
+    ("SELECT * FROM df WHERE sales > (SELECT AVG(sales) FROM df)", "SELECT * FROM df WHERE sales > (SELECT AVG(sales) FROM df) LIMIT 11"),
+    ("SELECT * FROM df WHERE region IN (SELECT region FROM df GROUP BY region LIMIT 2)", "SELECT * FROM df WHERE region IN (SELECT region FROM df GROUP BY region LIMIT 2) LIMIT 11"),
+    ("SELECT * FROM df WHERE note = 'no limit 5 here'", "SELECT * FROM df WHERE note = 'no limit 5 here' LIMIT 11"),
+])
+def test_limit_is_added_to_raw_row_queries(query, expected):
+    assert inject_limit(query, limit=10) == (expected, 10)
+
+
+@pytest.mark.parametrize("query", [
+    "SELECT * FROM df LIMIT 5",
+    "select * from df order by sales desc limit 3;",
+    "SELECT * FROM (SELECT * FROM df) LIMIT 5",
+    "SELECT region, SUM(sales) FROM df GROUP BY region",
+    "SELECT COUNT(*) FROM (SELECT * FROM df WHERE sales > 5)",
+    "SELECT DISTINCT region FROM df",
+])
+def test_limited_and_aggregating_queries_are_unchanged(query):
+    assert inject_limit(query, limit=10) == (query, None)
+
+
+def test_rows_past_the_limit_are_reported():
+    result = pd.DataFrame({"value": range(11)})
+    text, info = shape_result(result, row_limit=10, max_rows=50, max_chars=10_000)
+    assert info["rows"] == 10 and info["row_limit_hit"] and info["truncated"]
+    assert "Stopped at the first 10 rows" in text
+
+
+def test_large_results_are_summarized_within_the_budget():
+    result = pd.DataFrame({"value": range(1000), "region": ["east", "west"] * 500})
+    text, info = shape_result(result, max_rows=50, max_chars=2000)
+    assert info["summarized"] and not info["row_limit_hit"]
+    assert len(text) <= 2000 + len("\n... (truncated)")
+    assert "Top values of region" in text
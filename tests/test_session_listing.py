@@ -0,0 +1,41 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import models.csv_model  # noqa: F401 (registers the tables)
+import models.query_model  # noqa: F401
+from crud.csv_crud import CSVSessionCRUD
+from db.base import Base
+from models.csv_model import CSVSession
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'listing.db'}")
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)()
+
+
+def list_all(db, limit):
+    ids, cursor = [], None
+    while True:
+        page, cursor = CSVSessionCRUD.list_sessions(db, limit, cursor, include_files=False)
+        ids.extend(session.id for session in page)
+        if cursor is None:
+            return ids
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 10])
+def test_pages_through_sessions_sharing_created_at(db, limit):
+    tie, later = datetime(2024, 5, 1, 12, 0, 0), datetime(2024, 5, 1, 12, 0, 0, 500)
+    for index, created_at in enumerate([tie, later, tie, tie, later, tie]):
+        db.add(CSVSession(id=f"s{index}", session_id=f"session-{index}", created_at=created_at))
+    for index in range(3):
+        CSVSessionCRUD.create_session(db, f"default-{index}")  # created within the same second
+    db.commit()
+
+    expected = [session.id for session in db.query(CSVSession).order_by(CSVSession.created_at, CSVSession.id)]
+    assert list_all(db, limit) == expected
+    assert expected[:6] == ["s0", "s2", "s3", "s5", "s1", "s4"]
@@ -0,0 +1,50 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import models.csv_model  # noqa: F401 (registers the tables)
+import models.query_model  # noqa: F401
+import services.cleanup_service as cleanup_service
+from core.config import settings
+from crud.csv_crud import CSVSessionCRUD
+from db.base import Base
+from models.csv_model import CSVSession
+
+
+@pytest.fixture
+def session_factory(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'ttl.db'}")
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine)
+    monkeypatch.setattr(cleanup_service, "SessionLocal", factory)
+    monkeypatch.setattr(settings, "session_ttl_hours", 24)
+    return factory
+
+
+def add_session(db, session_id, age):
+    db.add(CSVSession(session_id=session_id, created_at=datetime.utcnow() - age))
+    db.commit()
+
+
+def test_active_old_session_survives_the_sweep(session_factory):
+    db = session_factory()
+    add_session(db, "active", timedelta(days=3))
+    add_session(db, "idle", timedelta(days=3))
+    add_session(db, "new", timedelta(hours=1))
+
+    CSVSessionCRUD.touch_session(db, "active")
+    cleanup_service.CleanupWorker().expire_sessions()
+
+    db.expire_all()
+    assert sorted(session.session_id for session in db.query(CSVSession)) == ["active", "new"]
+    db.close()
+
+
+def test_touch_writes_at_most_once_per_interval(session_factory):
+    db = session_factory()
+    add_session(db, "recent", timedelta(seconds=5))
+    CSVSessionCRUD.touch_session(db, "recent")
+    assert CSVSessionCRUD.get_session_by_id(db, "recent").updated_at is None
+    db.close()
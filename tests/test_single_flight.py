@@ -0,0 +1,99 @@
+import threading
+import time
+
+import pytest
+
+from services.single_flight import SingleFlight
+
+
+def run_concurrently(flight, key, fn, callers):
+    """Start callers threads on key while fn blocks; returns their outcomes once fn is released"""
+    release = threading.Event()
+    outcomes = [None] * callers
+
+    def blocked():
+        release.wait(5)
+        return fn()
+
+    def call(index):
+        try:
+            outcomes[index] = ("ok", flight.do(key, blocked))
+        except BaseException as e:
+            outcomes[index] = ("error", e)
+
+    threads = [threading.Thread(target=call, args=(index,)) for index in range(callers)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while flight.stats()["waiting"] < callers - 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert flight.stats() == {"executions": 1, "coalesced": callers - 1, "in_flight": 1, "waiting": callers - 1}
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    return outcomes
+
+
+def test_identical_calls_run_once_and_share_the_result():
+    flight = SingleFlight()
+    calls = []
+
+    def answer():
+        calls.append(1)
+        return {"response": "42"}
+
+    outcomes = run_concurrently(flight, ("s1", "question"), answer, 5)
+    assert len(calls) == 1
+    results = [result for status, (result, _) in outcomes if status == "ok"]
+    assert len(results) == 5 and all(result is results[0] for result in results)
+    assert sorted(shared for _, (_, shared) in outcomes) == [False, True, True, True, True]
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_exception_reaches_every_waiter():
+    flight = SingleFlight()
+    error = ValueError("LLM unavailable")
+
+    def fail():
+        raise error
+
+    outcomes = run_concurrently(flight, "key", fail, 4)
+    assert outcomes == [("error", error)] * 4
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_base_exception_reaches_every_waiter():
+    class Cancelled(BaseException):
+        pass
+
+    flight = SingleFlight()
+    error = Cancelled()
+
+    def cancel():
+        raise error
+
+    outcomes = run_concurrently(flight, "key", cancel, 3)
+    assert outcomes == [("error", error)] * 3
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_finished_calls_are_not_cached():
+    flight = SingleFlight()
+    assert flight.do("key", lambda: 1) == (1, False)
+    assert flight.do("key", lambda: 2) == (2, False)
+    with pytest.raises(KeyError):
+        flight.do("key", lambda: {}["missing"])
+    assert flight.do("key", lambda: 3) == (3, False)
+    assert flight.stats()["executions"] == 4
+
+
+def test_different_keys_do_not_wait_for_each_other():
+    flight = SingleFlight()
+    release = threading.Event()
+    thread = threading.Thread(target=flight.do, args=("slow", lambda: release.wait(5)))
+    thread.start()
+    try:
+        assert flight.do("fast", lambda: "done") == ("done", False)
+    finally:
+        release.set()
+        thread.join(5)
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from core.config import settings
+from services.sql_validator import validate_sql
+
+DTYPES = {"sales": np.dtype(float), "region": np.dtype(object), "unit_price": np.dtype(int)}
+
+
+@pytest.mark.parametrize("query, hint", [
+    ("SELECT salse FROM df", "no such column: salse (did you mean sales?)"),
+    ("SELECT region, SUM(price) FROM df GROUP BY region", "(did you mean unit_price?)"),
+    ("SELECT region FROM df WHERE Unit_Prices > 3", "(did you mean unit_price?)"),
+])
+def test_unknown_columns_get_did_you_mean_hints(query, hint):
+    validation = validate_sql(query, DTYPES, 100)
+    assert not validation.valid
+    assert hint in validation.errors[0]
+
+
+def test_unknown_column_without_a_close_match_has_no_hint():
+    validation = validate_sql("SELECT zzz FROM df", DTYPES, 100)
+    assert not validation.valid
+    assert "did you mean" not in validation.errors[0]
+
+
+@pytest.mark.parametrize("query", ["DELETE FROM df", "SELECT * FROM df; DROP TABLE df"])
+def test_only_a_single_select_is_accepted(query):
+    validation = validate_sql(query, DTYPES, 100)
+    assert validation.errors == ["Only a single SELECT query is allowed"]
+
+
+def test_cartesian_self_join_is_rejected_as_too_expensive():
+    validation = validate_sql("SELECT a.sales FROM df a, df b", DTYPES, 20_000)
+    assert not validation.valid
+    assert validation.cartesian
+    assert validation.estimated_rows_scanned == 20_000 ** 2
+    assert "too expensive" in validation.errors[0]
+
+
+def test_cost_limit_comes_from_settings(monkeypatch):
+    monkeypatch.setattr(settings, "sql_max_rows_scanned", 1_000)
+    assert not validate_sql("SELECT a.sales FROM df a, df b", DTYPES, 50).valid
+    assert validate_sql("SELECT a.sales FROM df a, df b", DTYPES, 30).valid
+
+
+def test_single_scan_of_a_huge_file_is_allowed():
+    row_count = 5 * settings.sql_max_rows_scanned
+    for query in [
+        "SELECT region, SUM(sales) FROM df GROUP BY region",
+        "SELECT AVG(sales) FROM df WHERE unit_price > 3",
+        "SELECT * FROM df WHERE sales > 10",
+    ]:
+        validation = validate_sql(query, DTYPES, row_count)
+        assert validation.valid, validation.errors
+        assert validation.estimated_rows_scanned == row_count
+    assert not validate_sql("SELECT a.sales FROM df a, df b", DTYPES, row_count).valid
+
+
+def test_correlated_subquery_is_costed_per_row():
+    query = "SELECT * FROM df a WHERE sales > (SELECT AVG(sales) FROM df b WHERE b.region = a.region)"
+    validation = validate_sql(query, DTYPES, 100)
+    assert validation.valid
+    assert validation.estimated_rows_scanned >= 100 * 100
+    assert "Correlated subquery runs once per row" in validation.warnings
+    assert validation.unbounded
+
+
+def test_aggregates_and_limits_are_bounded():
+    assert not validate_sql("SELECT region, SUM(sales) FROM df GROUP BY region", DTYPES, 100).unbounded
+    assert not validate_sql("SELECT * FROM df LIMIT 5", DTYPES, 100).unbounded
+    assert not validate_sql("SELECT DISTINCT region FROM df", DTYPES, 100).unbounded
+    assert validate_sql("SELECT * FROM df WHERE sales > (SELECT AVG(sales) FROM df)", DTYPES, 100).unbounded
@@ -0,0 +1,167 @@
+import ast
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set, Type
+import numpy as np
+import pandas as pd
+from langchain_core.tools import BaseTool
+from pydantic import BaseModel, Field
+
+TOOL_CACHE_SIZE = int(os.getenv("TOOL_CACHE_SIZE", "256"))
+TOOL_CACHE_MAX_CHARS = 20000  # Larger outputs are not worth keeping
+
+REPEAT_NOTE = "\n\n(Note: this exact code already ran during this question; the result is unchanged.)"
+
+# Names a cacheable snippet may read; anything else may be state from earlier steps
+MODULES = {"pd": pd, "np": np}
+SAFE_BUILTINS = {
+    "abs", "all", "any", "bool", "dict", "enumerate", "float", "int", "isinstance", "len",
+    "list", "max", "min", "print", "range", "repr", "round", "set", "sorted", "str", "sum",
+    "tuple", "type", "zip"
+}
+
+# Attributes that are random, draw, write or mutate
+IMPURE_ATTRIBUTES = {
+    "sample", "random", "shuffle", "plot", "hist", "boxplot", "to_csv", "to_excel",
+    "to_json", "to_parquet", "to_pickle", "to_sql", "to_clipboard", "update", "pop",
+    "append", "extend", "insert", "remove", "clear", "fillna", "set_index", "reset_index",
+    "rename", "drop", "drop_duplicates", "dropna", "replace", "sort_values", "sort_index",
+    "interpolate", "clip", "mask", "where", "assign", "setdefault"
+}
+
+
+def normalize_code(code: str) -> Optional[str]:
+    """
+    Canonical form of a snippet if it is a side-effect-free expression, else None.
+
+    Only expression statements reading df, pd, np and pure builtins qualify, so
+    a cached result can never depend on state from earlier steps.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return None
+    if not tree.body or not all(isinstance(statement, ast.Expr) for statement in tree.body):
+        return None
+
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.NamedExpr, ast.Lambda, ast.Await, ast.Yield, ast.YieldFrom)):
+            return None
+        if isinstance(node, ast.Name) and node.id not in MODULES and node.id != "df" and node.id not in SAFE_BUILTINS:
+            return None
+        if isinstance(node, ast.Attribute) and (node.attr in IMPURE_ATTRIBUTES or node.attr.startswith("_")):
+            return None
+        if isinstance(node, ast.keyword) and node.arg == "inplace":
+            return None
+    return ast.unparse(tree)
+
+
+class ToolResultCache:
+    """LRU of python tool outputs keyed by (dataset version, normalized code), shared across agents"""
+
+    def __init__(self, max_size: int = TOOL_CACHE_SIZE):
+        self.max_size = max_size
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            result = self._results.get(key)
+            if result is not None:
+                self._results.move_to_end(key)
+            return result
+
+    def put(self, key, result: str):
+        with self._lock:
+            self._results[key] = result
+            self._results.move_to_end(key)
+            while len(self._results) > self.max_size:
+                self._results.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+
+
+_cache = ToolResultCache()
+
+
+class MemoizedPythonTool(BaseTool):
+    """
+    Wraps the agent's python_repl_ast tool and answers repeated side-effect-free
+    snippets (df.columns, df.describe(), ...) from a cache instead of re-running them.
+
+    Results are only served while the tool's `df` is still the frame it was
+    bound to and pd/np are still the modules (or PandasFacade) it was bound
+    to, so reassigning or modifying `df` turns caching off for the rest of
+    the run.
+
+    If code_rewriter is set, every snippet is passed through it before it runs
+    (bind_figure_context uses this to bind plt/sns imports and pandas plotting
+    to the run's figure).
+    """
+
+    name: str = "python_repl_ast"
+    description: str = ""
+    args_schema: Optional[Type[BaseModel]] = None
+    tool: Any
+    dataset_version: str
+    frame: Any = None
+    frame_source: Any = None
+    modules: Dict[str, Any] = Field(default_factory=dict)
+    cache: Any = None
+    seen: Set[str] = Field(default_factory=set)
+    hits: int = 0
+    code_rewriter: Any = None
+
+    def __init__(self, tool: BaseTool, dataset_version: str, cache: Optional[ToolResultCache] = None, **kwargs):
+        super().__init__(
+            tool=tool,
+            dataset_version=dataset_version,
+            frame=tool.locals.get("df"),
+            frame_source=getattr(tool.locals.get("df"), "_source", None),
+            modules={name: tool.locals.get(name, module) for name, module in MODULES.items()},
+            cache=cache or _cache,
+            name=tool.name,
+            description=tool.description,
+            args_schema=tool.args_schema,
+            **kwargs
+        )
+
+    @property
+    def locals(self):
+        return self.tool.locals
+
+    def _namespace_intact(self) -> bool:
+        namespace = self.tool.locals
+        frame = namespace.get("df")
+        # A LazyFrame swaps its source when assigned to (copy on write)
+        if frame is not self.frame or getattr(frame, "_source", None) is not self.frame_source:
+            return False
+        return all(namespace.get(name, module) is module for name, module in self.modules.items())
+
+    def _run(self, query: str, run_manager=None) -> Any:
+        source = query.strip().strip("`").removeprefix("python").strip()
+        if self.code_rewriter is not None:
+            rewritten = self.code_rewriter(source)
+            if rewritten != source:
+                query = rewritten
+
+        code = normalize_code(source)
+        if code is None or not self._namespace_intact():
+            return self.tool._run(query)
+
+        key = (self.dataset_version, code)
+        result = self.cache.get(key)
+        if result is None:
+            result = str(self.tool._run(query))
+            if len(result) <= TOOL_CACHE_MAX_CHARS:
+                self.cache.put(key, result)
+        else:
+            self.hits += 1
+
+        if code in self.seen:
+            return result + REPEAT_NOTE
+        self.seen.add(code)
+        return result